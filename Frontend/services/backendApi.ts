@@ -19,13 +19,18 @@ const axiosRetry = async (error: AxiosError) => {
   return axios(config);
 };
 
+// End-to-end time budget for one request; the backend forwards what is left
+// of it to each agent (X-Request-Deadline-Ms) and skips optional work when it runs low
+const REQUEST_BUDGET_MS = 30000;
+
 // Create API instance for prompt processor (8000)
 const api: AxiosInstance = axios.create({
   baseURL: BACKEND_BASE_URL, // Points to Prompt Processor (8000)
-  timeout: 30000,
+  timeout: REQUEST_BUDGET_MS,
   headers: {
     'Content-Type': 'application/json',
-    'Accept': 'application/json'
+    'Accept': 'application/json',
+    'X-Request-Deadline-Ms': String(REQUEST_BUDGET_MS)
   },
   maxContentLength: Infinity,
   maxBodyLength: Infinity
@@ -34,10 +39,11 @@ const api: AxiosInstance = axios.create({
 // Create a second instance for orchestration agent calls (8001)
 const orchestrationApi: AxiosInstance = axios.create({
   baseURL: BACKEND_BASE_URL.replace(':8000', ':8001'), // Points to Orchestration Agent (8001)
-  timeout: 30000,
+  timeout: REQUEST_BUDGET_MS,
   headers: {
     'Content-Type': 'application/json',
-    'Accept': 'application/json'
+    'Accept': 'application/json',
+    'X-Request-Deadline-Ms': String(REQUEST_BUDGET_MS)
   },
   maxContentLength: Infinity,
   maxBodyLength: Infinity
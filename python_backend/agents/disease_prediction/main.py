@@ -1,21 +1,46 @@
 import os
 from dotenv import load_dotenv
 load_dotenv()
-print("GOOGLE_APPLICATION_CREDENTIALS:", os.getenv("GOOGLE_APPLICATION_CREDENTIALS"))
-print("GOOGLE_CLOUD_PROJECT:", os.getenv("GOOGLE_CLOUD_PROJECT"))
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
-import os
+import logging
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from common.deadline import DeadlineMiddleware, timeout_for
+from common.priority import PriorityMiddleware
+from common.metrics import REGISTRY, instrument_app, record_error, track_outbound
+from common.responses import use_fast_json
+from common.streaming import SSE_HEADERS, SSE_MEDIA_TYPE, sse_event, stream_chunks
+from services.llm_backends import backend_name, get_llm_backend
+from services.prompt_templates import TEMPLATES
+from services.structured_output import (IncrementalJSONParser, parse_json_object, request_structured,
+                                        schema_errors)
 
-# LangChain and Vertex AI imports
-try:
-    from langchain_google_vertexai import VertexAI
-except ImportError:
-    VertexAI = None
+# Upper bound per LLM call; the request deadline shortens it further
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+# "ensemble" answers /predict_disease (what the orchestrator calls) through /ensemble_predict
+PREDICTION_MODE = os.getenv("DISEASE_PREDICTION_MODE", "rules").strip().lower()
+# A rules answer is final when it is at least this confident and its rules matched this share of the symptoms
+ENSEMBLE_MIN_CONFIDENCE = float(os.getenv("ENSEMBLE_MIN_CONFIDENCE", "0.75"))
+ENSEMBLE_MIN_COVERAGE = float(os.getenv("ENSEMBLE_MIN_COVERAGE", "0.75"))
+
+PREDICTION_SOURCE_TOTAL = REGISTRY.counter(
+    "disease_prediction_source_total",
+    "Ensemble predictions by what answered them (rules, ensemble, rules_fallback)",
+    ("source",))
+PREDICTION_RULES_RATIO = REGISTRY.gauge(
+    "disease_prediction_rules_ratio", "Fraction of ensemble predictions answered by the rules without an LLM call")
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Disease Prediction Agent API")
+use_fast_json(app)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(PriorityMiddleware)
+instrument_app(app, "disease_prediction")
 
 
 # MCP/ACL structures
@@ -38,115 +63,273 @@ class DiseasePredictionResult(BaseModel):
     symptoms_used: List[str]
     severity_level: str
     patient_id: Optional[str] = None  # Add patient ID to result
+    source: Optional[str] = None  # Set by /ensemble_predict: rules, ensemble or rules_fallback
 
 class DiseasePredictionResponse(BaseModel):
     result: Optional[DiseasePredictionResult] = None
     error: Optional[str] = None
 
-GOOGLE_CLOUD_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT")
-
-# Initialize Vertex AI LLM via LangChain (if available)
+# Initialize the configured LLM backend (Vertex AI or the local simulator)
 vertex_llm = None
-if VertexAI and GOOGLE_CLOUD_PROJECT:
-    vertex_llm = VertexAI(
-        project=GOOGLE_CLOUD_PROJECT,
-        model_name="gemini-2.5-pro"
-    )
+llm_error = None
+try:
+    vertex_llm = get_llm_backend()
+except Exception as e:
+    llm_error = str(e)
+    logger.warning(f"LLM backend '{backend_name()}' unavailable, /llm_predict disabled: {llm_error}")
 
 
 from sub_agents.domain_logic import DomainLogic
 
 domain_logic = DomainLogic()
 
-@app.post("/predict_disease", response_model=DiseasePredictionResponse)
-def predict_disease(request: DiseasePredictionRequest):
+def prediction_response(result: Optional[dict] = None, error: Optional[str] = None) -> dict:
+    """A DiseasePredictionResponse as the dict the in-process transport hands on"""
+    return {"result": result, "error": error}
+
+def prediction_result(diseases: List[str], confidence: float, symptoms_used: List[str], severity_level: str,
+                      patient_id: Optional[str] = None, source: Optional[str] = None) -> dict:
+    return {
+        "predicted_diseases": diseases,
+        "confidence": confidence,
+        "symptoms_used": symptoms_used,
+        "severity_level": severity_level,
+        "patient_id": patient_id,
+        "source": source,
+    }
+
+def predict(payload: dict) -> dict:
+    """
+    /predict_disease on a request dict, returning the response dict. The
+    route validates at the HTTP boundary; the in-process transport calls
+    this directly with the orchestrator's payload.
+    """
+    if PREDICTION_MODE == "ensemble":
+        return ensemble(payload)
     try:
-        print(f"Disease prediction request: {request}")
+        print(f"Disease prediction request: {payload}")
         
         # Forward the request to domain logic
         result = domain_logic.predict_disease({
-            'patient_id': request.patient_id,
-            'symptoms': request.symptoms or [],
-            'severity_level': request.severity_level,
-            'semantic_context': request.semantic_context
+            'patient_id': payload.get('patient_id'),
+            'symptoms': payload.get('symptoms') or [],
+            'severity_level': payload.get('severity_level', "medium"),
+            'semantic_context': payload.get('semantic_context')
         })
         
         print(f"Domain logic result: {result}")
         
         if not result.get('predicted_diseases'):
-            return DiseasePredictionResponse(error="No predictions available")
+            return prediction_response(error="No predictions available")
             
-        # Convert to response model
-        prediction_result = DiseasePredictionResult(
-            predicted_diseases=result['predicted_diseases'],
-            confidence=result['confidence'],
-            symptoms_used=result['symptoms_used'],
-            severity_level=result['severity_level'],
-            patient_id=request.patient_id  # Include patient ID in response
+        prediction = prediction_result(
+            result['predicted_diseases'],
+            result['confidence'],
+            result['symptoms_used'],
+            result['severity_level'],
+            patient_id=payload.get('patient_id')  # Include patient ID in response
         )
         
-        print(f"Returning prediction: {prediction_result}")
-        return DiseasePredictionResponse(result=prediction_result)
+        print(f"Returning prediction: {prediction}")
+        return prediction_response(result=prediction)
         
     except Exception as e:
         import traceback
         error_details = f"Error in disease prediction: {str(e)}\n{traceback.format_exc()}"
         print(error_details)
-        return DiseasePredictionResponse(error=error_details)
+        record_error("disease_prediction", e)
+        return prediction_response(error=error_details)
+
+@app.post("/predict_disease", response_model=DiseasePredictionResponse)
+def predict_disease(request: DiseasePredictionRequest):
+    return DiseasePredictionResponse.model_validate(predict(request.model_dump()))
 
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
 
-# Response format template
-RESPONSE_TEMPLATE = """{
-    "predicted_diseases": ["Disease1", "Disease2"],
-    "confidence": 0.85,
-    "explanation": "Brief explanation of the predictions",
-    "severity": "low/medium/high",
-    "recommendation": "Brief medical recommendation"
-}"""
+# Response schema for the disease_prediction template
+PREDICTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "predicted_diseases": {"type": "array", "items": {"type": "string"}},
+        "confidence": {"type": "number"},
+        "explanation": {"type": "string"},
+        "severity": {"type": "string"},
+        "recommendation": {"type": "string"},
+    },
+    "required": ["predicted_diseases"],
+}
+
+def valid_prediction(response: str) -> bool:
+    """A cheap model's prediction is used only if it names at least one disease"""
+    parsed = parse_json_object(response)
+    diseases = parsed.get('predicted_diseases') if parsed else None
+    return isinstance(diseases, list) and bool(diseases)
+
+def prediction_symptoms(payload: dict) -> List[str]:
+    """Symptoms already extracted with the prompt's intent are reused rather than re-extracted"""
+    context = payload.get('semantic_context') or {}
+    return payload.get('symptoms') or context.get('concepts') or context.get('identified_concepts') or []
+
+def llm_prediction(symptoms: List[str]) -> dict:
+    """
+    The LLM's parsed prediction for `symptoms`. The cascade's large model
+    only sees predictions the cheap one was unsure of; an answer that never
+    parses raises StructuredOutputError and is reported, not guessed at.
+    """
+    template = TEMPLATES.get("disease_prediction")
+    prompt = template.render(symptoms=', '.join(symptoms))
+    with track_outbound("llm", "disease_prediction"):
+        return request_structured(template.bind(vertex_llm), prompt, PREDICTION_SCHEMA, "disease_prediction",
+                                  timeout=LLM_TIMEOUT_SECONDS, validate=valid_prediction)
 
 @app.post("/llm_predict", response_model=DiseasePredictionResponse)
 async def llm_predict(request: DiseasePredictionRequest):
     try:
         if not vertex_llm:
-            return DiseasePredictionResponse(error="Vertex AI LLM not initialized")
-
-        # Prepare prompt with symptoms
-        prompt = f"Based on the following symptoms: {', '.join(request.symptoms or [])}\n"
-        prompt += "Please provide a disease prediction in this format:\n"
-        prompt += RESPONSE_TEMPLATE
+            return DiseasePredictionResponse(error=f"LLM not initialized: {llm_error}")
 
-        # Send to Gemini-Pro LLM
-        llm_response = vertex_llm(prompt)
-
-        # Try to extract structured disease predictions
-        import json
-        try:
-            # Try to find JSON content in the response
-            start_idx = llm_response.find('{')
-            end_idx = llm_response.rfind('}') + 1
-            if start_idx != -1 and end_idx != -1:
-                json_str = llm_response[start_idx:end_idx]
-                parsed_response = json.loads(json_str)
-                diseases = parsed_response.get('predicted_diseases', [])
-                confidence = parsed_response.get('confidence', 0.8)
-            else:
-                # Fallback: treat the whole response as a disease prediction
-                diseases = [d.strip() for d in llm_response.split(',') if d.strip()]
-                confidence = 0.7
-        except json.JSONDecodeError:
-            # If JSON parsing fails, use the raw response
-            diseases = [llm_response.strip()]
-            confidence = 0.6
+        symptoms = prediction_symptoms(request.model_dump())
+        # Blocks while the LLM gateway queues the call, so it must not run on the event loop
+        parsed_response = await run_in_threadpool(llm_prediction, symptoms)
+        diseases = parsed_response['predicted_diseases']
+        confidence = parsed_response.get('confidence')
+        if confidence is None:
+            confidence = 0.8
 
         result = DiseasePredictionResult(
             predicted_diseases=diseases,
             confidence=confidence,
-            symptoms_used=request.symptoms or [],
+            symptoms_used=symptoms,
             severity_level=request.severity_level or "medium"
         )
         return DiseasePredictionResponse(result=result)
     except Exception as e:
+        record_error("disease_prediction", e)
         return DiseasePredictionResponse(error=str(e))
+
+def merge_rankings(rankings: List[tuple]) -> List[str]:
+    """
+    Diseases from several (ranked diseases, weight) sources, ordered by
+    weighted reciprocal rank. Names compare case-insensitively; ties keep
+    the order of the earlier source.
+    """
+    scores, names = {}, {}
+    for diseases, weight in rankings:
+        for rank, disease in enumerate(diseases, 1):
+            key = str(disease).strip().lower()
+            if not key or key == 'unknown':
+                continue
+            names.setdefault(key, str(disease).strip())
+            scores[key] = scores.get(key, 0.0) + weight / rank
+    return [names[key] for key in sorted(scores, key=lambda key: -scores[key])]
+
+def record_prediction_source(source: str):
+    PREDICTION_SOURCE_TOTAL.inc(source=source)
+    total = sum(PREDICTION_SOURCE_TOTAL.value(source=s) for s in ("rules", "ensemble", "rules_fallback"))
+    PREDICTION_RULES_RATIO.set(PREDICTION_SOURCE_TOTAL.value(source="rules") / total)
+
+def ensemble(payload: dict) -> dict:
+    """
+    Rules first: the DomainLogic answer is returned as is when it is
+    confident enough and its rules cover enough of the symptoms. Otherwise
+    the LLM predicts too and the two rankings are merged, each weighted by
+    its confidence (the rules' scaled by their coverage). When the LLM is
+    unavailable or fails, the rules answer is returned.
+    """
+    try:
+        symptoms = prediction_symptoms(payload)
+        rules = domain_logic.predict_disease({
+            'patient_id': payload.get('patient_id'),
+            'symptoms': symptoms,
+            'severity_level': payload.get('severity_level', "medium"),
+            'semantic_context': payload.get('semantic_context')
+        })
+        symptoms_used = rules['symptoms_used']
+        coverage = domain_logic.symptom_coverage(symptoms_used)
+        rules_diseases = [d for d in rules['predicted_diseases'] if d != 'Unknown']
+        diseases, confidence, source = rules['predicted_diseases'], rules['confidence'], "rules"
+
+        if not (rules_diseases and rules['confidence'] >= ENSEMBLE_MIN_CONFIDENCE and coverage >= ENSEMBLE_MIN_COVERAGE):
+            source = "rules_fallback"
+            if vertex_llm and symptoms_used:
+                try:
+                    parsed = llm_prediction(symptoms_used)
+                    llm_confidence = parsed.get('confidence')
+                    llm_confidence = 0.8 if llm_confidence is None else float(llm_confidence)
+                    rules_weight = rules['confidence'] * coverage
+                    merged = merge_rankings([(parsed['predicted_diseases'], llm_confidence),
+                                             (rules_diseases, rules_weight)])
+                    if merged:
+                        diseases, confidence = merged, max(llm_confidence, rules_weight)
+                    source = "ensemble"
+                except Exception as e:
+                    logger.warning(f"LLM prediction failed, using the rules answer: {str(e)}")
+                    record_error("disease_prediction", e)
+        record_prediction_source(source)
+
+        if not diseases:
+            return prediction_response(error="No predictions available")
+        return prediction_response(result=prediction_result(
+            diseases, confidence, symptoms_used, rules['severity_level'],
+            patient_id=payload.get('patient_id'), source=source
+        ))
+    except Exception as e:
+        record_error("disease_prediction", e)
+        return prediction_response(error=str(e))
+
+@app.post("/ensemble_predict", response_model=DiseasePredictionResponse)
+def ensemble_predict(request: DiseasePredictionRequest):
+    return DiseasePredictionResponse.model_validate(ensemble(request.model_dump()))
+
+@app.post("/llm_predict/stream")
+async def llm_predict_stream(request: DiseasePredictionRequest, http_request: Request):
+    """
+    /llm_predict as server-sent events: `token` events carry the text as it
+    is generated, `partial` events the prediction fields completed so far,
+    and a final `result` (a DiseasePredictionResponse) or `error` event
+    ends the stream. Generation stops when the client disconnects.
+    """
+    if not vertex_llm:
+        return DiseasePredictionResponse(error=f"LLM not initialized: {llm_error}")
+
+    symptoms = prediction_symptoms(request.model_dump())
+    template = TEMPLATES.get("disease_prediction")
+    prompt = template.render(symptoms=', '.join(symptoms))
+    timeout = timeout_for(LLM_TIMEOUT_SECONDS, stage="llm")
+
+    async def events():
+        parser = IncrementalJSONParser()
+        completed = 0
+        try:
+            # A streamed answer cannot be escalated once shown, so the cascade streams its last tier
+            chunks = template.bind(vertex_llm).stream(prompt, timeout=timeout, schema=PREDICTION_SCHEMA)
+            async for chunk in stream_chunks(http_request, chunks, "disease_prediction"):
+                yield sse_event("token", {"text": chunk})
+                fields = parser.feed(chunk)
+                if len(fields) > completed:
+                    completed = len(fields)
+                    yield sse_event("partial", fields)
+        except ClientDisconnect:
+            return
+        except Exception as e:
+            record_error("disease_prediction", e)
+            yield sse_event("error", {"error": str(e)})
+            return
+
+        parsed = parse_json_object(parser.text)
+        problems = ["the answer was not a JSON object"] if parsed is None else schema_errors(parsed, PREDICTION_SCHEMA)
+        if problems or not parsed['predicted_diseases']:
+            yield sse_event("error", {"error": f"Invalid prediction: {'; '.join(problems) or 'no diseases'}"})
+            return
+        confidence = parsed.get('confidence')
+        result = DiseasePredictionResult(
+            predicted_diseases=parsed['predicted_diseases'],
+            confidence=confidence if confidence is not None else 0.8,
+            symptoms_used=symptoms,
+            severity_level=request.severity_level or "medium"
+        )
+        yield sse_event("result", DiseasePredictionResponse(result=result).model_dump())
+
+    return StreamingResponse(events(), media_type=SSE_MEDIA_TYPE, headers=SSE_HEADERS)
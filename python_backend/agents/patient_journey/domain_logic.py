@@ -1,12 +1,22 @@
 import os
 from typing import Dict, Any, List
-from neo4j import GraphDatabase
 import logging
+from common.deadline import timeout_for
+from common.metrics import track_outbound
+from common.singleflight import SingleFlight
+from common.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
 class PatientJourneyLogic:
     def __init__(self):
+        # Upper bound per query; the request deadline shortens it further
+        self.query_timeout = float(os.getenv("NEO4J_QUERY_TIMEOUT_SECONDS", "10"))
+        # Recent journeys, warmed by /prefetch while the prompt is still being classified;
+        # concurrent queries for the same patient share one set of Cypher queries
+        self.journey_cache = TTLCache("patient_journey", float(os.getenv("JOURNEY_CACHE_SECONDS", "30")),
+                                      int(os.getenv("JOURNEY_CACHE_MAX_ENTRIES", "1024")))
+        self._journey_flight = SingleFlight("patient_journey")
         # Neo4j connection setup (use environment variables for security)
         try:
             uri = os.getenv("NEO4J_URI")
@@ -21,7 +31,13 @@ class PatientJourneyLogic:
                 self.driver = None
                 return
                 
-            self.driver = GraphDatabase.driver(uri, auth=(user, password))
+            # Imported here so services without Neo4j configured skip the driver import
+            from neo4j import GraphDatabase
+            self.driver = GraphDatabase.driver(
+                uri, auth=(user, password),
+                connection_timeout=self.query_timeout,
+                connection_acquisition_timeout=self.query_timeout,
+            )
             logger.info("✓ Neo4j connection established successfully")
             print("[SUCCESS] Neo4j connection established")
         except Exception as e:
@@ -39,10 +55,31 @@ class PatientJourneyLogic:
                     "Please configure NEO4J_URI, NEO4J_USER, and NEO4J_PASSWORD environment variables"
                 ]
             }
-            
+
+        # Lookups match IDs and names case-insensitively, so the cache does too
+        key = patient_id.lower()
+        cached = self.journey_cache.get(key)
+        if cached is not None:
+            return cached
+        journey, _ = self._journey_flight.do(key, lambda: self._load_patient_journey(key, patient_id))
+        return journey
+
+    def _load_patient_journey(self, key: str, patient_id: str) -> Dict[str, Any]:
+        with track_outbound("neo4j", "patient_journey"):
+            journey = self._query_patient_journey(patient_id)
+        if "error" not in journey:
+            self.journey_cache.put(key, journey)
+        return journey
+
+    def _run(self, session, cypher: str, **params):
+        """Run a query with the request's remaining budget as its transaction timeout"""
+        from neo4j import Query
+        return session.run(Query(cypher, timeout=timeout_for(self.query_timeout, stage="neo4j")), **params)
+
+    def _query_patient_journey(self, patient_id: str) -> Dict[str, Any]:
         with self.driver.session() as session:
             # First, get patient basic info
-            patient_result = session.run(
+            patient_result = self._run(session,
                 """
                 MATCH (p:Patient)
                 WHERE toLower(p.patientId) = toLower($patient_id) OR toLower(p.name) = toLower($patient_id)
@@ -62,7 +99,7 @@ class PatientJourneyLogic:
             seen_steps = set()
             
             # Get diagnoses
-            diag_result = session.run(
+            diag_result = self._run(session,
                 """
                 MATCH (p:Patient)-[hd:HAS_DIAGNOSIS]->(diag:Diagnosis)
                 WHERE p.patientId = $patient_id AND diag.name IS NOT NULL AND hd.diagnosedDate IS NOT NULL
@@ -79,7 +116,7 @@ class PatientJourneyLogic:
                         journey_steps.append((record.get('date', ''), step))
             
             # Get appointments
-            appt_result = session.run(
+            appt_result = self._run(session,
                 """
                 MATCH (p:Patient)-[ha:HAS_APPOINTMENT]->(appt:Appointment)
                 WHERE p.patientId = $patient_id AND appt.type IS NOT NULL AND ha.appointmentDate IS NOT NULL
@@ -101,7 +138,7 @@ class PatientJourneyLogic:
                         journey_steps.append((record.get('date', ''), step))
             
             # Get medications
-            med_result = session.run(
+            med_result = self._run(session,
                 """
                 MATCH (p:Patient)-[tm:TAKES_MEDICATION]->(med:Medication)
                 WHERE p.patientId = $patient_id AND med.name IS NOT NULL AND tm.prescribedDate IS NOT NULL
@@ -118,7 +155,7 @@ class PatientJourneyLogic:
                         journey_steps.append((record.get('date', ''), step))
             
             # Get treatments
-            treat_result = session.run(
+            treat_result = self._run(session,
                 """
                 MATCH (p:Patient)-[rt:RECEIVES_TREATMENT]->(treat:Treatment)
                 WHERE p.patientId = $patient_id AND treat.name IS NOT NULL AND rt.startDate IS NOT NULL
@@ -135,7 +172,7 @@ class PatientJourneyLogic:
                         journey_steps.append((record.get('start', ''), step))
             
             # Get tests
-            test_result = session.run(
+            test_result = self._run(session,
                 """
                 MATCH (p:Patient)-[ut:UNDERWENT_TEST]->(test:Test)
                 WHERE p.patientId = $patient_id AND test.name IS NOT NULL AND ut.performedDate IS NOT NULL
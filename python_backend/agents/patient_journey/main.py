@@ -2,20 +2,20 @@
 import os
 from dotenv import load_dotenv
 load_dotenv()
-print("GOOGLE_APPLICATION_CREDENTIALS:", os.getenv("GOOGLE_APPLICATION_CREDENTIALS"))
-print("GOOGLE_CLOUD_PROJECT:", os.getenv("GOOGLE_CLOUD_PROJECT"))
 
 from fastapi import FastAPI
 from pydantic import BaseModel
 from typing import List, Optional
-
-# LangChain and Vertex AI imports
-try:
-    from langchain_google_vertexai import VertexAI
-except ImportError:
-    VertexAI = None
+from common.deadline import DeadlineMiddleware
+from common.priority import PriorityMiddleware
+from common.metrics import instrument_app, record_error
+from common.responses import use_fast_json
 
 app = FastAPI(title="Patient Journey Agent API")
+use_fast_json(app)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(PriorityMiddleware)
+instrument_app(app, "patient_journey")
 
 # MCP/ACL structures (customize as needed for patient journey)
 class MCPACLPrompt(BaseModel):
@@ -39,44 +39,76 @@ class PatientJourneyResponse(BaseModel):
     result: Optional[PatientJourneyResult] = None
     error: Optional[str] = None
 
-GOOGLE_CLOUD_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT")
+class JourneyPrefetchRequest(BaseModel):
+    patient_id: str
+
+class JourneyPrefetchResponse(BaseModel):
+    patient_id: str
+    warmed: bool = False
+
+class CacheInvalidation(BaseModel):
+    patient_id: Optional[str] = None
 
-# Initialize Vertex AI LLM via LangChain (if available)
-vertex_llm = None
-if VertexAI and GOOGLE_CLOUD_PROJECT:
-    vertex_llm = VertexAI(
-        project=GOOGLE_CLOUD_PROJECT,
-        model_name="gemini-2.5-pro"
-    )
+class CacheInvalidationResponse(BaseModel):
+    invalidated: int = 0
 
 from .domain_logic import PatientJourneyLogic
 
 # Initialize domain logic
 patient_journey_logic = PatientJourneyLogic()
 
-@app.post("/patient_journey", response_model=PatientJourneyResponse)
-def handle_patient_journey(request: PatientJourneyRequest):
+def journey(payload: dict) -> dict:
+    """
+    /patient_journey on a request dict, returning the response dict. The
+    route validates at the HTTP boundary; the in-process transport calls
+    this directly with the orchestrator's payload.
+    """
     try:
-        if not request.patient_id:
-            return PatientJourneyResponse(error="patient_id is required")
+        patient_id = payload.get("patient_id")
+        if not patient_id:
+            return {"result": None, "error": "patient_id is required"}
 
         # Query patient journey from Neo4j
-        journey_data = patient_journey_logic.get_patient_journey(request.patient_id)
+        journey_data = patient_journey_logic.get_patient_journey(patient_id)
         
         if "error" in journey_data:
-            return PatientJourneyResponse(error=journey_data["error"])
+            return {"result": None, "error": journey_data["error"]}
 
         # Return journey steps
-        result = PatientJourneyResult(
-            journey_steps=journey_data.get("journey_steps", []),
-            confidence=1.0,
-            patient_name=journey_data.get("patient_name")
-        )
-        return PatientJourneyResponse(result=result)
+        result = {
+            "journey_steps": journey_data.get("journey_steps", []),
+            "confidence": 1.0,
+            "patient_name": journey_data.get("patient_name")
+        }
+        return {"result": result, "error": None}
     except Exception as e:
         import traceback
         print(f"[ERROR] Failed to process patient journey: {e}")
         print(traceback.format_exc())
-        return PatientJourneyResponse(error=str(e))
-    except Exception as e:
-        return PatientJourneyResponse(error=str(e))
+        record_error("patient_journey", e)
+        return {"result": None, "error": str(e)}
+
+def prefetch(payload: dict) -> dict:
+    """Warms the journey cache while the orchestrator is still classifying the prompt"""
+    journey_data = patient_journey_logic.get_patient_journey(payload["patient_id"])
+    return {"patient_id": payload["patient_id"], "warmed": "error" not in journey_data}
+
+def invalidate(payload: dict) -> dict:
+    """Drop cached journeys, for one patient when patient_id is given; called by the orchestrator"""
+    journey_cache = patient_journey_logic.journey_cache
+    patient_id = payload.get("patient_id")
+    if not patient_id:
+        return {"invalidated": journey_cache.clear()}
+    return {"invalidated": int(journey_cache.invalidate(patient_id.lower()))}
+
+@app.post("/patient_journey", response_model=PatientJourneyResponse)
+def handle_patient_journey(request: PatientJourneyRequest):
+    return PatientJourneyResponse.model_validate(journey(request.model_dump()))
+
+@app.post("/prefetch", response_model=JourneyPrefetchResponse)
+def prefetch_journey(request: JourneyPrefetchRequest):
+    return JourneyPrefetchResponse.model_validate(prefetch(request.model_dump()))
+
+@app.post("/cache/invalidate", response_model=CacheInvalidationResponse)
+def invalidate_cache(request: CacheInvalidation):
+    return CacheInvalidationResponse.model_validate(invalidate(request.model_dump()))
@@ -1,16 +1,34 @@
 from typing import Dict, List, Optional, Any
+import os
 import requests
+import weakref
 import logging
+from common.deadline import timeout_for
+from common.metrics import track_outbound
+from common.singleflight import AsyncSingleFlight, SingleFlight
+from common.ttl_cache import TTLCache
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+def history_cache_from_env() -> TTLCache:
+    """Patient history cache; FHIR_HISTORY_CACHE_SECONDS=0 disables it"""
+    return TTLCache("fhir_history", float(os.getenv("FHIR_HISTORY_CACHE_SECONDS", "30")),
+                    int(os.getenv("FHIR_HISTORY_CACHE_MAX_ENTRIES", "1024")))
+
+
 class FHIRConnector:
     """
     Handles FHIR database interactions for symptom analysis
     """
-    def __init__(self, fhir_server_url: Optional[str] = None):
-        self.fhir_server_url = fhir_server_url or "http://localhost:8004"  # Default FHIR server port
+    def __init__(self, fhir_server_url: Optional[str] = None, history_cache: Optional[TTLCache] = None):
+        self.fhir_server_url = fhir_server_url or os.getenv("FHIR_SERVER_URL", "http://localhost:8004")  # Default FHIR server port
+        # Upper bound per FHIR request; the request deadline shortens it further
+        self.timeout = float(os.getenv("FHIR_TIMEOUT_SECONDS", "5"))
+        # Recent bundles, warmed by /prefetch while the prompt is still being classified;
+        # concurrent fetches of the same patient share one request
+        self.history_cache = history_cache or history_cache_from_env()
+        self._history_flight = SingleFlight("fhir_history")
         logger.info(f"FHIR Connector initialized with server URL: {self.fhir_server_url}")
         self.snomed_symptom_map = {
             'headache': '25064002',
@@ -25,24 +43,20 @@ class FHIRConnector:
         """
         Retrieve patient's symptom history from FHIR server
         """
+        cached = self.history_cache.get(patient_id)
+        if cached is not None:
+            return cached
+        history, _ = self._history_flight.do(patient_id, lambda: self._fetch_history(patient_id))
+        return history
+
+    def _fetch_history(self, patient_id: str) -> Dict[str, Any]:
         try:
-            endpoint = f"{self.fhir_server_url}/Patient/{patient_id}/Observation"
+            endpoint = self._history_endpoint(patient_id)
             logger.info(f"Requesting patient history from FHIR endpoint: {endpoint}")
             
-            response = requests.get(endpoint)
-            logger.info(f"FHIR response status: {response.status_code}")
-            
-            if response.status_code == 200:
-                data = response.json()
-                logger.info(f"Successfully retrieved history for patient {patient_id}")
-                # Log the actual response data
-                logger.info(f"FHIR response data: {data}")
-                return data
-            elif response.status_code == 404:
-                logger.warning(f"Patient {patient_id} not found in FHIR server")
-            else:
-                logger.error(f"FHIR server error: {response.status_code} - {response.text}")
-            return {}
+            with track_outbound("fhir", "patient_history"):
+                response = requests.get(endpoint, timeout=timeout_for(self.timeout, stage="fhir"))
+            return self._parse_history(patient_id, response)
             
         except requests.RequestException as e:
             logger.error(f"Network error accessing FHIR server: {str(e)}")
@@ -51,6 +65,26 @@ class FHIRConnector:
             logger.error(f"Unexpected error fetching patient history: {str(e)}")
             return {}
 
+    def _history_endpoint(self, patient_id: str) -> str:
+        return f"{self.fhir_server_url}/Patient/{patient_id}/Observation"
+
+    def _parse_history(self, patient_id: str, response) -> Dict[str, Any]:
+        """FHIR bundle from a requests or httpx response, {} when unavailable"""
+        logger.info(f"FHIR response status: {response.status_code}")
+        
+        if response.status_code == 200:
+            data = response.json()
+            logger.info(f"Successfully retrieved history for patient {patient_id}")
+            logger.debug(f"FHIR response data: {data}")
+            self.history_cache.put(patient_id, data)
+            return data
+        elif response.status_code == 404:
+            logger.warning(f"Patient {patient_id} not found in FHIR server")
+            self.history_cache.put(patient_id, {})
+        else:
+            logger.error(f"FHIR server error: {response.status_code} - {response.text}")
+        return {}
+
     def get_standard_symptom_codes(self, symptoms: List[str]) -> Dict[str, str]:
         """
         Convert symptom names to SNOMED CT codes
@@ -80,6 +114,24 @@ class FHIRConnector:
             return enriched_data
 
         patient_history = self.get_patient_history(patient_id)
+        return self.enrich_symptoms_from_history(symptoms, patient_id, patient_history, enriched_data)
+
+    def enrich_symptoms_from_history(self, symptoms: List[str], patient_id: Optional[str],
+                                     patient_history: Dict[str, Any],
+                                     enriched_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Enrich symptom data from an already fetched FHIR bundle
+        """
+        if enriched_data is None:
+            enriched_data = {
+                'standard_codes': self.get_standard_symptom_codes(symptoms),
+                'historical_context': {},
+                'related_conditions': {},
+                'has_patient_history': False,
+                'symptom_history': [],
+                'last_recorded_date': None
+            }
+
         if not patient_history:
             logger.info("No patient history found in FHIR")
             return enriched_data
@@ -92,6 +144,7 @@ class FHIRConnector:
         # Add current symptoms to enriched data
         enriched_data['current_symptoms'] = symptoms
         logger.info(f"Current symptoms being analyzed: {symptoms}")
+        current_symptoms = {s.lower() for s in symptoms}
         
         for entry in entries:
             resource = entry.get('resource', {})
@@ -114,13 +167,13 @@ class FHIRConnector:
                 }
                 
                 if symptom_record['symptom']:
-                    logger.info(f"Found historical symptom record: {symptom_record}")
+                    logger.debug(f"Found historical symptom record: {symptom_record}")
                     enriched_data['symptom_history'].append(symptom_record)
                     if not enriched_data['last_recorded_date'] or symptom_record['date'] > enriched_data['last_recorded_date']:
                         enriched_data['last_recorded_date'] = symptom_record['date']
                     
                     # Check if this is one of the current symptoms and track severity
-                    if symptom.lower() in [s.lower() for s in symptoms]:
+                    if symptom.lower() in current_symptoms:
                         logger.info(f"Matched historical symptom {symptom} with current symptoms (severity: {severity})")
                         # Track severity for matching symptoms
                         enriched_data.setdefault('matching_symptoms', []).append({
@@ -210,4 +263,90 @@ class FHIRConnector:
                     if symptom.lower() not in [s.lower() for s in current_symptoms]:
                         related_symptoms.add(symptom)
 
-        return list(related_symptoms)
\ No newline at end of file
+        return list(related_symptoms)
+
+class AsyncFHIRConnector(FHIRConnector):
+    """
+    FHIRConnector for the async route: history requests go over a pooled
+    httpx.AsyncClient so a request waiting on FHIR holds no thread, and
+    matching large bundles against the symptoms runs in the threadpool.
+    """
+    def __init__(self, fhir_server_url: Optional[str] = None, max_connections: Optional[int] = None,
+                 history_cache: Optional[TTLCache] = None):
+        super().__init__(fhir_server_url, history_cache)
+        self._history_flight_async = AsyncSingleFlight("fhir_history")
+        self.max_connections = max_connections or int(os.getenv("FHIR_MAX_CONNECTIONS", "200"))
+        # Bundles with more entries than this are matched off the event loop
+        self.offload_entries = int(os.getenv("FHIR_OFFLOAD_ENTRIES", "200"))
+        # A client is bound to the event loop it was created on, so each loop gets its own.
+        # Keyed weakly: a client goes away with its loop and is never replaced while in use.
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _get_client(self):
+        import asyncio
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        return client
+
+    async def get_patient_history(self, patient_id: str) -> Dict[str, Any]:
+        """
+        Retrieve patient's symptom history from FHIR server without blocking the event loop
+        """
+        cached = self.history_cache.get(patient_id)
+        if cached is not None:
+            return cached
+        history, _ = await self._history_flight_async.do(patient_id, lambda: self._fetch_history_async(patient_id))
+        return history
+
+    async def _fetch_history_async(self, patient_id: str) -> Dict[str, Any]:
+        import httpx
+
+        try:
+            endpoint = self._history_endpoint(patient_id)
+            logger.info(f"Requesting patient history from FHIR endpoint: {endpoint}")
+
+            with track_outbound("fhir", "patient_history"):
+                response = await self._get_client().get(endpoint, timeout=timeout_for(self.timeout, stage="fhir"))
+            return self._parse_history(patient_id, response)
+
+        except httpx.HTTPError as e:
+            logger.error(f"Network error accessing FHIR server: {str(e)}")
+            return {}
+        except Exception as e:
+            logger.error(f"Unexpected error fetching patient history: {str(e)}")
+            return {}
+
+    async def enrich_symptoms(self, symptoms: List[str], patient_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Enrich symptom data with FHIR data if available
+        """
+        if not patient_id:
+            logger.info("No patient ID provided for FHIR enrichment")
+            return self.enrich_symptoms_from_history(symptoms, patient_id, {})
+
+        patient_history = await self.get_patient_history(patient_id)
+        return await self.enrich_from_history(symptoms, patient_id, patient_history)
+
+    async def enrich_from_history(self, symptoms: List[str], patient_id: Optional[str],
+                                  patient_history: Dict[str, Any]) -> Dict[str, Any]:
+        """enrich_symptoms_from_history, in the threadpool when the bundle is large"""
+        if len(patient_history.get('entry', [])) > self.offload_entries:
+            from starlette.concurrency import run_in_threadpool
+            return await run_in_threadpool(self.enrich_symptoms_from_history, symptoms, patient_id, patient_history)
+        return self.enrich_symptoms_from_history(symptoms, patient_id, patient_history)
+
+    async def aclose(self):
+        """Close the current event loop's client; called from the app's lifespan on shutdown"""
+        import asyncio
+
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
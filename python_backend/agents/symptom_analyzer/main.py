@@ -1,22 +1,62 @@
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-from typing import Dict, List, Optional, Any
+from pydantic import AliasChoices, BaseModel, Field, SkipValidation
+from typing import Dict, List, Optional, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import os
+import asyncio
+import contextvars
+import copy
+import json
+import hashlib
 import logging
 import requests
-from .fhir_connector import FHIRConnector
+from contextlib import asynccontextmanager
+from common.deadline import DeadlineMiddleware, has_budget
+from common.priority import PriorityMiddleware
+from common.metrics import instrument_app, record_error
+from common.responses import use_fast_json
+from common.singleflight import AsyncSingleFlight, SingleFlight
+from starlette.concurrency import run_in_threadpool
+from .fhir_connector import AsyncFHIRConnector, FHIRConnector, history_cache_from_env
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Symptom Analyzer Agent API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await async_fhir_connector.aclose()
 
-# Initialize FHIR connector
-fhir_connector = FHIRConnector()
+app = FastAPI(title="Symptom Analyzer Agent API", lifespan=lifespan)
+use_fast_json(app)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(PriorityMiddleware)
+instrument_app(app, "symptom_analyzer")
+
+# Initialize FHIR connectors: async for the HTTP route, blocking for in-process callers.
+# Both read and warm the same patient history cache.
+fhir_history_cache = history_cache_from_env()
+fhir_connector = FHIRConnector(history_cache=fhir_history_cache)
+async_fhir_connector = AsyncFHIRConnector(history_cache=fhir_history_cache)
+# Worker threads for FHIR fetches started ahead of local extraction (blocking path only)
+fhir_prefetch_pool = ThreadPoolExecutor(
+    max_workers=int(os.getenv("FHIR_PREFETCH_WORKERS", "16")), thread_name_prefix="fhir-prefetch")
+
+# Concurrent duplicate analyses wait for the first one (coalescing ratio on /metrics)
+analysis_flight = SingleFlight("symptom_analyzer")
+analysis_flight_async = AsyncSingleFlight("symptom_analyzer")
+
+# Symptom text longer than this is analysed in the threadpool instead of on the event loop
+ANALYSIS_OFFLOAD_CHARS = int(os.getenv("ANALYSIS_OFFLOAD_CHARS", "4000"))
+
+# FHIR enrichment is optional: skip it when less than this is left of the request budget
+FHIR_MIN_BUDGET_SECONDS = float(os.getenv("FHIR_MIN_BUDGET_MS", "500")) / 1000.0
 
 class SemanticContext(BaseModel):
     intent: str
-    identified_concepts: List[str]
+    # The orchestrator forwards the plan's semantic understanding, which calls these "concepts"
+    identified_concepts: List[str] = Field(validation_alias=AliasChoices("identified_concepts", "concepts"))
     confidence: float
     temporal_context: Optional[Dict[str, Any]] = None
     severity_indicators: Optional[List[str]] = None
@@ -27,15 +67,31 @@ class SymptomAnalyzerRequest(BaseModel):
     priority: Optional[str] = "medium"
     patient_id: Optional[str] = None  # Added patient_id for FHIR lookups
 
+class PrefetchRequest(BaseModel):
+    symptoms_text: str = ""
+    patient_id: Optional[str] = None
+
+class PrefetchResponse(BaseModel):
+    patient_id: Optional[str] = None
+    warmed: bool = False
+
+class CacheInvalidation(BaseModel):
+    patient_id: Optional[str] = None
+
+class CacheInvalidationResponse(BaseModel):
+    invalidated: int = 0
+
 class SemanticAnalysis(BaseModel):
     temporal_info: Dict[str, Any] = Field(default_factory=dict)
     severity_assessment: str
     contextual_factors: List[str] = Field(default_factory=list)
     confidence_factors: Dict[str, float] = Field(default_factory=dict)
-    fhir_data: Optional[Dict[str, Any]] = Field(default_factory=dict)
+    # Processed FHIR data is built by the analyzer itself, so it is carried without being validated
+    fhir_data: SkipValidation[Optional[Dict[str, Any]]] = Field(default_factory=dict)
     
 class FHIRContext(BaseModel):
-    patient_history: Optional[Dict[str, Any]] = None
+    # The patient's processed FHIR bundle; unvalidated like SemanticAnalysis.fhir_data
+    patient_history: SkipValidation[Optional[Dict[str, Any]]] = None
     previous_symptoms: Optional[List[str]] = None
     historical_severity: Optional[str] = None
     
@@ -52,541 +108,726 @@ class SymptomAnalyzerResponse(BaseModel):
     error: Optional[str] = None
     patient_id: Optional[str] = None  # Added to ensure patient ID is in the top-level response
 
+# Enhanced symptom mapping with severity indicators and more comprehensive matching
+SYMPTOM_MAP = {
+    'headache': {
+        'keywords': ['headache', 'head pain', 'head ache', 'migraine', 'head hurts', 'pounding head'],
+        'severity_indicators': ['severe', 'intense', 'mild', 'throbbing', 'pounding', 'terrible', 'worst', 'unbearable', 'slight'],
+        'temporal_patterns': ['constant', 'intermittent', 'sudden', 'all day', 'since morning', 'keeps coming back'],
+        'severity_weights': {
+            'unbearable': 1.0,
+            'worst': 1.0,
+            'terrible': 0.9,
+            'severe': 0.8,
+            'intense': 0.8,
+            'throbbing': 0.7,
+            'pounding': 0.7,
+            'moderate': 0.5,
+            'mild': 0.3,
+            'slight': 0.2
+        }
+    },
+    'nausea': {
+        'keywords': ['nausea', 'nauseous', 'feeling sick', 'want to vomit', 'queasy', 'stomach turning'],
+        'severity_indicators': ['severe', 'mild', 'overwhelming', 'intense', 'constant', 'comes and goes'],
+        'temporal_patterns': ['after eating', 'morning', 'constant', 'all day', 'when moving'],
+        'severity_weights': {
+            'overwhelming': 1.0,
+            'severe': 0.8,
+            'intense': 0.8,
+            'constant': 0.7,
+            'moderate': 0.5,
+            'mild': 0.3
+        }
+    },
+    'fever': {
+        'keywords': ['fever', 'high temperature', 'temperature', 'running hot', 'feel hot', 'burning up'],
+        'severity_indicators': ['high', 'low-grade', 'mild', 'severe', 'extreme', 'burning'],
+        'temporal_patterns': ['persistent', 'intermittent', 'night', 'all day', 'comes and goes'],
+        'severity_weights': {
+            'extreme': 1.0,
+            'very high': 0.9,
+            'high': 0.8,
+            'burning': 0.7,
+            'moderate': 0.5,
+            'low-grade': 0.3,
+            'mild': 0.2
+        }
+    },
+    'cough': {
+        'keywords': ['cough', 'coughing', 'chest cough', 'dry cough', 'hacking', 'clearing throat'],
+        'severity_indicators': ['severe', 'mild', 'dry', 'wet', 'productive', 'hacking', 'constant'],
+        'temporal_patterns': ['persistent', 'intermittent', 'night', 'morning', 'all day', 'when talking'],
+        'severity_weights': {
+            'severe': 0.9,
+            'hacking': 0.8,
+            'constant': 0.7,
+            'productive': 0.6,
+            'wet': 0.5,
+            'dry': 0.4,
+            'mild': 0.3
+        }
+    },
+    'fatigue': {
+        'keywords': ['fatigue', 'tired', 'exhausted', 'no energy', 'weakness', 'drained', 'lethargic'],
+        'severity_indicators': ['severe', 'mild', 'extreme', 'complete', 'overwhelming', 'constant'],
+        'temporal_patterns': ['constant', 'morning', 'evening', 'after activity', 'all day', 'getting worse'],
+        'severity_weights': {
+            'extreme': 1.0,
+            'overwhelming': 0.9,
+            'severe': 0.8,
+            'complete': 0.8,
+            'constant': 0.7,
+            'moderate': 0.5,
+            'mild': 0.3
+        }
+    },
+    'sore throat': {
+        'keywords': ['sore throat', 'throat pain', 'throat ache', 'painful throat', 'scratchy throat', 'throat hurts'],
+        'severity_indicators': ['severe', 'mild', 'burning', 'very sore', 'scratchy', 'raw'],
+        'temporal_patterns': ['constant', 'morning', 'night', 'when swallowing', 'after talking', 'getting worse'],
+        'severity_weights': {
+            'severe': 0.9,
+            'very sore': 0.8,
+            'burning': 0.7,
+            'raw': 0.6,
+            'scratchy': 0.5,
+            'mild': 0.3
+        }
+    },
+    # Add more symptoms with detailed attributes
+}
+
+# Common patterns for patient ID (with variations)
+PATIENT_ID_BASE_PATTERNS = [
+    "patient id",
+    "patientid",
+    "patient",
+    "id",
+    "patient number",
+    "patient#",
+    "pid",
+    "p#"
+]
+
+# Generate variations of patterns (with colon, with equals, with space)
+PATIENT_ID_PATTERNS = [
+    f"{base}{suffix}".strip()
+    for base in PATIENT_ID_BASE_PATTERNS
+    for suffix in (":", "=", " ")
+]
+
+
+def normalize_patient_id(patient_id: str) -> str:
+    """Patient ID in the P-prefixed form used for FHIR lookups"""
+    return patient_id if patient_id.startswith('P') else f"P{patient_id}"
+
+
+def extract_patient_id(text: str) -> Tuple[Optional[str], str]:
+    """
+    Finds a patient ID in lower-cased symptom text.
+    Returns the formatted ID (or None) and the text with the ID removed.
+    """
+    # Normalize text by removing extra spaces around punctuation
+    text_normalized = text
+    for punct in [':', ';', ',', '-', '_']:
+        text_normalized = text_normalized.replace(f' {punct}', punct)
+        text_normalized = text_normalized.replace(f'{punct} ', punct)
+
+    logger.info(f"Normalized text: '{text_normalized}'")
+
+    # Try to find patient ID using various patterns
+    for pattern in PATIENT_ID_PATTERNS:
+        if pattern not in text_normalized:
+            continue
+        logger.debug(f"Found pattern '{pattern}' in text")
+        parts = text_normalized.split(pattern, 1)  # Split only on first occurrence
+        if len(parts) > 1:
+            # Extract first word after the pattern as potential ID
+            potential_text = parts[1].strip()
+            words = potential_text.split()
+            if words:
+                # Clean up the ID
+                clean_id = words[0].strip(",:;-_#= ")
+                if clean_id:
+                    # Convert to uppercase and add P prefix if missing
+                    patient_id = normalize_patient_id(clean_id.upper())
+
+                    # Remove the ID part from symptom text
+                    remaining_text = " ".join(words[1:])
+                    text = (parts[0].strip() + " " + remaining_text).strip()
+
+                    logger.info(f"Successfully extracted patient ID: '{patient_id}'")
+                    logger.info(f"Remaining symptom text: '{text}'")
+                    return patient_id, text
+                else:
+                    logger.debug(f"Invalid ID format: '{clean_id}'")
+            else:
+                logger.debug("No words found after pattern")
+    return None, text
+
+
+def extract_symptoms(text: str, symptom_map: Dict[str, Dict[str, Any]] = SYMPTOM_MAP) -> Dict[str, Any]:
+    """
+    Matches symptom keywords, severity indicators and temporal patterns in text.
+    """
+    identified_symptoms = []
+    symptom_details = {}  # Store detailed information about each symptom
+    contextual_factors = []
+    temporal_info = {}
+
+    for symptom, info in symptom_map.items():
+        # Check for symptom keywords
+        matching_keywords = [kw for kw in info['keywords'] if kw in text]
+        if not matching_keywords:
+            continue
+        identified_symptoms.append(symptom)
+        symptom_details[symptom] = {'keywords': matching_keywords}
+
+        # Analyze severity for this symptom
+        severity_indicators = [ind for ind in info['severity_indicators'] if ind in text]
+        if severity_indicators:
+            contextual_factors.extend(severity_indicators)
+            symptom_details[symptom]['severity_indicators'] = severity_indicators
+
+        # Analyze temporal patterns
+        temporal_patterns = [pat for pat in info['temporal_patterns'] if pat in text]
+        if temporal_patterns:
+            temporal_info[symptom] = temporal_patterns
+            symptom_details[symptom]['temporal_patterns'] = temporal_patterns
+
+    return {
+        'identified_symptoms': identified_symptoms,
+        'symptom_details': symptom_details,
+        'contextual_factors': contextual_factors,
+        'temporal_info': temporal_info
+    }
+
+
+def assess_severity(identified_symptoms: List[str], text: str,
+                    semantic_context: Optional[Dict[str, Any]] = None,
+                    symptom_map: Dict[str, Dict[str, Any]] = SYMPTOM_MAP) -> Tuple[str, float]:
+    """
+    Enhanced severity determination using weights and context.
+    Returns the severity level and the confidence in that assessment.
+    """
+    severity = "unknown"
+    confidence = 0.5
+    severity_scores = []
+
+    # Check each identified symptom for severity indicators in text
+    for symptom in identified_symptoms:
+        symptom_info = symptom_map[symptom]
+        max_severity_score = 0
+
+        # Check each severity indicator in text
+        for indicator in symptom_info['severity_indicators']:
+            if indicator in text:
+                severity_score = symptom_info['severity_weights'].get(indicator, 0.5)
+                max_severity_score = max(max_severity_score, severity_score)
+
+        if max_severity_score > 0:
+            severity_scores.append(max_severity_score)
+
+    # Calculate average severity score if we have any
+    if severity_scores:
+        avg_severity_score = sum(severity_scores) / len(severity_scores)
+
+        # Determine severity level based on average score
+        if avg_severity_score >= 0.8:
+            severity = "high"
+            confidence = 0.9
+        elif avg_severity_score >= 0.5:
+            severity = "medium"
+            confidence = 0.8
+        else:
+            severity = "low"
+            confidence = 0.7
+    else:
+        # Fallback to symptom count and semantic context
+        if semantic_context and semantic_context.get('severity_indicators'):
+            # Use semantic understanding
+            severity_indicators = semantic_context['severity_indicators']
+            if any(indicator in ['severe', 'intense', 'extreme', 'unbearable', 'worst'] for indicator in severity_indicators):
+                severity = "high"
+                confidence = 0.9
+            elif any(indicator in ['moderate', 'medium', 'significant'] for indicator in severity_indicators):
+                severity = "medium"
+                confidence = 0.8
+            else:
+                severity = "low"
+                confidence = 0.7
+        else:
+            # Last resort: use symptom count
+            if len(identified_symptoms) >= 4:
+                severity = "high"
+                confidence = 0.8
+            elif len(identified_symptoms) >= 2:
+                severity = "medium"
+                confidence = 0.7
+            else:
+                severity = "low"
+                confidence = 0.6
+
+    return severity, confidence
+
+
+def analysis_key(payload: Dict[str, Any]) -> Tuple[str, str, str]:
+    """
+    (text, patient ID, semantic context hash) identifying duplicate
+    requests, normalized only the way the analysis itself normalizes them
+    """
+    text = payload["symptoms_text"].lower()
+    patient_id = normalize_patient_id(payload["patient_id"]) if payload.get("patient_id") else ""
+    context = payload.get("semantic_context")
+    context_hash = hashlib.sha256(
+        json.dumps(context, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")).hexdigest()
+    return text, patient_id, context_hash
+
+
+def _semantic_analysis(extraction: Dict[str, Any]) -> Dict[str, Any]:
+    """A SemanticAnalysis dict, before severity and FHIR data are known"""
+    return {
+        "temporal_info": extraction['temporal_info'],
+        "severity_assessment": "unknown",
+        "contextual_factors": extraction['contextual_factors'],
+        "confidence_factors": {},
+        "fhir_data": {},
+    }
+
+
+def _response(result: Optional[Dict[str, Any]] = None, error: Optional[str] = None,
+              patient_id: Optional[str] = None) -> Dict[str, Any]:
+    """A SymptomAnalyzerResponse as the dict the in-process transport hands on"""
+    return {"result": result, "error": error, "patient_id": patient_id}
+
+
+class _Analysis:
+    """Intermediate state of one symptom analysis, between the local steps and the FHIR lookup"""
+    def __init__(self, payload: Dict[str, Any]):
+        self.symptoms_text = payload.get("symptoms_text") or ""
+        self.priority = payload.get("priority", "medium")
+        self.request_patient_id = payload.get("patient_id")
+        self.semantic_context = payload.get("semantic_context")
+        self.text = ""
+        self.patient_id: Optional[str] = None
+        self.identified_symptoms: List[str] = []
+        self.semantic_analysis: Optional[Dict[str, Any]] = None
+        self.severity = "low"
+        self.severity_confidence = 0.0
+        self.fhir_context: Dict[str, Any] = {
+            "patient_history": None, "previous_symptoms": None, "historical_severity": None}
+        self.using_patient_context = False
+        self.fetch_fhir = False
+        # Confidence factors decided before extraction, applied once the analysis exists
+        self.pending_factors: Dict[str, float] = {}
+
+
 @app.post("/analyze_symptoms", response_model=SymptomAnalyzerResponse)
-def analyze_symptoms(request: SymptomAnalyzerRequest):
+async def analyze_symptoms(request: SymptomAnalyzerRequest):
     """
     Analyzes symptoms with semantic understanding and temporal context.
+    Concurrent identical requests (retries, several clinicians opening the
+    same case) share one analysis and FHIR fetch. The FHIR lookup is
+    awaited on the event loop, so waiting requests hold no worker thread.
+    """
+    payload = request.model_dump()
+    response, shared = await analysis_flight_async.do(
+        analysis_key(payload), lambda: _analyze_symptoms_async(payload))
+    if shared:
+        logger.info("Served symptom analysis from an identical in-flight request")
+    return SymptomAnalyzerResponse.model_validate(response)
+
+
+def analyze(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Blocking analysis of a request dict, returning the response dict; for
+    in-process callers on worker threads, which skip request validation.
     """
+    response, shared = analysis_flight.do(analysis_key(payload), lambda: _analyze_symptoms(payload))
+    if shared:
+        logger.info("Served symptom analysis from an identical in-flight request")
+        # The orchestrator edits results in place; each waiter gets its own
+        response = copy.deepcopy(response)
+    return response
+
+
+# The FHIR history fetch needs only the patient ID, so it starts as soon as
+# that is known and runs while symptoms are extracted and scored locally.
+
+def _analyze_symptoms(payload: Dict[str, Any]) -> Dict[str, Any]:
+    history = None
     try:
-        logger.info(f"Starting symptom analysis with priority: {request.priority}")
-        
-        if not request.symptoms_text:
-            raise HTTPException(status_code=400, detail="Symptoms text is required")
-            
-        # Initial context before text analysis
-        initial_context = {
-            "priority": request.priority,
-            "initial_patient_id": request.patient_id,
-            "has_semantic_context": bool(request.semantic_context)
-        }
-        logger.info(f"Initial request context: {initial_context}")
+        analysis = _resolve_patient(payload)
+        if analysis.fetch_fhir:
+            history = fhir_prefetch_pool.submit(
+                contextvars.copy_context().run, fhir_connector.get_patient_history, analysis.patient_id)
+        _extract_locally(analysis)
+        if history is not None:
+            try:
+                fhir_data = fhir_connector.enrich_symptoms_from_history(
+                    analysis.identified_symptoms, analysis.patient_id, history.result())
+                _apply_fhir_data(analysis, fhir_data)
+            except Exception as e:
+                logger.error(f"FHIR enrichment failed: {str(e)}")
+                analysis.semantic_analysis['confidence_factors']['fhir_lookup_failed'] = 0.4
+        return _finish_analysis(analysis)
+    except Exception as e:
+        if history is not None:
+            history.cancel()
+        return _error_response(e)
 
-        if request.patient_id:
-            logger.info(f"Processing request for patient: {request.patient_id}")
-            
-        if request.semantic_context:
-            logger.info(f"Semantic context available with intent: {request.semantic_context.intent} and confidence: {request.semantic_context.confidence}")
-            if request.semantic_context.severity_indicators:
-                logger.info(f"Severity indicators from context: {request.semantic_context.severity_indicators}")
 
-        logger.info("Beginning symptom extraction and analysis")
-        
-        # Initialize data structures
-        identified_symptoms = []
-        semantic_analysis = SemanticAnalysis(
-            temporal_info={},
-            severity_assessment="unknown",
-            contextual_factors=[],
-            confidence_factors={},
-            fhir_data={}
-        )
-        
-        # Extract text and semantic context
-        text = request.symptoms_text.lower()
-        semantic_context = request.semantic_context
-        
-        # Extract patient ID if present in text using multiple formats
-        patient_id = None
-        text_lower = text.lower()
-        original_text = text  # Keep original for logging
-        
-        logger.info(f"Processing text for patient ID: '{text_lower}'")
-        
-        # Normalize text by removing extra spaces around punctuation
-        text_normalized = text_lower
-        for punct in [':', ';', ',', '-', '_']:
-            text_normalized = text_normalized.replace(f' {punct}', punct)
-            text_normalized = text_normalized.replace(f'{punct} ', punct)
-        
-        logger.info(f"Normalized text: '{text_normalized}'")
-        
-        # Common patterns for patient ID (with variations)
-        base_patterns = [
-            "patient id",
-            "patientid",
-            "patient",
-            "id",
-            "patient number",
-            "patient#",
-            "pid",
-            "p#"
-        ]
-        
-        # Generate variations of patterns
-        patterns = []
-        for base in base_patterns:
-            patterns.append(f"{base}:")  # with colon
-            patterns.append(f"{base}=")  # with equals
-            patterns.append(f"{base} ")  # with space
-            
-        logger.info(f"Checking {len(patterns)} pattern variations")
-        
-        # Try to find patient ID using various patterns
-        for pattern in patterns:
-            pattern = pattern.strip()
-            logger.info(f"Checking pattern: '{pattern}'")
-            if pattern in text_normalized:
-                logger.info(f"Found pattern '{pattern}' in text")
-                parts = text_normalized.split(pattern, 1)  # Split only on first occurrence
-                if len(parts) > 1:
-                    # Extract potential ID and clean up surrounding text
-                    potential_text = parts[1].strip()
-                    logger.info(f"Text after pattern: '{potential_text}'")
-                    
-                    # Extract first word as potential ID
-                    words = potential_text.split()
-                    if words:
-                        potential_id = words[0]
-                        logger.info(f"Potential ID found: '{potential_id}'")
-                        
-                        # Clean up the ID
-                        clean_id = potential_id.strip(",:;-_#= ")
-                        logger.info(f"Cleaned ID: '{clean_id}'")
-                        
-                        # Validate ID format
-                        if clean_id:
-                            # Convert to uppercase and add P prefix if missing
-                            patient_id = clean_id.upper()
-                            if not patient_id.startswith('P'):
-                                patient_id = f"P{patient_id}"
-                            logger.info(f"Formatted patient ID: '{patient_id}'")
-                            
-                            # Remove the ID part from symptom text
-                            remaining_text = " ".join(potential_text.split()[1:])
-                            text = (parts[0].strip() + " " + remaining_text).strip()
-                            
-                            logger.info(f"Successfully extracted patient ID: '{patient_id}'")
-                            logger.info(f"Remaining symptom text: '{text}'")
-                            break
-                        else:
-                            logger.info(f"Invalid ID format: '{clean_id}'")
-                    else:
-                        logger.info("No words found after pattern")
-        
-        # Log the ID extraction results
-        logger.info(f"ID from request: {request.patient_id}")
-        logger.info(f"ID extracted from text: {patient_id}")
-        
-        # Use provided patient ID if available, otherwise use extracted one
-        final_patient_id = request.patient_id or patient_id
-        if final_patient_id:
-            # Ensure consistent format
-            if not final_patient_id.startswith('P'):
-                final_patient_id = f"P{final_patient_id}"
-            logger.info(f"Using final patient ID: {final_patient_id}")
-            
-            # Update request context log
-            request_context = {
-                'priority': request.priority,
-                'has_patient_id': True,
-                'patient_id': final_patient_id,
-                'id_source': 'request' if request.patient_id else 'text'
-            }
-            logger.info(f"Updated request context: {request_context}")
+async def _analyze_symptoms_async(payload: Dict[str, Any]) -> Dict[str, Any]:
+    history = None
+    try:
+        analysis = _resolve_patient(payload)
+        if analysis.fetch_fhir:
+            history = asyncio.create_task(async_fhir_connector.get_patient_history(analysis.patient_id))
+            # Let the task send its request before extraction holds the event loop
+            await asyncio.sleep(0)
+        # Local extraction is cheap for chat-sized text; very long text is analysed off the event loop
+        if len(analysis.symptoms_text) > ANALYSIS_OFFLOAD_CHARS:
+            await run_in_threadpool(_extract_locally, analysis)
         else:
-            logger.info("No patient ID found in request or text")
+            _extract_locally(analysis)
+        if history is not None:
+            try:
+                fhir_data = await async_fhir_connector.enrich_from_history(
+                    analysis.identified_symptoms, analysis.patient_id, await history)
+                _apply_fhir_data(analysis, fhir_data)
+            except Exception as e:
+                logger.error(f"FHIR enrichment failed: {str(e)}")
+                analysis.semantic_analysis['confidence_factors']['fhir_lookup_failed'] = 0.4
+        return _finish_analysis(analysis)
+    except Exception as e:
+        if history is not None:
+            history.cancel()
+        return _error_response(e)
+
+
+def _resolve_patient(payload: Dict[str, Any]) -> _Analysis:
+    """Patient ID and the FHIR decision; the only steps the history fetch waits for"""
+    analysis = _Analysis(payload)
+    semantic_context = analysis.semantic_context
+    logger.info(f"Starting symptom analysis with priority: {analysis.priority}")
+    
+    if not analysis.symptoms_text:
+        raise HTTPException(status_code=400, detail="Symptoms text is required")
         
-        # Store the final patient ID for use in the rest of the function
-        patient_id = final_patient_id
+    # Initial context before text analysis
+    initial_context = {
+        "priority": analysis.priority,
+        "initial_patient_id": analysis.request_patient_id,
+        "has_semantic_context": bool(semantic_context)
+    }
+    logger.info(f"Initial request context: {initial_context}")
+
+    if analysis.request_patient_id:
+        logger.info(f"Processing request for patient: {analysis.request_patient_id}")
         
-        # Update the text if we extracted an ID
-        if patient_id and text != original_text:
-            logger.info(f"Text after ID removal: '{text}'")
+    if semantic_context:
+        logger.info(f"Semantic context available with intent: {semantic_context.get('intent')} and confidence: {semantic_context.get('confidence')}")
+        if semantic_context.get('severity_indicators'):
+            logger.info(f"Severity indicators from context: {semantic_context['severity_indicators']}")
+
+    logger.info("Beginning symptom extraction and analysis")
+    
+    # Extract text and semantic context
+    text = analysis.symptoms_text.lower()
+    
+    # Extract patient ID if present in text using multiple formats
+    logger.info(f"Processing text for patient ID: '{text}'")
+    patient_id, text = extract_patient_id(text)
+    
+    # Log the ID extraction results
+    logger.info(f"ID from request: {analysis.request_patient_id}")
+    logger.info(f"ID extracted from text: {patient_id}")
+    
+    # Use provided patient ID if available, otherwise use extracted one
+    final_patient_id = analysis.request_patient_id or patient_id
+    if final_patient_id:
+        # Ensure consistent format
+        final_patient_id = normalize_patient_id(final_patient_id)
+        logger.info(f"Using final patient ID: {final_patient_id}")
         
-        # Enhanced symptom mapping with severity indicators and more comprehensive matching
-        symptom_map = {
-            'headache': {
-                'keywords': ['headache', 'head pain', 'head ache', 'migraine', 'head hurts', 'pounding head'],
-                'severity_indicators': ['severe', 'intense', 'mild', 'throbbing', 'pounding', 'terrible', 'worst', 'unbearable', 'slight'],
-                'temporal_patterns': ['constant', 'intermittent', 'sudden', 'all day', 'since morning', 'keeps coming back'],
-                'severity_weights': {
-                    'unbearable': 1.0,
-                    'worst': 1.0,
-                    'terrible': 0.9,
-                    'severe': 0.8,
-                    'intense': 0.8,
-                    'throbbing': 0.7,
-                    'pounding': 0.7,
-                    'moderate': 0.5,
-                    'mild': 0.3,
-                    'slight': 0.2
-                }
-            },
-            'nausea': {
-                'keywords': ['nausea', 'nauseous', 'feeling sick', 'want to vomit', 'queasy', 'stomach turning'],
-                'severity_indicators': ['severe', 'mild', 'overwhelming', 'intense', 'constant', 'comes and goes'],
-                'temporal_patterns': ['after eating', 'morning', 'constant', 'all day', 'when moving'],
-                'severity_weights': {
-                    'overwhelming': 1.0,
-                    'severe': 0.8,
-                    'intense': 0.8,
-                    'constant': 0.7,
-                    'moderate': 0.5,
-                    'mild': 0.3
-                }
-            },
-            'fever': {
-                'keywords': ['fever', 'high temperature', 'temperature', 'running hot', 'feel hot', 'burning up'],
-                'severity_indicators': ['high', 'low-grade', 'mild', 'severe', 'extreme', 'burning'],
-                'temporal_patterns': ['persistent', 'intermittent', 'night', 'all day', 'comes and goes'],
-                'severity_weights': {
-                    'extreme': 1.0,
-                    'very high': 0.9,
-                    'high': 0.8,
-                    'burning': 0.7,
-                    'moderate': 0.5,
-                    'low-grade': 0.3,
-                    'mild': 0.2
-                }
-            },
-            'cough': {
-                'keywords': ['cough', 'coughing', 'chest cough', 'dry cough', 'hacking', 'clearing throat'],
-                'severity_indicators': ['severe', 'mild', 'dry', 'wet', 'productive', 'hacking', 'constant'],
-                'temporal_patterns': ['persistent', 'intermittent', 'night', 'morning', 'all day', 'when talking'],
-                'severity_weights': {
-                    'severe': 0.9,
-                    'hacking': 0.8,
-                    'constant': 0.7,
-                    'productive': 0.6,
-                    'wet': 0.5,
-                    'dry': 0.4,
-                    'mild': 0.3
-                }
-            },
-            'fatigue': {
-                'keywords': ['fatigue', 'tired', 'exhausted', 'no energy', 'weakness', 'drained', 'lethargic'],
-                'severity_indicators': ['severe', 'mild', 'extreme', 'complete', 'overwhelming', 'constant'],
-                'temporal_patterns': ['constant', 'morning', 'evening', 'after activity', 'all day', 'getting worse'],
-                'severity_weights': {
-                    'extreme': 1.0,
-                    'overwhelming': 0.9,
-                    'severe': 0.8,
-                    'complete': 0.8,
-                    'constant': 0.7,
-                    'moderate': 0.5,
-                    'mild': 0.3
-                }
-            },
-            'sore throat': {
-                'keywords': ['sore throat', 'throat pain', 'throat ache', 'painful throat', 'scratchy throat', 'throat hurts'],
-                'severity_indicators': ['severe', 'mild', 'burning', 'very sore', 'scratchy', 'raw'],
-                'temporal_patterns': ['constant', 'morning', 'night', 'when swallowing', 'after talking', 'getting worse'],
-                'severity_weights': {
-                    'severe': 0.9,
-                    'very sore': 0.8,
-                    'burning': 0.7,
-                    'raw': 0.6,
-                    'scratchy': 0.5,
-                    'mild': 0.3
-                }
-            },
-            # Add more symptoms with detailed attributes
+        # Update request context log
+        request_context = {
+            'priority': analysis.priority,
+            'has_patient_id': True,
+            'patient_id': final_patient_id,
+            'id_source': 'request' if analysis.request_patient_id else 'text'
         }
+        logger.info(f"Updated request context: {request_context}")
+    else:
+        logger.info("No patient ID found in request or text")
+    
+    # Store the final patient ID for use in the rest of the analysis
+    analysis.patient_id = patient_id = final_patient_id
+    analysis.text = text
+
+    # Enhanced FHIR integration
+    using_patient_context = analysis.using_patient_context = bool(patient_id)
+    
+    # Log the analysis path and context
+    logger.info(f"Final patient ID for analysis: {patient_id}")
+    logger.info(f"Analysis path: {'with patient context' if using_patient_context else 'without patient context'}")
+    
+    # Update request context after patient ID processing
+    final_context = {
+        "priority": analysis.priority,
+        "has_patient_id": using_patient_context,
+        "patient_id": patient_id if using_patient_context else None,
+        "has_semantic_context": bool(semantic_context)
+    }
+    logger.info(f"Final analysis context: {final_context}")
+
+    # FHIR Integration
+    if using_patient_context and not has_budget(FHIR_MIN_BUDGET_SECONDS, stage="fhir_enrichment"):
+        logger.warning(f"Skipping FHIR enrichment for patient {patient_id}: request deadline nearly spent")
+        analysis.pending_factors['fhir_skipped_deadline'] = 0.4
+    elif using_patient_context:
+        logger.info(f"Enriching symptoms with FHIR data for patient {patient_id}")
+        analysis.fetch_fhir = True
+    else:
+        logger.info("Analyzing symptoms without patient context")
+        analysis.pending_factors['no_patient_context'] = 0.5
+    return analysis
 
-        # Initialize semantic analysis
-        semantic_analysis = SemanticAnalysis(
-            temporal_info={},
-            severity_assessment="unknown",
-            contextual_factors=[],
-            confidence_factors={},
-            fhir_data={}
-        )
-
-        # Extract symptoms first before FHIR integration
-        # Enhanced symptom extraction using semantic context
-        identified_symptoms = []  # Clear the list to avoid duplicates
-        symptom_details = {}  # Store detailed information about each symptom
+
+def _extract_locally(analysis: _Analysis):
+    """Symptom extraction and severity scoring from the text alone"""
+    text = analysis.text
+    # Extract symptoms before FHIR integration
+    extraction = extract_symptoms(text)
+    analysis.identified_symptoms = extraction['identified_symptoms']
+    analysis.semantic_analysis = _semantic_analysis(extraction)
+    logger.info(f"Initial symptoms extracted: {analysis.identified_symptoms}")
+    logger.info(f"Symptom details: {extraction['symptom_details']}")
+
+    analysis.semantic_analysis['confidence_factors'].update(analysis.pending_factors)
+
+    # Enhanced severity determination using weights and context
+    analysis.severity, analysis.severity_confidence = assess_severity(
+        analysis.identified_symptoms, text, analysis.semantic_context)
+
+
+def _apply_fhir_data(analysis: _Analysis, fhir_data: Dict[str, Any]):
+    """Fold the patient's FHIR history into the analysis"""
+    semantic_analysis = analysis.semantic_analysis
+    fhir_context = analysis.fhir_context
+    if fhir_data['has_patient_history']:
+        # Process FHIR data for previous symptoms and severity
+        previous_symptoms = []
+        historical_severity = "unknown"
+        severe_count = 0
+        moderate_count = 0
         
-        for symptom, info in symptom_map.items():
-            # Check for symptom keywords
-            matching_keywords = [kw for kw in info['keywords'] if kw in text]
-            if matching_keywords:
-                if symptom not in identified_symptoms:  # Avoid duplicates
-                    identified_symptoms.append(symptom)
-                    symptom_details[symptom] = {'keywords': matching_keywords}
-                
-                # Analyze severity for this symptom
-                severity_indicators = [ind for ind in info['severity_indicators'] if ind in text]
-                if severity_indicators:
-                    semantic_analysis.contextual_factors.extend(severity_indicators)
-                    symptom_details[symptom]['severity_indicators'] = severity_indicators
-                
-                # Analyze temporal patterns
-                temporal_patterns = [pat for pat in info['temporal_patterns'] if pat in text]
-                if temporal_patterns:
-                    semantic_analysis.temporal_info[symptom] = temporal_patterns
-                    symptom_details[symptom]['temporal_patterns'] = temporal_patterns
-                    
-        logger.info(f"Initial symptoms extracted: {identified_symptoms}")
-        logger.info(f"Symptom details: {symptom_details}")
+        # Extract relevant symptom history
+        for record in fhir_data['symptom_history']:
+            if record['symptom']:
+                previous_symptoms.append(record['symptom'])
+                if record['severity'] == 'severe':
+                    severe_count += 1
+                elif record['severity'] == 'moderate':
+                    moderate_count += 1
         
-        logger.info(f"Initial symptoms identified: {identified_symptoms}")
-
-        # Enhanced FHIR integration
-        fhir_context = FHIRContext()
-        using_patient_context = bool(patient_id)
+        # Determine overall historical severity
+        if severe_count > 0:
+            historical_severity = 'high'
+        elif moderate_count > 0:
+            historical_severity = 'medium'
+        elif previous_symptoms:
+            historical_severity = 'low'
         
-        # Log the analysis path and context
-        logger.info(f"Final patient ID for analysis: {patient_id}")
-        logger.info(f"Analysis path: {'with patient context' if using_patient_context else 'without patient context'}")
+        # Update FHIR context with enriched data
+        fhir_context['patient_history'] = fhir_data
+        fhir_context['previous_symptoms'] = previous_symptoms
+        fhir_context['historical_severity'] = historical_severity
         
-        # Update request context after patient ID processing
-        final_context = {
-            "priority": request.priority,
-            "has_patient_id": using_patient_context,
-            "patient_id": patient_id if using_patient_context else None,
-            "has_semantic_context": bool(request.semantic_context)
+        # Add historical context to semantic analysis
+        semantic_analysis['temporal_info']['patient_history'] = {
+            'previous_symptoms': previous_symptoms,
+            'historical_severity': historical_severity,
+            'last_recorded': fhir_data['last_recorded_date'],
+            'symptom_recurrence': {
+                'severe_count': severe_count,
+                'moderate_count': moderate_count,
+                'total_records': len(previous_symptoms)
+            }
         }
-        logger.info(f"Final analysis context: {final_context}")
-
-        # FHIR Integration
-        if using_patient_context:
-            logger.info(f"Enriching symptoms with FHIR data for patient {patient_id}")
-            try:
-                # Get patient history through FHIR connector
-                fhir_data = fhir_connector.enrich_symptoms(identified_symptoms, patient_id)
-                
-                if fhir_data['has_patient_history']:
-                    # Process FHIR data for previous symptoms and severity
-                    previous_symptoms = []
-                    historical_severity = "unknown"
-                    severe_count = 0
-                    moderate_count = 0
-                    
-                    # Extract relevant symptom history
-                    for record in fhir_data['symptom_history']:
-                        if record['symptom']:
-                            previous_symptoms.append(record['symptom'])
-                            if record['severity'] == 'severe':
-                                severe_count += 1
-                            elif record['severity'] == 'moderate':
-                                moderate_count += 1
-                    
-                    # Determine overall historical severity
-                    if severe_count > 0:
-                        historical_severity = 'high'
-                    elif moderate_count > 0:
-                        historical_severity = 'medium'
-                    elif previous_symptoms:
-                        historical_severity = 'low'
-                    
-                    # Update FHIR context with enriched data
-                    fhir_context.patient_history = fhir_data
-                    fhir_context.previous_symptoms = previous_symptoms
-                    fhir_context.historical_severity = historical_severity
-                    
-                    # Add historical context to semantic analysis
-                    semantic_analysis.temporal_info['patient_history'] = {
-                        'previous_symptoms': previous_symptoms,
-                        'historical_severity': historical_severity,
-                        'last_recorded': fhir_data['last_recorded_date'],
-                        'symptom_recurrence': {
-                            'severe_count': severe_count,
-                            'moderate_count': moderate_count,
-                            'total_records': len(previous_symptoms)
-                        }
-                    }
-                    
-                    # Add related conditions if any
-                    if fhir_data['related_conditions']:
-                        semantic_analysis.contextual_factors.extend(
-                            [f"related condition: {cond}" for cond in fhir_data['related_conditions']]
-                        )
-                    
-                    # Adjust severity based on historical patterns
-                    matching_symptoms = set(identified_symptoms).intersection(set(previous_symptoms))
-                    if matching_symptoms:
-                        if historical_severity == 'high' and len(matching_symptoms) >= 2:
-                            logger.info("Increasing severity due to recurring severe symptoms")
-                            severity = 'high'
-                            semantic_analysis.confidence_factors['historical_severity'] = 0.9
-                            semantic_analysis.contextual_factors.append("history of severe symptoms")
-                        
-                        # Add confidence boost based on historical matches
-                        confidence_boost = min(0.9, 0.6 + (len(matching_symptoms) * 0.1))
-                        semantic_analysis.confidence_factors['historical_match'] = confidence_boost
-                        logger.info(f"Historical match confidence boost: {confidence_boost} from {len(matching_symptoms)} symptoms")
-                    
-                    logger.info(f"FHIR enrichment complete - Found {len(previous_symptoms)} historical symptoms")
-                else:
-                    logger.info("No patient history found in FHIR data")
-                    semantic_analysis.confidence_factors['no_history'] = 0.5
-                
-            except Exception as e:
-                logger.error(f"FHIR enrichment failed: {str(e)}")
-                semantic_analysis.confidence_factors['fhir_lookup_failed'] = 0.4
-        else:
-            logger.info("Analyzing symptoms without patient context")
-            semantic_analysis.confidence_factors['no_patient_context'] = 0.5
-
-        # Enhanced symptom extraction using semantic context
-        unique_symptoms = set(identified_symptoms)  # Start with existing symptoms
-        for symptom, info in symptom_map.items():
-            # Check for symptom keywords if not already identified
-            if symptom not in unique_symptoms and any(keyword in text for keyword in info['keywords']):
-                unique_symptoms.add(symptom)
-                
-                # Analyze severity for this symptom
-                severity_indicators = [ind for ind in info['severity_indicators'] if ind in text]
-                if severity_indicators:
-                    semantic_analysis.contextual_factors.extend(severity_indicators)
-                
-                # Analyze temporal patterns
-                temporal_patterns = [pat for pat in info['temporal_patterns'] if pat in text]
-                if temporal_patterns:
-                    semantic_analysis.temporal_info[symptom] = temporal_patterns
-        
-        # Update identified_symptoms with unique symptoms
-        identified_symptoms = list(unique_symptoms)
-
-        # Use semantic context if available
-        if semantic_context:
-            # Add temporal context from semantic understanding
-            if semantic_context.temporal_context:
-                semantic_analysis.temporal_info.update(semantic_context.temporal_context)
-            
-            # Add severity indicators from semantic understanding
-            if semantic_context.severity_indicators:
-                semantic_analysis.contextual_factors.extend(semantic_context.severity_indicators)
-
-        # Enhanced severity determination using weights and context
-        severity = "unknown"
-        confidence = 0.5
-        severity_scores = []
         
-        # Check each identified symptom for severity indicators in text
-        for symptom in identified_symptoms:
-            symptom_info = symptom_map[symptom]
-            max_severity_score = 0
-            
-            # Check each severity indicator in text
-            for indicator in symptom_info['severity_indicators']:
-                if indicator in text:
-                    severity_score = symptom_info['severity_weights'].get(indicator, 0.5)
-                    max_severity_score = max(max_severity_score, severity_score)
-            
-            if max_severity_score > 0:
-                severity_scores.append(max_severity_score)
+        # Add related conditions if any
+        if fhir_data['related_conditions']:
+            semantic_analysis['contextual_factors'].extend(
+                [f"related condition: {cond}" for cond in fhir_data['related_conditions']]
+            )
         
-        # Calculate average severity score if we have any
-        if severity_scores:
-            avg_severity_score = sum(severity_scores) / len(severity_scores)
+        # Adjust severity based on historical patterns
+        matching_symptoms = set(analysis.identified_symptoms).intersection(set(previous_symptoms))
+        if matching_symptoms:
+            if historical_severity == 'high' and len(matching_symptoms) >= 2:
+                logger.info("Recurring severe symptoms in patient history")
+                semantic_analysis['confidence_factors']['historical_severity'] = 0.9
+                semantic_analysis['contextual_factors'].append("history of severe symptoms")
             
-            # Determine severity level based on average score
-            if avg_severity_score >= 0.8:
-                severity = "high"
-                confidence = 0.9
-            elif avg_severity_score >= 0.5:
-                severity = "medium"
-                confidence = 0.8
-            else:
-                severity = "low"
-                confidence = 0.7
-        else:
-            # Fallback to symptom count and semantic context
-            if semantic_context and semantic_context.severity_indicators:
-                # Use semantic understanding
-                severity_indicators = semantic_context.severity_indicators
-                if any(indicator in ['severe', 'intense', 'extreme', 'unbearable', 'worst'] for indicator in severity_indicators):
-                    severity = "high"
-                    confidence = 0.9
-                elif any(indicator in ['moderate', 'medium', 'significant'] for indicator in severity_indicators):
-                    severity = "medium"
-                    confidence = 0.8
-                else:
-                    severity = "low"
-                    confidence = 0.7
-            else:
-                # Last resort: use symptom count
-                if len(identified_symptoms) >= 4:
-                    severity = "high"
-                    confidence = 0.8
-                elif len(identified_symptoms) >= 2:
-                    severity = "medium"
-                    confidence = 0.7
-                else:
-                    severity = "low"
-                    confidence = 0.6
-
-        # Check FHIR data for historical severe symptoms
-        if using_patient_context and fhir_context.patient_history:
-            fhir_data = fhir_context.patient_history
-            if fhir_data.get('matching_symptoms'):
-                for match in fhir_data['matching_symptoms']:
-                    if match.get('severity') == 'severe':
-                        logger.info(f"Found severe historical record for {match.get('symptom')}")
-                        severity = 'high'
-                        confidence = 0.9
-                        semantic_analysis.contextual_factors.append(f"historical severe {match.get('symptom')}")
-                        break
-
-        # Update semantic analysis with final severity assessment
-        semantic_analysis.severity_assessment = severity
-        semantic_analysis.confidence_factors.update({
-            "symptom_count": len(set(identified_symptoms)) / 10,  # Normalize to 0-1 using unique symptoms
-            "severity_assessment": confidence
-        })
-
-        # Calculate overall confidence based on all factors
-        semantic_analysis.confidence_factors["semantic_context_confidence"] = (
-            semantic_context.confidence if semantic_context else 0.5
-        )
+            # Add confidence boost based on historical matches
+            confidence_boost = min(0.9, 0.6 + (len(matching_symptoms) * 0.1))
+            semantic_analysis['confidence_factors']['historical_match'] = confidence_boost
+            logger.info(f"Historical match confidence boost: {confidence_boost} from {len(matching_symptoms)} symptoms")
         
-        # Add confidence factors for patient history
-        semantic_analysis.confidence_factors['has_patient_history'] = 1.0 if using_patient_context else 0.0
-        if using_patient_context and fhir_context.patient_history:
-            semantic_analysis.confidence_factors['fhir_data_quality'] = 0.8
-        
-        # Calculate final confidence
-        overall_confidence = sum(semantic_analysis.confidence_factors.values()) / len(semantic_analysis.confidence_factors)
-        
-        # Create final result with FHIR context, using set() to remove duplicates
-        result = SymptomAnalysisResult(
-            identified_symptoms=list(set(identified_symptoms)),
-            confidence=overall_confidence,
-            severity_level=severity,
-            semantic_analysis=semantic_analysis,
-            fhir_context=fhir_context,
-            patient_id=patient_id  # Include the patient ID in the result
-        )
-
-        # Log the final result details
-        logger.info(f"Analysis complete for patient {patient_id if patient_id else 'without ID'}")
-        logger.info(f"Symptoms identified: {identified_symptoms}")
-        logger.info(f"Severity level: {severity}")
-        logger.info(f"Using FHIR data: {using_patient_context}")
-        logger.info(f"Final result patient_id: {result.patient_id}")  # Log patient ID in result
+        logger.info(f"FHIR enrichment complete - Found {len(previous_symptoms)} historical symptoms")
+    else:
+        logger.info("No patient history found in FHIR data")
+        semantic_analysis['confidence_factors']['no_history'] = 0.5
+
+
+def _finish_analysis(analysis: _Analysis) -> Dict[str, Any]:
+    """Severity, confidence and the response, once FHIR data (if any) is in"""
+    semantic_context = analysis.semantic_context
+    semantic_analysis = analysis.semantic_analysis
+    fhir_context = analysis.fhir_context
+    identified_symptoms = analysis.identified_symptoms
+    patient_id = analysis.patient_id
+    using_patient_context = analysis.using_patient_context
+
+    # Use semantic context if available
+    if semantic_context:
+        # Add temporal context from semantic understanding
+        if semantic_context.get('temporal_context'):
+            semantic_analysis['temporal_info'].update(semantic_context['temporal_context'])
         
-        if using_patient_context:
-            logger.info(f"FHIR context details: historical_severity={fhir_context.historical_severity}, "
-                     f"previous_symptoms_count={len(fhir_context.previous_symptoms or [])}")
-
-        # Create response with both result and patient_id at top level
-        response = SymptomAnalyzerResponse(
-            result=result,
-            patient_id=patient_id  # Include patient ID at top level of response
-        )
-        logger.info(f"Sending response with patient_id: {patient_id}")
-        return response
-    except HTTPException as he:
-        logger.error(f"HTTP error in symptom analysis: {str(he)}")
-        return SymptomAnalyzerResponse(error=str(he))
-    except requests.RequestException as re:
-        logger.error(f"FHIR request failed: {str(re)}")
-        return SymptomAnalyzerResponse(error=f"Failed to fetch FHIR data: {str(re)}")
-    except Exception as e:
-        logger.error(f"Unexpected error in symptom analysis: {str(e)}", exc_info=True)
-        return SymptomAnalyzerResponse(error="An unexpected error occurred during symptom analysis")
+        # Add severity indicators from semantic understanding
+        if semantic_context.get('severity_indicators'):
+            semantic_analysis['contextual_factors'].extend(semantic_context['severity_indicators'])
+
+    severity, confidence = analysis.severity, analysis.severity_confidence
+
+    # Check FHIR data for historical severe symptoms
+    if using_patient_context and fhir_context['patient_history']:
+        fhir_data = fhir_context['patient_history']
+        if fhir_data.get('matching_symptoms'):
+            for match in fhir_data['matching_symptoms']:
+                if match.get('severity') == 'severe':
+                    logger.info(f"Found severe historical record for {match.get('symptom')}")
+                    severity = 'high'
+                    confidence = 0.9
+                    semantic_analysis['contextual_factors'].append(f"historical severe {match.get('symptom')}")
+                    break
+
+    # Update semantic analysis with final severity assessment
+    semantic_analysis['severity_assessment'] = severity
+    semantic_analysis['confidence_factors'].update({
+        "symptom_count": len(set(identified_symptoms)) / 10,  # Normalize to 0-1 using unique symptoms
+        "severity_assessment": confidence
+    })
+
+    # Calculate overall confidence based on all factors
+    semantic_analysis['confidence_factors']["semantic_context_confidence"] = (
+        semantic_context.get('confidence', 0.5) if semantic_context else 0.5
+    )
+    
+    # Add confidence factors for patient history
+    semantic_analysis['confidence_factors']['has_patient_history'] = 1.0 if using_patient_context else 0.0
+    if using_patient_context and fhir_context['patient_history']:
+        semantic_analysis['confidence_factors']['fhir_data_quality'] = 0.8
+    
+    # Calculate final confidence
+    overall_confidence = sum(semantic_analysis['confidence_factors'].values()) / len(semantic_analysis['confidence_factors'])
+    
+    # Create final result with FHIR context, using set() to remove duplicates
+    result = {
+        "identified_symptoms": list(set(identified_symptoms)),
+        "confidence": overall_confidence,
+        "severity_level": severity,
+        "semantic_analysis": semantic_analysis,
+        "fhir_context": fhir_context,
+        "patient_id": patient_id  # Include the patient ID in the result
+    }
+
+    # Log the final result details
+    logger.info(f"Analysis complete for patient {patient_id if patient_id else 'without ID'}")
+    logger.info(f"Symptoms identified: {identified_symptoms}")
+    logger.info(f"Severity level: {severity}")
+    logger.info(f"Using FHIR data: {using_patient_context}")
+    logger.info(f"Final result patient_id: {result['patient_id']}")  # Log patient ID in result
+    
+    if using_patient_context:
+        logger.info(f"FHIR context details: historical_severity={fhir_context['historical_severity']}, "
+                 f"previous_symptoms_count={len(fhir_context['previous_symptoms'] or [])}")
+
+    # Create response with both result and patient_id at top level
+    response = _response(
+        result=result,
+        patient_id=patient_id  # Include patient ID at top level of response
+    )
+    logger.info(f"Sending response with patient_id: {patient_id}")
+    return response
+
+
+def _prefetch_patient_id(payload: Dict[str, Any]) -> Optional[str]:
+    """The patient ID an analysis of the same text would look up"""
+    if payload.get("patient_id"):
+        return normalize_patient_id(payload["patient_id"])
+    patient_id, _ = extract_patient_id((payload.get("symptoms_text") or "").lower())
+    return patient_id
+
+
+@app.post("/prefetch", response_model=PrefetchResponse)
+async def prefetch(request: PrefetchRequest):
+    """
+    Warms the patient history cache ahead of an analysis. The orchestrator
+    calls this with the raw prompt while the prompt is still being
+    classified; an analysis arriving mid-fetch joins the same request.
+    """
+    patient_id = _prefetch_patient_id(request.model_dump())
+    if not patient_id:
+        return PrefetchResponse()
+    history = await async_fhir_connector.get_patient_history(patient_id)
+    return PrefetchResponse(patient_id=patient_id, warmed=bool(history))
+
+
+def prefetch_history(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Blocking variant of prefetch on a request dict, for in-process callers on worker threads"""
+    patient_id = _prefetch_patient_id(payload)
+    if not patient_id:
+        return {"patient_id": None, "warmed": False}
+    history = fhir_connector.get_patient_history(patient_id)
+    return {"patient_id": patient_id, "warmed": bool(history)}
+
+
+def invalidate(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Drop cached patient histories, for one patient when patient_id is given
+    (in any of the forms an analysis would look it up by). Called by the
+    orchestrator's /cache/invalidate. A fetch already in flight may still
+    store the old bundle for one FHIR_HISTORY_CACHE_SECONDS.
+    """
+    patient_id = payload.get("patient_id")
+    if not patient_id:
+        return {"invalidated": fhir_history_cache.clear()}
+    forms = {patient_id.lower(), normalize_patient_id(patient_id).lower()}
+    return {"invalidated": fhir_history_cache.invalidate_where(lambda key: str(key).lower() in forms)}
+
+
+@app.post("/cache/invalidate", response_model=CacheInvalidationResponse)
+def invalidate_cache(request: CacheInvalidation):
+    return CacheInvalidationResponse.model_validate(invalidate(request.model_dump()))
+
+
+def _error_response(error: Exception) -> Dict[str, Any]:
+    if isinstance(error, HTTPException):
+        logger.error(f"HTTP error in symptom analysis: {str(error)}")
+        record_error("symptom_analyzer", error)
+        return _response(error=str(error))
+    if isinstance(error, requests.RequestException):
+        logger.error(f"FHIR request failed: {str(error)}")
+        record_error("symptom_analyzer", error)
+        return _response(error=f"Failed to fetch FHIR data: {str(error)}")
+    logger.error(f"Unexpected error in symptom analysis: {str(error)}", exc_info=error)
+    record_error("symptom_analyzer", error)
+    return _response(error="An unexpected error occurred during symptom analysis")
+
 
 @app.get("/health")
 def health_check():
@@ -0,0 +1,151 @@
+"""
+Seeded synthetic inputs for the micro-benchmarks.
+
+Every generator takes a size and a seed so a scaling curve is built from
+inputs that differ only in size.
+"""
+import random
+from typing import Any, Dict, List, Tuple
+
+SEVERITY_WORDS = ['mild', 'moderate', 'severe', 'intense', 'extreme', 'slight']
+TEMPORAL_WORDS = ['constant', 'intermittent', 'morning', 'night', 'all day', 'persistent']
+FILLER_WORDS = ['i', 'have', 'been', 'feeling', 'a', 'bit', 'since', 'yesterday', 'and', 'also', 'some', 'really']
+
+
+def _word(rng: random.Random, length: int = 6) -> str:
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(length))
+
+
+def symptom_map(size: int, seed: int = 0) -> Dict[str, Dict[str, Any]]:
+    """Symptom analyzer vocabulary with `size` symptoms in the SYMPTOM_MAP format"""
+    from agents.symptom_analyzer.main import SYMPTOM_MAP
+
+    rng = random.Random(seed)
+    vocab = dict(SYMPTOM_MAP)
+    while len(vocab) < size:
+        name = f"{_word(rng)} pain"
+        weights = {word: round(rng.uniform(0.2, 1.0), 2) for word in rng.sample(SEVERITY_WORDS, 3)}
+        vocab[name] = {
+            'keywords': [name, f"{_word(rng)} ache"],
+            'severity_indicators': list(weights),
+            'temporal_patterns': rng.sample(TEMPORAL_WORDS, 2),
+            'severity_weights': weights,
+        }
+    return dict(list(vocab.items())[:size])
+
+
+def symptom_text(vocab: Dict[str, Dict[str, Any]], words: int, seed: int = 0,
+                 patient_id: str = "pat1") -> str:
+    """Free-text complaint of roughly `words` words mentioning symptoms from `vocab`"""
+    rng = random.Random(seed)
+    names = list(vocab)
+    parts = [f"patient id: {patient_id}"] if patient_id else []
+    while len(parts) < words:
+        roll = rng.random()
+        if roll < 0.2:
+            parts.append(rng.choice(vocab[rng.choice(names)]['keywords']))
+        elif roll < 0.3:
+            parts.append(rng.choice(SEVERITY_WORDS))
+        elif roll < 0.35:
+            parts.append(rng.choice(TEMPORAL_WORDS))
+        else:
+            parts.append(rng.choice(FILLER_WORDS))
+    return " ".join(parts)
+
+
+def journey_prompt(words: int, seed: int = 0, patient_id: str = "pat7") -> str:
+    """Patient journey query of roughly `words` words with the ID near the end"""
+    rng = random.Random(seed)
+    parts = ["show", "me", "the", "medical", "history"]
+    while len(parts) < words - 2:
+        parts.append(rng.choice(FILLER_WORDS + ['visit', 'treatment', 'appointment']))
+    return " ".join(parts + ["for", patient_id])
+
+
+def fhir_bundle(entries: int, seed: int = 0) -> Dict[str, Any]:
+    """FHIR searchset Bundle of Observation and Condition resources"""
+    rng = random.Random(seed)
+    symptoms = ['headache', 'fever', 'cough', 'nausea', 'fatigue', 'sore throat']
+    interpretations = ['mild', 'moderate', 'severe', 'normal', 'high']
+    bundle_entries = []
+    for i in range(entries):
+        if rng.random() < 0.85:
+            symptom = rng.choice(symptoms)
+            resource = {
+                'resourceType': 'Observation',
+                'id': f"obs-{i}",
+                'code': {'coding': [{'system': 'http://snomed.info/sct', 'display': symptom}], 'text': symptom},
+                'effectiveDateTime': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00Z",
+                'interpretation': [{'text': rng.choice(interpretations)}],
+                'valueQuantity': {'value': round(rng.uniform(36.0, 40.0), 1), 'unit': 'C'},
+            }
+        else:
+            resource = {
+                'resourceType': 'Condition',
+                'id': f"cond-{i}",
+                'code': {'text': rng.choice(['Migraine', 'Asthma', 'Hypertension', 'Diabetes'])},
+            }
+        bundle_entries.append({'resource': resource})
+    return {'resourceType': 'Bundle', 'type': 'searchset', 'total': entries, 'entry': bundle_entries}
+
+
+def disease_symptoms(size: int, seed: int = 0) -> List[str]:
+    """Symptom list for DomainLogic, mixing known and unknown symptom names"""
+    from sub_agents.domain_logic import SYMPTOM_GROUPS
+
+    rng = random.Random(seed)
+    known = sorted({s for group in SYMPTOM_GROUPS.values() for s in group['symptoms']})
+    return [rng.choice(known) if rng.random() < 0.5 else f"{_word(rng)} pain" for _ in range(size)]
+
+
+def disease_rules(groups: int, seed: int = 0) -> Tuple[Dict[Any, Any], Dict[str, Any]]:
+    """DomainLogic symptom patterns and groups scaled to `groups` entries each"""
+    from sub_agents.domain_logic import SYMPTOM_GROUPS, SYMPTOM_PATTERNS
+
+    rng = random.Random(seed)
+    levels = ('low', 'medium', 'high')
+    patterns = dict(SYMPTOM_PATTERNS)
+    symptom_groups = dict(SYMPTOM_GROUPS)
+    while len(patterns) < groups:
+        patterns[(f"{_word(rng)} pain", f"{_word(rng)} pain")] = {level: [_word(rng, 8).title()] for level in levels}
+    while len(symptom_groups) < groups:
+        symptom_groups[_word(rng)] = {
+            'symptoms': [f"{_word(rng)} pain" for _ in range(4)],
+            'conditions': {level: [_word(rng, 8).title()] for level in levels},
+        }
+    return patterns, symptom_groups
+
+
+def mcp_acl(actions: int, seed: int = 0) -> Dict[str, Any]:
+    """MCP/ACL document whose data flows form a binary tree over `actions` agents"""
+    rng = random.Random(seed)
+    agents = [f"agent_{i}" for i in range(actions)]
+    return {
+        'agents': agents,
+        'workflow': 'benchmark',
+        'semantic_context': {
+            'intent': 'medical_diagnosis',
+            'identified_concepts': ['headache', 'fever'],
+            'confidence': round(rng.uniform(0.3, 0.95), 2),
+        },
+        'actions': [
+            {'agent': agent, 'action': 'run', 'params': {'value': rng.randint(0, 100)}}
+            for agent in agents
+        ],
+        'data_flow': [
+            {'from': agents[(i - 1) // 2], 'to': agents[i], 'data': f"data_{i}"}
+            for i in range(1, actions)
+        ],
+    }
+
+
+def plan(tasks: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Task plan as produced by InputHandler.extract_plan, in shuffled order"""
+    from orchestration.input_handler import InputHandler
+
+    rng = random.Random(seed)
+    entries = InputHandler().extract_plan(mcp_acl(tasks, seed))
+    for entry in entries:
+        entry['priority'] = rng.choice(['high', 'medium', 'low'])
+    rng.shuffle(entries)
+    return entries
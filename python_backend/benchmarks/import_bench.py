@@ -0,0 +1,143 @@
+"""
+Cold-start import cost of every service.
+
+Each service module is imported in a fresh interpreter with `-X importtime`,
+so the numbers include everything the service pulls in at import time
+(FastAPI, LangChain, the Neo4j driver, ...). Services are checked against
+per-service budgets; --profile lists the modules that dominate each import.
+
+Usage (from python_backend/):
+    python -m benchmarks.import_bench
+    python -m benchmarks.import_bench --profile --top 15
+    python -m benchmarks.import_bench --budgets benchmarks/workloads/import_budgets.json --output imports.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+from benchmarks.pipeline_bench import SERVICES
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGETS = os.path.join(os.path.dirname(__file__), "workloads", "import_budgets.json")
+
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    """Parse `-X importtime` lines into {module, self_ms, cumulative_ms, depth}"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            modules.append({
+                "module": name.strip(),
+                "depth": (len(name) - len(name.lstrip())) // 2,
+                "self_ms": int(self_us) / 1000.0,
+                "cumulative_ms": int(cumulative_us) / 1000.0,
+            })
+        except ValueError:
+            continue
+    return modules
+
+
+def measure_service(module: str, env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Import `module` in a fresh interpreter and return its import profile"""
+    code = f"import {module}"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_ROOT, env={**os.environ, **(env or {})},
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+    modules = parse_importtime(proc.stderr)
+    # The service's own top-level (depth 0) line covers everything it imports;
+    # the interpreter's startup imports (site, encodings, ...) are separate lines
+    total_ms = sum(m["cumulative_ms"] for m in modules if m["depth"] == 0 and m["module"] == module)
+    return {"module": module, "total_ms": round(total_ms, 1), "modules": modules}
+
+
+def top_modules(modules: List[Dict[str, Any]], count: int, key: str = "self_ms") -> List[Dict[str, Any]]:
+    return sorted(modules, key=lambda m: m[key], reverse=True)[:count]
+
+
+def measure_services(names: Optional[List[str]] = None, repeat: int = 3,
+                     env: Optional[Dict[str, str]] = None) -> Dict[str, Dict[str, Any]]:
+    """Best-of-`repeat` import profile for each service in pipeline_bench.SERVICES"""
+    results = {}
+    for name in names or list(SERVICES):
+        module = SERVICES[name][0].split(":")[0]
+        runs = [measure_service(module, env) for _ in range(repeat)]
+        results[name] = min(runs, key=lambda run: run["total_ms"])
+    return results
+
+
+def check_budgets(results: Dict[str, Dict[str, Any]], budgets: Dict[str, float]) -> List[str]:
+    """Services whose import time exceeds their budget (ms)"""
+    violations = []
+    for name, result in results.items():
+        budget = budgets.get(name, budgets.get("default"))
+        if budget is not None and result["total_ms"] > budget:
+            violations.append(f"{name}: {result['total_ms']} ms > budget {budget} ms")
+    return violations
+
+
+def load_budgets(path: Optional[str]) -> Dict[str, float]:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def print_report(results: Dict[str, Dict[str, Any]], budgets: Dict[str, float], profile: int = 0):
+    print(f"{'service':<22}{'import ms':>12}{'budget ms':>12}")
+    print("-" * 46)
+    for name, result in results.items():
+        budget = budgets.get(name, budgets.get("default", ""))
+        print(f"{name:<22}{result['total_ms']:>12}{budget:>12}")
+    if profile:
+        for name, result in results.items():
+            print(f"\n{name} ({result['module']}): top {profile} modules by self time")
+            print(f"  {'self ms':>9}{'cumul ms':>10}  module")
+            for m in top_modules(result["modules"], profile):
+                print(f"  {m['self_ms']:>9.1f}{m['cumulative_ms']:>10.1f}  {m['module']}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Service cold-start import benchmark")
+    parser.add_argument("--services", help="Comma separated subset of services")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per service (best is kept)")
+    parser.add_argument("--budgets", default=DEFAULT_BUDGETS, help="JSON file of per-service budgets in ms")
+    parser.add_argument("--profile", action="store_true", help="Report the most expensive modules per service")
+    parser.add_argument("--top", type=int, default=10, help="Modules listed per service with --profile")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    names = args.services.split(",") if args.services else None
+    results = measure_services(names, args.repeat)
+    budgets = load_budgets(args.budgets)
+    print_report(results, budgets, args.top if args.profile else 0)
+
+    if args.output:
+        report = {
+            name: {"module": r["module"], "total_ms": r["total_ms"],
+                   "top_modules": top_modules(r["modules"], args.top)}
+            for name, r in results.items()
+        }
+        with open(args.output, "w") as f:
+            json.dump({"budgets": budgets, "services": report}, f, indent=2)
+
+    violations = check_budgets(results, budgets)
+    if violations:
+        print("\nImport budget exceeded:")
+        for line in violations:
+            print(f"  {line}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
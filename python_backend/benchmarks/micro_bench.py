@@ -0,0 +1,274 @@
+"""
+Micro-benchmarks for the pure, CPU-bound hot functions.
+
+Each case is timed over a range of input sizes built by benchmarks.generators
+and reported as a scaling curve: time per call at every size plus the fitted
+exponent k of time ~ size^k. A jump in k (e.g. 1 -> 2) is a complexity
+regression even when the single-size numbers still look fast.
+
+Usage (from python_backend/):
+    python -m benchmarks.micro_bench
+    python -m benchmarks.micro_bench --cases fhir_enrich,sequence_tasks --output micro.json
+    python -m benchmarks.micro_bench --save-baseline benchmarks/micro_baseline.json
+    python -m benchmarks.micro_bench --baseline benchmarks/micro_baseline.json --max-exponent-increase 0.3
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import math
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks import generators
+
+# Case name -> (description, sizes, setup(size, seed) returning a zero-argument callable)
+CASES: Dict[str, Dict[str, Any]] = {}
+
+
+def case(name: str, description: str, sizes: List[int]):
+    def register(setup: Callable[[int, int], Callable[[], Any]]):
+        CASES[name] = {"description": description, "sizes": sizes, "setup": setup}
+        return setup
+    return register
+
+
+@case("symptom_extraction", "extract_symptoms over a growing symptom vocabulary",
+      [8, 32, 128, 512, 2048])
+def _symptom_extraction(size, seed):
+    from agents.symptom_analyzer.main import extract_symptoms
+
+    vocab = generators.symptom_map(size, seed)
+    text = generators.symptom_text(vocab, 60, seed)
+    return lambda: extract_symptoms(text, vocab)
+
+
+@case("symptom_text_length", "patient ID extraction, symptom extraction and severity scoring over longer complaints",
+      [25, 100, 400, 1600, 6400])
+def _symptom_text_length(size, seed):
+    from agents.symptom_analyzer.main import SYMPTOM_MAP, assess_severity, extract_patient_id, extract_symptoms
+
+    text = generators.symptom_text(SYMPTOM_MAP, size, seed)
+
+    def run():
+        _, remaining = extract_patient_id(text)
+        symptoms = extract_symptoms(remaining)['identified_symptoms']
+        return assess_severity(symptoms, remaining)
+    return run
+
+
+@case("severity_scoring", "assess_severity with many identified symptoms",
+      [8, 32, 128, 512, 2048])
+def _severity_scoring(size, seed):
+    from agents.symptom_analyzer.main import assess_severity
+
+    vocab = generators.symptom_map(size, seed)
+    text = generators.symptom_text(vocab, 60, seed)
+    return lambda: assess_severity(list(vocab), text, symptom_map=vocab)
+
+
+@case("determine_conditions", "DomainLogic.determine_conditions over longer symptom lists",
+      [4, 16, 64, 256, 1024])
+def _determine_conditions(size, seed):
+    from sub_agents.domain_logic import DomainLogic
+
+    logic = DomainLogic()
+    symptoms = generators.disease_symptoms(size, seed)
+    return lambda: logic.determine_conditions(symptoms, "medium")
+
+
+@case("determine_conditions_rules", "DomainLogic.determine_conditions over a growing rule set",
+      [4, 16, 64, 256, 1024])
+def _determine_conditions_rules(size, seed):
+    from sub_agents.domain_logic import DomainLogic
+
+    patterns, groups = generators.disease_rules(size, seed)
+    logic = DomainLogic(patterns, groups)
+    symptoms = generators.disease_symptoms(16, seed)
+    return lambda: logic.determine_conditions(symptoms, "medium")
+
+
+@case("fhir_enrich", "FHIRConnector.enrich_symptoms_from_history over larger FHIR bundles",
+      [10, 40, 160, 640, 2560])
+def _fhir_enrich(size, seed):
+    from agents.symptom_analyzer.fhir_connector import FHIRConnector
+
+    connector = FHIRConnector("http://fhir.invalid")
+    bundle = generators.fhir_bundle(size, seed)
+    symptoms = ['headache', 'fever', 'cough']
+    return lambda: connector.enrich_symptoms_from_history(symptoms, "pat1", bundle)
+
+
+@case("extract_plan", "InputHandler.extract_plan over larger MCP/ACL documents",
+      [4, 16, 64, 256, 1024])
+def _extract_plan(size, seed):
+    from orchestration.input_handler import InputHandler
+
+    handler = InputHandler()
+    document = generators.mcp_acl(size, seed)
+    return lambda: handler.extract_plan(document)
+
+
+@case("sequence_tasks", "TaskPlanner.sequence_tasks over larger plans",
+      [4, 16, 64, 256, 1024])
+def _sequence_tasks(size, seed):
+    from orchestration.task_planner import TaskPlanner
+
+    planner = TaskPlanner()
+    tasks = generators.plan(size, seed)
+    return lambda: planner.sequence_tasks(tasks)
+
+
+@case("journey_patient_id", "LLMService patient ID regex extraction over longer journey prompts",
+      [8, 32, 128, 512, 2048])
+def _journey_patient_id(size, seed):
+    from services.llm_service import extract_patient_id
+
+    prompt = generators.journey_prompt(size, seed)
+    return lambda: extract_patient_id(prompt)
+
+
+def time_callable(fn: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, float]:
+    """timeit-style measurement: calibrate loops to `min_time`, keep the best of `repeat` runs"""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed == 0 else max(2, int(min_time / elapsed) + 1)
+
+    per_call = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        per_call.append((time.perf_counter() - start) / loops)
+    per_call.sort()
+    return {
+        "loops": loops,
+        "best_us": round(per_call[0] * 1e6, 3),
+        "median_us": round(per_call[len(per_call) // 2] * 1e6, 3),
+    }
+
+
+def fit_exponent(sizes: List[int], times: List[float]) -> Optional[float]:
+    """Least-squares slope of log(time) against log(size)"""
+    points = [(math.log(s), math.log(t)) for s, t in zip(sizes, times) if s > 0 and t > 0]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if not var_x:
+        return None
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    return round(cov / var_x, 3)
+
+
+def run_case(name: str, seed: int, repeat: int, min_time: float,
+             sizes: Optional[List[int]] = None) -> Dict[str, Any]:
+    spec = CASES[name]
+    sizes = sizes or spec["sizes"]
+    points = []
+    # Some hot paths still print; keep that out of the timings and the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        for size in sizes:
+            fn = spec["setup"](size, seed)
+            fn()  # warm up
+            points.append({"size": size, **time_callable(fn, repeat, min_time)})
+    return {
+        "description": spec["description"],
+        "points": points,
+        "exponent": fit_exponent([p["size"] for p in points], [p["best_us"] for p in points]),
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], max_increase: float) -> List[str]:
+    """Cases whose fitted exponent grew by more than `max_increase`"""
+    regressions = []
+    for name, base in baseline.get("cases", {}).items():
+        now = current["cases"].get(name)
+        if not now or base.get("exponent") is None or now.get("exponent") is None:
+            continue
+        if now["exponent"] - base["exponent"] > max_increase:
+            regressions.append(f"{name}: exponent {base['exponent']} -> {now['exponent']}")
+    return regressions
+
+
+def print_report(report: Dict[str, Any]):
+    for name, result in report["cases"].items():
+        print(f"{name}  (time ~ n^{result['exponent']})  {result['description']}")
+        for point in result["points"]:
+            print(f"  n={point['size']:<8}{point['best_us']:>14.3f} us/call")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks with scaling curves")
+    parser.add_argument("--cases", help="Comma separated subset of cases to run")
+    parser.add_argument("--sizes", help="Comma separated sizes overriding every case's defaults")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per size (best is kept)")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per timed run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--list", action="store_true", help="List the available cases and exit")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--save-baseline", help="Write the JSON report as a new baseline")
+    parser.add_argument("--baseline", help="Compare fitted exponents against this baseline report")
+    parser.add_argument("--max-exponent-increase", type=float, default=0.3,
+                        help="Allowed growth of a case's exponent before failing (default 0.3)")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, spec in CASES.items():
+            print(f"{name:<28}{spec['description']}")
+        return 0
+
+    # The FHIR connector and agents log at INFO on every call
+    logging.disable(logging.INFO)
+    os.environ.setdefault("MOCK_LLM", "true")
+
+    names = args.cases.split(",") if args.cases else list(CASES)
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"Unknown cases: {', '.join(unknown)}")
+    sizes = [int(s) for s in args.sizes.split(",")] if args.sizes else None
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "min_time": args.min_time,
+        },
+        "cases": {name: run_case(name, args.seed, args.repeat, args.min_time, sizes) for name in names},
+    }
+
+    print_report(report)
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.max_exponent_increase)
+        if regressions:
+            print("\nComplexity regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo complexity regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
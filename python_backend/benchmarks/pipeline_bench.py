@@ -0,0 +1,316 @@
+"""
+Load and latency benchmark for the full agent pipeline.
+
+Starts every service in this process on local ports (FHIR demo server and
+the deterministic mock LLM included), drives each stage with a configurable
+prompt mix and concurrency, and writes throughput and p50/p95/p99 latency
+per stage as JSON that can be compared against a saved baseline.
+
+Usage (from python_backend/):
+    python -m benchmarks.pipeline_bench --output bench.json
+    python -m benchmarks.pipeline_bench --save-baseline benchmarks/baseline.json
+    python -m benchmarks.pipeline_bench --baseline benchmarks/baseline.json --tolerance 0.2
+    python -m benchmarks.pipeline_bench --import-budgets benchmarks/workloads/import_budgets.json
+"""
+import argparse
+import importlib
+import json
+import logging
+import math
+import os
+import platform
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_WORKLOAD = os.path.join(os.path.dirname(__file__), "workloads", "pipeline_default.json")
+
+# Service name -> (ASGI app import path, port offset from --base-port)
+SERVICES = {
+    "prompt_processor": ("services.prompt_processor:app", 0),
+    "orchestration_agent": ("orchestration_agent.main:app", 1),
+    "disease_prediction": ("agents.disease_prediction.main:app", 2),
+    "symptom_analyzer": ("agents.symptom_analyzer.main:app", 3),
+    "fhir_demo_server": ("services.fhir_demo_server:app", 4),
+    "patient_journey": ("agents.patient_journey.main:app", 5),
+}
+
+METRIC_KEYS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def configure_environment(base_port: int, mock_llm_latency_ms: float,
+                          deployment: str = "distributed") -> Dict[str, str]:
+    """Point every service at the local ports and the mock LLM before import"""
+    host = "127.0.0.1"
+    port = lambda name: base_port + SERVICES[name][1]
+    env = {
+        "MOCK_LLM": "true",
+        "LLM_BACKEND": "simulator",
+        "MOCK_LLM_LATENCY_MS": str(mock_llm_latency_ms),
+        "AGENT_HOST": host,
+        "PROMPT_PROCESSOR_URL": f"http://{host}:{port('prompt_processor')}/process_prompt",
+        "DISEASE_PREDICTION_URL": f"http://{host}:{port('disease_prediction')}/predict_disease",
+        "SYMPTOM_ANALYZER_URL": f"http://{host}:{port('symptom_analyzer')}/analyze_symptoms",
+        "PATIENT_JOURNEY_URL": f"http://{host}:{port('patient_journey')}/patient_journey",
+        "FHIR_SERVER_URL": f"http://{host}:{port('fhir_demo_server')}",
+        # Empty Neo4j URI makes the patient journey agent serve its mock data
+        "NEO4J_URI": "",
+        # monolith: the orchestrator calls the agents in-process instead of over HTTP
+        "DEPLOYMENT_MODE": deployment,
+    }
+    os.environ.update(env)
+    return env
+
+
+def load_app(import_path: str):
+    module_name, attr = import_path.split(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def start_services(base_port: int, log_level: str) -> List[Any]:
+    """Run every service with uvicorn in a background thread"""
+    import uvicorn
+
+    servers = []
+    for name, (import_path, offset) in SERVICES.items():
+        app = load_app(import_path)
+        config = uvicorn.Config(app, host="127.0.0.1", port=base_port + offset,
+                                log_level=log_level.lower(), access_log=False)
+        server = uvicorn.Server(config)
+        thread = threading.Thread(target=server.run, name=f"bench-{name}", daemon=True)
+        thread.start()
+        servers.append((name, server))
+
+    deadline = time.monotonic() + 30
+    for name, server in servers:
+        while not server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Service {name} did not start")
+            time.sleep(0.05)
+    return [server for _, server in servers]
+
+
+def stop_services(servers: List[Any]):
+    for server in servers:
+        server.should_exit = True
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies: List[float], errors: int, wall_seconds: float) -> Dict[str, float]:
+    ordered = sorted(latencies)
+    completed = len(latencies) + errors
+    return {
+        "requests": completed,
+        "errors": errors,
+        "throughput_rps": round(completed / wall_seconds, 2) if wall_seconds else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+    }
+
+
+def build_requests(workload: Dict[str, Any], count: int) -> List[Dict[str, Any]]:
+    """Deterministic sequence of prompt-mix entries for one stage"""
+    rng = random.Random(workload.get("seed", 42))
+    mix = workload["prompt_mix"]
+    weights = [entry.get("weight", 1) for entry in mix]
+    return [rng.choices(mix, weights=weights)[0] for _ in range(count)]
+
+
+def stage_request(stage: str, entry: Dict[str, Any], seq: int, base_port: int) -> Tuple[str, Dict[str, Any]]:
+    """URL and JSON payload for one request against a stage"""
+    from llm_mock import SYMPTOM_VOCABULARY
+
+    url = lambda service, path: f"http://127.0.0.1:{base_port + SERVICES[service][1]}{path}"
+    prompt = entry["prompt"]
+    if stage == "prompt_processor":
+        return url("prompt_processor", "/process_prompt"), {
+            "prompt": prompt, "user_id": "bench", "session_id": f"bench-{seq}",
+            "workflow": entry.get("workflow", "medical_diagnosis")}
+    if stage == "symptom_analyzer":
+        return url("symptom_analyzer", "/analyze_symptoms"), {"symptoms_text": prompt}
+    if stage == "disease_prediction":
+        symptoms = [s for s in SYMPTOM_VOCABULARY if s in prompt.lower()]
+        return url("disease_prediction", "/predict_disease"), {
+            "symptoms": symptoms, "severity_level": "medium"}
+    if stage == "patient_journey":
+        return url("patient_journey", "/patient_journey"), {"patient_id": "pat1"}
+    if stage == "orchestrate":
+        return url("orchestration_agent", "/orchestrate"), {
+            "prompt": prompt, "user_id": "bench", "session_id": f"bench-{seq}",
+            "workflow": entry.get("workflow", "medical_diagnosis")}
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def run_stage(stage: str, workload: Dict[str, Any], base_port: int, concurrency: int,
+              count: int, warmup: int) -> Dict[str, float]:
+    import requests
+
+    entries = build_requests(workload, warmup + count)
+    local = threading.local()
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    def send(seq: int, record: bool):
+        url, payload = stage_request(stage, entries[seq], seq, base_port)
+        start = time.perf_counter()
+        try:
+            response = session().post(url, json=payload, timeout=60)
+            ok = response.status_code == 200 and not response.json().get("error")
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        if record:
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda seq: send(seq, False), range(warmup)))
+        start = time.perf_counter()
+        list(pool.map(lambda seq: send(seq, True), range(warmup, warmup + count)))
+        wall = time.perf_counter() - start
+
+    return summarize(latencies, errors[0], wall)
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """List regressions beyond `tolerance` (fractional) against a baseline"""
+    regressions = []
+    for stage, base in baseline.get("stages", {}).items():
+        now = current["stages"].get(stage)
+        if not now:
+            continue
+        for key in METRIC_KEYS:
+            old, new = base.get(key), now.get(key)
+            if not old or new is None:
+                continue
+            if key == "throughput_rps":
+                change = (old - new) / old
+            else:
+                change = (new - old) / old
+            if change > tolerance:
+                regressions.append(f"{stage}.{key}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def print_report(report: Dict[str, Any]):
+    header = f"{'stage':<20}{'req':>6}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<20}{stats['requests']:>6}{stats['errors']:>6}{stats['throughput_rps']:>10}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Agent pipeline load benchmark")
+    parser.add_argument("--workload", default=DEFAULT_WORKLOAD, help="Workload JSON file")
+    parser.add_argument("--stages", help="Comma separated subset of stages to run")
+    parser.add_argument("--concurrency", type=int, help="Override workload concurrency")
+    parser.add_argument("--requests", type=int, help="Override requests per stage")
+    parser.add_argument("--base-port", type=int, default=18000)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--save-baseline", help="Write the JSON report as a new baseline")
+    parser.add_argument("--baseline", help="Compare against this baseline report")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed fractional regression before failing (default 0.2)")
+    parser.add_argument("--import-budgets",
+                        help="Also measure each service's cold-start import time against these budgets (ms)")
+    parser.add_argument("--deployment", choices=("distributed", "monolith"), default="distributed",
+                        help="How the orchestrator reaches the agents (default distributed)")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    with open(args.workload) as f:
+        workload = json.load(f)
+    concurrency = args.concurrency or workload.get("concurrency", 8)
+    count = args.requests or workload.get("requests_per_stage", 200)
+    warmup = workload.get("warmup_requests", 10)
+    stages = args.stages.split(",") if args.stages else workload["stages"]
+
+    env = configure_environment(args.base_port, workload.get("mock_llm_latency_ms", 0), args.deployment)
+    if args.import_budgets:
+        # Measured first, in fresh interpreters, so the numbers are true cold starts
+        from benchmarks import import_bench
+        imports = import_bench.measure_services(env=env)
+        import_budgets = import_bench.load_budgets(args.import_budgets)
+    servers = start_services(args.base_port, args.log_level)
+    logging.getLogger().setLevel(args.log_level)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "workload": os.path.basename(args.workload),
+            "concurrency": concurrency,
+            "requests_per_stage": count,
+            "seed": workload.get("seed", 42),
+            "deployment": args.deployment,
+        },
+        "stages": {},
+    }
+    if args.import_budgets:
+        report["imports"] = {
+            name: {"total_ms": r["total_ms"],
+                   "budget_ms": import_budgets.get(name, import_budgets.get("default"))}
+            for name, r in imports.items()
+        }
+    try:
+        for stage in stages:
+            report["stages"][stage] = run_stage(stage, workload, args.base_port, concurrency, count, warmup)
+    finally:
+        stop_services(servers)
+
+    print_report(report)
+    status = 0
+    if args.import_budgets:
+        print()
+        import_bench.print_report(imports, import_budgets)
+        violations = import_bench.check_budgets(imports, import_budgets)
+        if violations:
+            print("\nImport budget exceeded:")
+            for line in violations:
+                print(f"  {line}")
+            status = 1
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("\nPerformance regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against baseline")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import math
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from common.metrics import REGISTRY
+
+# Remaining budget in milliseconds. A relative value, so services do not
+# need synchronised clocks; each hop re-anchors it on its own monotonic clock.
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+DEFAULT_BUDGET_MS = 30000
+
+DEADLINE_EXCEEDED_TOTAL = REGISTRY.counter(
+    "request_deadline_exceeded_total",
+    "Work skipped or aborted because the request deadline was (nearly) spent",
+    ("stage",))
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request's time budget is spent before a call starts"""
+
+
+class Deadline:
+    """Point in time (monotonic) by which the current request must finish"""
+    def __init__(self, budget_seconds: float):
+        self.budget = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds
+
+    @classmethod
+    def from_ms(cls, budget_ms: float) -> "Deadline":
+        return cls(budget_ms / 1000.0)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def remaining_ms(self) -> int:
+        return int(self.remaining() * 1000)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Remaining seconds, optionally capped, for a blocking call's timeout"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Request deadline of {self.budget:.3f}s exceeded")
+        return min(remaining, cap) if cap is not None else remaining
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+def set_deadline(deadline: Optional[Deadline]):
+    """Make `deadline` current; returns a token for `reset_deadline`"""
+    return _current.set(deadline)
+
+
+def reset_deadline(token):
+    _current.reset(token)
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    token = set_deadline(deadline)
+    try:
+        yield deadline
+    finally:
+        reset_deadline(token)
+
+
+def default_budget_ms() -> float:
+    return float(os.getenv("REQUEST_BUDGET_MS", str(DEFAULT_BUDGET_MS)))
+
+
+def timeout_for(default: Optional[float] = None, stage: str = "call") -> Optional[float]:
+    """
+    Timeout (seconds) for a blocking call: the request's remaining budget,
+    capped at `default`. Without a deadline this is just `default`. Raises
+    DeadlineExceeded when the budget is already spent.
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return default
+    try:
+        return deadline.timeout(default)
+    except DeadlineExceeded:
+        DEADLINE_EXCEEDED_TOTAL.inc(stage=stage)
+        raise
+
+
+def has_budget(seconds: float, stage: str = "optional") -> bool:
+    """True unless the request has less than `seconds` left; misses are counted under `stage`"""
+    deadline = current_deadline()
+    if deadline is None or deadline.remaining() >= seconds:
+        return True
+    DEADLINE_EXCEEDED_TOTAL.inc(stage=stage)
+    return False
+
+
+def deadline_headers() -> dict:
+    """Headers forwarding the remaining budget to the next hop"""
+    deadline = current_deadline()
+    return {DEADLINE_HEADER: str(deadline.remaining_ms())} if deadline is not None else {}
+
+
+class DeadlineMiddleware:
+    """
+    Pure ASGI middleware that starts each request's deadline from the
+    X-Request-Deadline-Ms header, or REQUEST_BUDGET_MS when the caller sent
+    none, and answers 504 straight away if the budget is already spent.
+    """
+    def __init__(self, app, default_ms: Optional[float] = None):
+        self.app = app
+        self.default_ms = default_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budget_ms = None
+        header = DEADLINE_HEADER.lower().encode()
+        for name, value in scope.get("headers", ()):
+            if name == header:
+                try:
+                    budget_ms = float(value.decode())
+                except ValueError:
+                    pass
+                # inf or nan would overflow remaining_ms(); treat them like a missing header
+                if budget_ms is not None and not math.isfinite(budget_ms):
+                    budget_ms = None
+                break
+        if budget_ms is None:
+            budget_ms = self.default_ms if self.default_ms is not None else default_budget_ms()
+
+        if budget_ms <= 0:
+            from starlette.responses import JSONResponse
+
+            DEADLINE_EXCEEDED_TOTAL.inc(stage="arrival")
+            response = JSONResponse({"detail": "Request deadline exceeded"}, status_code=504)
+            await response(scope, receive, send)
+            return
+
+        with deadline_scope(Deadline.from_ms(budget_ms)):
+            await self.app(scope, receive, send)
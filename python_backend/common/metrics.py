@@ -0,0 +1,317 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Latency buckets (seconds) shared by request and outbound histograms
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """
+    Base class for a labelled metric. Label values are passed as keyword
+    arguments and must match the declared label names.
+    """
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[Tuple[str, ...], Dict[str, object]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return series["count"] if series else 0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(s["counts"]), s["sum"], s["count"]) for key, s in self._series.items()]
+        lines = []
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide collection of metrics rendered in the Prometheus text format.
+    Metrics are created on first use so modules can declare them independently.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, documentation, tuple(labelnames), **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as {metric.type_name}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Inbound HTTP metrics (recorded by MetricsMiddleware)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Latency of inbound HTTP requests per route",
+    ("service", "method", "route"))
+HTTP_REQUESTS_TOTAL = REGISTRY.counter(
+    "http_requests_total", "Inbound HTTP requests per route and status code",
+    ("service", "method", "route", "status"))
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight", "Inbound HTTP requests currently being served",
+    ("service",))
+
+# Outbound calls to FHIR, Neo4j, the LLM and other agents
+OUTBOUND_REQUEST_SECONDS = REGISTRY.histogram(
+    "outbound_request_duration_seconds", "Latency of outbound calls by target",
+    ("target", "operation", "outcome"))
+
+# Cache effectiveness
+CACHE_REQUESTS_TOTAL = REGISTRY.counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit/miss)",
+    ("cache", "result"))
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    "cache_hit_ratio", "Fraction of cache lookups served from the cache",
+    ("cache",))
+
+# Errors by type and where they were observed
+ERRORS_TOTAL = REGISTRY.counter(
+    "errors_total", "Errors by exception type and source",
+    ("source", "type"))
+
+# Orchestration task state transitions (fed by StateManager)
+TASK_STATUS_TOTAL = REGISTRY.counter(
+    "orchestration_task_status_total", "Task status updates per agent",
+    ("agent", "status"))
+
+
+def record_error(source: str, error) -> None:
+    """Count an error; `error` may be an exception instance or a type name"""
+    error_type = error if isinstance(error, str) else type(error).__name__
+    ERRORS_TOTAL.inc(source=source, type=error_type)
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    """Count a cache lookup and refresh the cache's hit ratio gauge"""
+    CACHE_REQUESTS_TOTAL.inc(cache=cache, result="hit" if hit else "miss")
+    hits = CACHE_REQUESTS_TOTAL.value(cache=cache, result="hit")
+    misses = CACHE_REQUESTS_TOTAL.value(cache=cache, result="miss")
+    CACHE_HIT_RATIO.set(hits / (hits + misses), cache=cache)
+
+
+@contextmanager
+def track_outbound(target: str, operation: str):
+    """Time an outbound call; exceptions are counted and re-raised"""
+    start = time.perf_counter()
+    outcome = "success"
+    try:
+        yield
+    except Exception as e:
+        outcome = "error"
+        record_error(f"outbound:{target}", e)
+        raise
+    finally:
+        OUTBOUND_REQUEST_SECONDS.observe(
+            time.perf_counter() - start, target=target, operation=operation, outcome=outcome)
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path or "unmatched"
+
+
+# Service and ASGI scope of the request being served, so metrics recorded
+# inside a handler can carry its route (set by MetricsMiddleware)
+_current_request: ContextVar[Optional[Tuple[str, dict]]] = ContextVar("metrics_request", default=None)
+
+
+def current_route() -> Tuple[str, str]:
+    """(service, route) of the request being served; ("none", "unmatched") outside one"""
+    current = _current_request.get()
+    if current is None:
+        return "none", "unmatched"
+    return current[0], _route_label(current[1])
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route latency, status codes and
+    the number of in-flight requests for one service.
+    """
+    def __init__(self, app, service: str):
+        self.app = app
+        self.service = service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        HTTP_IN_FLIGHT.inc(service=self.service)
+        token = _current_request.set((self.service, scope))
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            record_error(self.service, e)
+            raise
+        finally:
+            _current_request.reset(token)
+            HTTP_IN_FLIGHT.dec(service=self.service)
+            route = _route_label(scope)
+            method = scope.get("method", "GET")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start, service=self.service, method=method, route=route)
+            HTTP_REQUESTS_TOTAL.inc(
+                service=self.service, method=method, route=route, status=str(status["code"]))
+
+
+def instrument_app(app, service: str, registry: Optional[MetricsRegistry] = None):
+    """Attach the metrics middleware and a /metrics endpoint to a FastAPI app"""
+    from starlette.responses import Response
+
+    registry = registry or REGISTRY
+    app.add_middleware(MetricsMiddleware, service=service)
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(registry.render(), media_type=CONTENT_TYPE_LATEST)
+
+    return app
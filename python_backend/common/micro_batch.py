@@ -0,0 +1,81 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+from common.metrics import REGISTRY
+
+MICRO_BATCH_SIZE = REGISTRY.histogram(
+    "micro_batch_size", "Items per batch run by a micro-batcher", ("batcher",),
+    buckets=(1, 2, 4, 8, 16, 32, 64))
+MICRO_BATCH_WAIT_SECONDS = REGISTRY.histogram(
+    "micro_batch_wait_seconds", "Time an item waited for its batch to start", ("batcher",),
+    buckets=(0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+
+
+class _Batch:
+    def __init__(self):
+        self.items: List[Any] = []
+        self.futures: List[Future] = []
+        self.started: List[float] = []
+        self.full = threading.Event()
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from concurrent threads for up to `window`
+    seconds (or until `max_size` are waiting) and runs them through one
+    `run_batch(items) -> results` call, results in item order. The first
+    submitter of a batch runs it on its own thread; the others block until
+    their result is in, so to each caller `submit` looks like a normal
+    call. An exception from `run_batch` is raised to every caller.
+    """
+    def __init__(self, name: str, run_batch: Callable[[List[Any]], List[Any]],
+                 window: float, max_size: int):
+        self.name = name
+        self.run_batch = run_batch
+        self.window = window
+        self.max_size = max(1, max_size)
+        self._batch: Optional[_Batch] = None
+        self._lock = threading.Lock()
+
+    def submit(self, item: Any, timeout: Optional[float] = None) -> Any:
+        future: Future = Future()
+        with self._lock:
+            batch = self._batch
+            leader = batch is None
+            if leader:
+                batch = self._batch = _Batch()
+            batch.items.append(item)
+            batch.futures.append(future)
+            batch.started.append(time.monotonic())
+            if len(batch.items) >= self.max_size:
+                self._close(batch)
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                self._close(batch)
+            self._run(batch)
+        return future.result(timeout=timeout)
+
+    def _close(self, batch: _Batch):
+        # Later submitters start a new batch
+        if self._batch is batch:
+            self._batch = None
+
+    def _run(self, batch: _Batch):
+        now = time.monotonic()
+        for started in batch.started:
+            MICRO_BATCH_WAIT_SECONDS.observe(now - started, batcher=self.name)
+        MICRO_BATCH_SIZE.observe(len(batch.items), batcher=self.name)
+        try:
+            results = self.run_batch(batch.items)
+            if len(results) != len(batch.items):
+                raise ValueError(f"{self.name} batch returned {len(results)} results for {len(batch.items)} items")
+        except BaseException as e:
+            for future in batch.futures:
+                future.set_exception(e)
+            return
+        for future, result in zip(batch.futures, results):
+            future.set_result(result)
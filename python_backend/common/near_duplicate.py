@@ -0,0 +1,252 @@
+import difflib
+import random
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Pattern, Set, Tuple
+from common.metrics import REGISTRY, record_cache_lookup
+
+NEAR_DUPLICATE_LOOKUPS_TOTAL = REGISTRY.counter(
+    "near_duplicate_lookups_total",
+    "Near-duplicate index lookups by result (exact, near, miss)",
+    ("index", "result"))
+NEAR_DUPLICATE_SIMILARITY = REGISTRY.histogram(
+    "near_duplicate_similarity",
+    "Estimated Jaccard similarity of near-duplicate hits",
+    ("index",),
+    buckets=(0.8, 0.85, 0.9, 0.925, 0.95, 0.975, 0.99, 1.0))
+
+# Spelling variants folded before comparing, applied in order
+CONTRACTIONS = [
+    (re.compile(r"\bwon't\b"), "will not"),
+    (re.compile(r"\bcan't\b"), "can not"),
+    (re.compile(r"n't\b"), " not"),
+    (re.compile(r"'ve\b"), " have"),
+    (re.compile(r"'m\b"), " am"),
+    (re.compile(r"'re\b"), " are"),
+    (re.compile(r"'ll\b"), " will"),
+    (re.compile(r"'d\b"), " would"),
+    (re.compile(r"'s\b"), ""),
+    (re.compile(r"\b(have|has|had) got\b"), r"\1"),
+]
+NON_WORD = re.compile(r"[^a-z0-9]+")
+# Words whose presence never changes what a chat prompt asks
+FILLER_WORDS = {"a", "an", "the", "um", "uh", "please", "hi", "hello", "hey"}
+# Tokens that flip or pin down a prompt's meaning while changing few
+# characters ("no fever", "3 days", "pat12"); near matches must agree on them
+NEGATIONS = {"no", "not", "never", "without", "none", "nor", "cannot"}
+# How alike a word must be to one in the other text to count as a respelling
+# ("headache" / "headahce") rather than an added or dropped word
+WORD_SIMILARITY = 0.8
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_text(text: str) -> str:
+    """Lowercased words without punctuation, contractions, articles or filler"""
+    text = text.lower().replace("’", "'").replace("&", " and ")
+    for pattern, replacement in CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    return " ".join(word for word in NON_WORD.sub(" ", text).split() if word not in FILLER_WORDS)
+
+
+def guard_pattern(terms: Iterable[str]) -> Optional[Pattern]:
+    """Regex matching any of `terms` (normalized, as whole words), or None for no terms"""
+    normalized = sorted({normalize_text(term) for term in terms} - {""}, key=len, reverse=True)
+    if not normalized:
+        return None
+    return re.compile(r"\b(?:" + "|".join(re.escape(term) for term in normalized) + r")\b")
+
+
+def guard_tokens(normalized: str, terms: Optional[Pattern] = None) -> Tuple[str, ...]:
+    """
+    Negations, tokens with digits and matches of `terms` (see
+    guard_pattern), which two prompts must share to be near-duplicates
+    """
+    tokens = {word for word in normalized.split() if word in NEGATIONS or any(c.isdigit() for c in word)}
+    if terms is not None:
+        tokens.update(terms.findall(normalized))
+    return tuple(sorted(tokens))
+
+
+def words_agree(first: str, second: str) -> bool:
+    """
+    Whether every word only one of two normalized texts has is a
+    respelling of a word only the other has. Shingle similarity stays high
+    when one word is added to a long text ("..., dizziness, nausea and
+    fatigue" vs "..., dizziness and fatigue"); this catches that.
+    """
+    first_words, second_words = set(first.split()), set(second.split())
+    only_first, only_second = first_words - second_words, second_words - first_words
+    return (all(difflib.get_close_matches(word, only_second, n=1, cutoff=WORD_SIMILARITY) for word in only_first)
+            and all(difflib.get_close_matches(word, only_first, n=1, cutoff=WORD_SIMILARITY) for word in only_second))
+
+
+def shingles(normalized: str, size: int) -> Set[int]:
+    """Hashed character `size`-grams of normalized text"""
+    if len(normalized) <= size:
+        return {zlib.crc32(normalized.encode("utf-8"))}
+    return {zlib.crc32(normalized[i:i + size].encode("utf-8")) for i in range(len(normalized) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures over `num_perm` seeded universal hash functions"""
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                       for _ in range(num_perm)]
+
+    def signature(self, hashes: Set[int]) -> Tuple[int, ...]:
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self.params)
+
+    @staticmethod
+    def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+        """Estimated Jaccard similarity: the fraction of positions where the signatures agree"""
+        return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+
+
+class _Entry:
+    __slots__ = ("value", "signature", "guard", "buckets", "expires")
+
+    def __init__(self, value: Any, signature: Tuple[int, ...], guard: Tuple[str, ...],
+                 buckets: List[Tuple], expires: float):
+        self.value = value
+        self.signature = signature
+        self.guard = guard
+        self.buckets = buckets
+        self.expires = expires
+
+
+class NearDuplicateIndex:
+    """
+    Thread-safe LRU of values keyed by text that also answers for texts
+    which are merely similar. Texts are normalized first (exact lookups
+    use that form), then compared by MinHash over character shingles; LSH
+    banding finds candidates without scanning the whole index, and a
+    candidate is returned when its estimated Jaccard similarity reaches
+    `threshold`, it has the same negations, numbers and `guard_terms`
+    (e.g. symptom and severity words), and any words the two texts do not
+    share are respellings of each other (see words_agree). `scope`
+    separates texts whose values must not be shared (e.g. prompt
+    template versions). Entries expire `ttl` seconds after they are
+    stored; a TTL of 0 disables the index. Texts longer than `max_chars`
+    are only matched exactly.
+    """
+    def __init__(self, name: str, threshold: float = 0.85, ttl: float = 300.0, max_entries: int = 2048,
+                 num_perm: int = 128, bands: int = 32, shingle_size: int = 4, max_chars: int = 1000,
+                 guard_terms: Iterable[str] = ()):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.name = name
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.max_chars = max_chars
+        self.guard_terms = guard_pattern(guard_terms)
+        self.hasher = MinHasher(num_perm)
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._buckets: Dict[Tuple, Set[Tuple[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def _signature(self, normalized: str) -> Optional[Tuple[int, ...]]:
+        if len(normalized) > self.max_chars:
+            return None
+        return self.hasher.signature(shingles(normalized, self.shingle_size))
+
+    def _bucket_keys(self, scope: str, signature: Tuple[int, ...]) -> List[Tuple]:
+        return [(scope, band, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def get(self, text: str, scope: str = "", accept: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+        """
+        The value stored for `text` or its closest near-duplicate, if any.
+        `accept` can veto a stored value (counted as a miss).
+        """
+        if self.ttl <= 0:
+            return None
+        normalized = normalize_text(text)
+        key = (scope, normalized)
+        now = time.monotonic()
+        result, similarity, value = "miss", None, None
+        with self._lock:
+            entry = self._live(key, now)
+            if entry is not None and (accept is None or accept(entry.value)):
+                result, value = "exact", entry.value
+                self._entries.move_to_end(key)
+
+        if result == "miss":
+            signature = self._signature(normalized)
+            if signature is not None:
+                guard = guard_tokens(normalized, self.guard_terms)
+                with self._lock:
+                    best_key, best = None, self.threshold
+                    for candidate in self._candidates(scope, signature):
+                        entry = self._live(candidate, now)
+                        if entry is None or entry.guard != guard:
+                            continue
+                        estimate = MinHasher.similarity(signature, entry.signature)
+                        if (estimate >= best and words_agree(normalized, candidate[1])
+                                and (accept is None or accept(entry.value))):
+                            best_key, best = candidate, estimate
+                    if best_key is not None:
+                        result, similarity, value = "near", best, self._entries[best_key].value
+                        self._entries.move_to_end(best_key)
+
+        NEAR_DUPLICATE_LOOKUPS_TOTAL.inc(index=self.name, result=result)
+        if similarity is not None:
+            NEAR_DUPLICATE_SIMILARITY.observe(similarity, index=self.name)
+        record_cache_lookup(self.name, result != "miss")
+        return value
+
+    def put(self, text: str, value: Any, scope: str = ""):
+        if self.ttl <= 0:
+            return
+        normalized = normalize_text(text)
+        key = (scope, normalized)
+        signature = self._signature(normalized)
+        # Texts too long to hash are still found by their exact normalized form
+        buckets = self._bucket_keys(scope, signature) if signature is not None else []
+        entry = _Entry(value, signature, guard_tokens(normalized, self.guard_terms), buckets, time.monotonic() + self.ttl)
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            for bucket in buckets:
+                self._buckets.setdefault(bucket, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _candidates(self, scope: str, signature: Tuple[int, ...]) -> Set[Tuple[str, str]]:
+        candidates = set()
+        for bucket in self._bucket_keys(scope, signature):
+            candidates.update(self._buckets.get(bucket, ()))
+        return candidates
+
+    def _live(self, key: Tuple[str, str], now: float) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires <= now:
+            self._remove(key)
+            return None
+        return entry
+
+    def _remove(self, key: Tuple[str, str]):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for bucket in entry.buckets:
+            keys = self._buckets.get(bucket)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._buckets[bucket]
@@ -0,0 +1,55 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Priority of the plan task a request serves, as computed by
+# InputHandler.extract_plan; forwarded between services like the deadline
+PRIORITY_HEADER = "X-Request-Priority"
+PRIORITIES = ("high", "medium", "low")
+DEFAULT_PRIORITY = "medium"
+
+_current: ContextVar[str] = ContextVar("request_priority", default=DEFAULT_PRIORITY)
+
+
+def normalize_priority(value: Optional[str]) -> str:
+    """A known priority name, or the default for anything else"""
+    value = (value or "").strip().lower()
+    return value if value in PRIORITIES else DEFAULT_PRIORITY
+
+
+def current_priority() -> str:
+    return _current.get()
+
+
+@contextmanager
+def priority_scope(priority: Optional[str]):
+    token = _current.set(normalize_priority(priority))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def priority_headers() -> dict:
+    """Header forwarding the current priority to the next hop"""
+    return {PRIORITY_HEADER: current_priority()}
+
+
+class PriorityMiddleware:
+    """Pure ASGI middleware making the X-Request-Priority header current for the request"""
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        header = PRIORITY_HEADER.lower().encode()
+        priority = None
+        for name, value in scope.get("headers", ()):
+            if name == header:
+                priority = value.decode()
+                break
+        with priority_scope(priority):
+            await self.app(scope, receive, send)
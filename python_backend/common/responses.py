@@ -0,0 +1,97 @@
+import functools
+import inspect
+import json
+import time
+from typing import Any, Callable
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from starlette.responses import JSONResponse, Response
+from common.metrics import REGISTRY, current_route
+
+try:
+    import orjson
+except ImportError:  # stdlib json until orjson is installed
+    orjson = None
+
+RESPONSE_ENCODE_SECONDS = REGISTRY.histogram(
+    "http_response_encode_seconds", "Time spent encoding JSON response bodies per route",
+    ("service", "route"),
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+
+
+def _default(value: Any) -> Any:
+    """Types orjson does not encode natively"""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json", by_alias=True)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return jsonable_encoder(value)
+
+
+def encode_json(content: Any) -> bytes:
+    """
+    JSON bytes for a response body. A pydantic model is serialized by
+    pydantic-core as it stands, without being validated again; anything
+    else is encoded by orjson, which handles nested models, datetimes and
+    the like through `_default`.
+    """
+    if isinstance(content, BaseModel):
+        return content.model_dump_json(by_alias=True).encode("utf-8")
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse encoded with `encode_json`, timed per route
+    (http_response_encode_seconds). The services' default response class.
+    """
+    def render(self, content: Any) -> bytes:
+        start = time.perf_counter()
+        try:
+            return encode_json(content)
+        finally:
+            service, route = current_route()
+            RESPONSE_ENCODE_SECONDS.observe(time.perf_counter() - start, service=service, route=route)
+
+
+
+class TrustedResponseRoute(APIRoute):
+    """
+    APIRoute that hands what its endpoint returns straight to
+    FastJSONResponse when it can be trusted as is: an instance of the
+    route's own response_model, which the service built and validated
+    itself, or plain data from a route without a response_model. FastAPI
+    then neither validates the model again nor runs jsonable_encoder over
+    the payload. Responses pass through untouched, and anything else
+    takes FastAPI's usual path. The endpoint function itself is not
+    changed, so in-process callers still get the model.
+    """
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        route = self
+        if inspect.iscoroutinefunction(endpoint):
+            @functools.wraps(endpoint)
+            async def trusted_endpoint(*args: Any, **values: Any) -> Any:
+                return route.trusted(await endpoint(*args, **values))
+        else:
+            @functools.wraps(endpoint)
+            def trusted_endpoint(*args: Any, **values: Any) -> Any:
+                return route.trusted(endpoint(*args, **values))
+        super().__init__(path, trusted_endpoint, **kwargs)
+
+    def trusted(self, result: Any) -> Any:
+        if isinstance(result, Response):
+            return result
+        if self.response_model is None or type(result) is self.response_model:
+            return FastJSONResponse(result, status_code=self.status_code or 200)
+        return result
+
+
+def use_fast_json(app):
+    """Serve an app's routes through TrustedResponseRoute and FastJSONResponse; call before adding routes"""
+    app.router.route_class = TrustedResponseRoute
+    app.router.default_response_class = FastJSONResponse
+    return app
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+from common.metrics import REGISTRY
+
+SINGLEFLIGHT_CALLS_TOTAL = REGISTRY.counter(
+    "singleflight_calls_total",
+    "Calls through a single-flight group, by whether they ran or waited for an identical call",
+    ("group", "result"))
+SINGLEFLIGHT_COALESCING_RATIO = REGISTRY.gauge(
+    "singleflight_coalescing_ratio",
+    "Fraction of calls served by joining an identical call already in flight",
+    ("group",))
+
+
+def _record(group: str, leader: bool):
+    SINGLEFLIGHT_CALLS_TOTAL.inc(group=group, result="executed" if leader else "coalesced")
+    executed = SINGLEFLIGHT_CALLS_TOTAL.value(group=group, result="executed")
+    coalesced = SINGLEFLIGHT_CALLS_TOTAL.value(group=group, result="coalesced")
+    SINGLEFLIGHT_COALESCING_RATIO.set(coalesced / (executed + coalesced), group=group)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution: the
+    first caller runs the function, callers arriving while it is in flight
+    wait and get the same result (or exception). Nothing is kept once the
+    call finishes.
+    """
+    def __init__(self, group: str):
+        self.group = group
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Result of fn() for `key`, and whether it was shared with another caller"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+        _record(self.group, leader)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class _LeaderCancelled(Exception):
+    """Set on a shared call whose leader was cancelled; its followers run the call again"""
+
+
+class AsyncSingleFlight:
+    """
+    SingleFlight for coroutines on one event loop; followers await the
+    leader's result. If the leader is cancelled (its client went away), the
+    followers are not: the first of them to resume runs the call again and
+    the others wait for it.
+    """
+    def __init__(self, group: str):
+        self.group = group
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Result of await fn() for `key`, and whether it was shared with another caller"""
+        future = self._calls.get(key)
+        _record(self.group, future is None)
+        while future is not None:
+            try:
+                # Shielded so a follower that is cancelled does not cancel the shared call
+                return await asyncio.shield(future), True
+            except _LeaderCancelled:
+                future = self._calls.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Retrieved here so an unshared failure is not reported as unhandled
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            self._calls.pop(key, None)
+        return result, False
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,101 @@
+import asyncio
+import contextvars
+import json
+import threading
+import time
+from typing import Any, AsyncIterator, Iterable
+from starlette.requests import ClientDisconnect, Request
+from common.metrics import REGISTRY
+
+SSE_MEDIA_TYPE = "text/event-stream"
+# Keeps proxies (nginx) from buffering the stream until it ends
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+STREAM_TOTAL = REGISTRY.counter(
+    "llm_stream_total",
+    "Streamed LLM responses by route and outcome (completed, disconnected, failed)",
+    ("route", "outcome"))
+STREAM_FIRST_CHUNK_SECONDS = REGISTRY.histogram(
+    "llm_stream_first_chunk_seconds",
+    "Time from the start of a streamed LLM response to its first chunk",
+    ("route",))
+
+_END = object()
+
+
+def sse_event(event: str, data: Any) -> str:
+    """One server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _wait_for_disconnect(request: Request):
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def stream_chunks(request: Request, chunks: Iterable[str], route: str) -> AsyncIterator[str]:
+    """
+    Relay a blocking chunk iterator (an LLM backend's `stream`) to the event
+    loop. The iterator runs on a worker thread with the caller's context
+    (request deadline included). When the client disconnects, this raises
+    ClientDisconnect and the worker closes the iterator after the chunk in
+    progress, which stops the generation instead of paying for tokens
+    nobody reads.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def publish(item, error=None):
+        if not stop.is_set():
+            loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+
+    def produce():
+        iterator = iter(chunks)
+        try:
+            for chunk in iterator:
+                if stop.is_set():
+                    break
+                publish(chunk)
+            publish(_END)
+        except Exception as e:
+            publish(_END, e)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+
+    start = time.perf_counter()
+    first = True
+    loop.run_in_executor(None, contextvars.copy_context().run, produce)
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(request))
+    next_chunk = None
+    try:
+        while True:
+            next_chunk = asyncio.ensure_future(queue.get())
+            await asyncio.wait({next_chunk, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_chunk.done():
+                STREAM_TOTAL.inc(route=route, outcome="disconnected")
+                raise ClientDisconnect()
+            chunk, error = next_chunk.result()
+            if error is not None:
+                STREAM_TOTAL.inc(route=route, outcome="failed")
+                raise error
+            if chunk is _END:
+                STREAM_TOTAL.inc(route=route, outcome="completed")
+                return
+            if first:
+                STREAM_FIRST_CHUNK_SECONDS.observe(time.perf_counter() - start, route=route)
+                first = False
+            yield chunk
+    except asyncio.CancelledError:
+        # Starlette cancels the response when it sees the disconnect first
+        STREAM_TOTAL.inc(route=route, outcome="disconnected")
+        raise
+    finally:
+        stop.set()
+        disconnect.cancel()
+        if next_chunk is not None:
+            next_chunk.cancel()
@@ -1,27 +1,155 @@
+import itertools
+import json
+import os
+import re
+import time
 from fastapi import FastAPI, Request
-from typing import Dict, Any
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from typing import Dict, Any, List
 
 app = FastAPI(title="LLM Mock")
 
+# Vocabulary the mock recognises when asked to extract symptoms
+SYMPTOM_VOCABULARY = [
+    'headache', 'nausea', 'fever', 'cough', 'fatigue', 'sore throat',
+    'vomiting', 'diarrhea', 'stomach pain', 'chills', 'congestion', 'runny nose'
+]
+
+JOURNEY_KEYWORDS = [
+    'history', 'journey', 'timeline', 'past', 'appointment', 'treatment',
+    'medication', 'visit', 'record'
+]
+
+DISEASES_BY_SYMPTOM = {
+    'headache': 'Migraine',
+    'nausea': 'Gastritis',
+    'fever': 'Flu',
+    'cough': 'Common Cold',
+    'fatigue': 'Viral Infection',
+    'sore throat': 'Pharyngitis',
+}
+
+
+def _quoted(prompt: str, label: str) -> str:
+    match = re.search(rf'{label}:\s*"(.*?)"', prompt, re.DOTALL)
+    return match.group(1) if match else prompt
+
+
+def _find_symptoms(text: str) -> List[str]:
+    text = text.lower()
+    return [symptom for symptom in SYMPTOM_VOCABULARY if symptom in text]
+
+
+def _analyze(user_text: str) -> Dict[str, Any]:
+    is_journey = any(keyword in user_text for keyword in JOURNEY_KEYWORDS)
+    return {
+        "intent": "patient_journey" if is_journey else "medical_diagnosis",
+        "confidence": 0.9,
+        "explicit_symptoms": _find_symptoms(user_text),
+        "implicit_symptoms": [],
+        "severity_indicators": [word for word in ("mild", "moderate", "severe") if word in user_text],
+        "duration_mentions": re.findall(r"(?:for|since) \w+(?: \w+)?", user_text),
+    }
+
+
+class MockLLM:
+    """
+    Deterministic stand-in for the Vertex AI LLM. It recognises the prompts
+    used by LLMService and the disease prediction agent and answers them in
+    the JSON format those callers parse, so the pipeline can run offline.
+    """
+    def __init__(self, latency_ms: float = None):
+        if latency_ms is None:
+            latency_ms = float(os.getenv("MOCK_LLM_LATENCY_MS", "0"))
+        self.latency_ms = latency_ms
+
+    def __call__(self, prompt: str) -> str:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        return json.dumps(self.respond(prompt))
+
+    def respond(self, prompt: str) -> Dict[str, Any]:
+        if "several independent messages" in prompt:
+            # Batched prompt analysis: numbered messages, one JSON-quoted message per line
+            messages = re.findall(r'^(\d+)\. (".*")$', prompt, re.MULTILINE)
+            return {"analyses": [
+                dict(index=int(index), **_analyze(json.loads(message).lower()))
+                for index, message in messages
+            ]}
+
+        if "medical_diagnosis" in prompt and "patient_journey" in prompt:
+            user_text = _quoted(prompt, "User").lower()
+            if "explicit_symptoms" in prompt:
+                # Combined intent and symptom analysis
+                return _analyze(user_text)
+            is_journey = any(keyword in user_text for keyword in JOURNEY_KEYWORDS)
+            return {"intent": "patient_journey" if is_journey else "medical_diagnosis", "confidence": 0.9}
+
+        if "explicit_symptoms" in prompt:
+            symptoms = _find_symptoms(_quoted(prompt, "Text"))
+            return {
+                "explicit_symptoms": symptoms,
+                "implicit_symptoms": [],
+                "duration_mentions": [],
+                "severity_indicators": [],
+                "contextual_health_info": []
+            }
+
+        if prompt.startswith("Based on the following symptoms:"):
+            listed = prompt.split("\n", 1)[0].split(":", 1)[1]
+            symptoms = [s.strip().lower() for s in listed.split(",") if s.strip()]
+            diseases = sorted({DISEASES_BY_SYMPTOM.get(s, "Unknown") for s in symptoms}) or ["Unknown"]
+            return {
+                "predicted_diseases": diseases,
+                "confidence": 0.75,
+                "explanation": "Mocked prediction",
+                "severity": "medium",
+                "recommendation": "Consult a doctor if symptoms persist"
+            }
+
+        return {"answer": f"Mocked LLM response for prompt: {prompt[:80]}"}
+
+
+def mock_llm_enabled() -> bool:
+    return os.getenv("MOCK_LLM", "false").lower() in ("1", "true", "yes")
+
 
 @app.post("/llm")
 async def llm_endpoint(req: Request):
+    """
+    Serves the simulator over HTTP for services configured with
+    LLM_BACKEND=http. With "stream": true the text is sent in chunks as it
+    is generated; a client that hangs up stops the generation.
+    """
+    from services.llm_backends import LLMBackendError, LLMRateLimitError, LLMTimeoutError
+
     body: Dict[str, Any] = await req.json()
     prompt = body.get("prompt") or body.get("user_input") or ""
+    try:
+        if not body.get("stream"):
+            text = await run_in_threadpool(_simulator().generate, prompt, body.get("timeout"),
+                                           max_output_tokens=body.get("max_output_tokens"))
+            return {"text": text}
+        chunks = _simulator().stream(prompt, body.get("timeout"), max_output_tokens=body.get("max_output_tokens"))
+        # Latency and simulated errors surface on the first chunk, before the response starts
+        first = await run_in_threadpool(next, chunks, "")
+        return StreamingResponse(iterate_in_threadpool(itertools.chain([first], chunks)),
+                                 media_type="text/plain")
+    except LLMRateLimitError as e:
+        return JSONResponse({"error": str(e)}, status_code=429)
+    except LLMTimeoutError as e:
+        return JSONResponse({"error": str(e)}, status_code=504)
+    except LLMBackendError as e:
+        return JSONResponse({"error": str(e)}, status_code=503)
+
+
+_simulator_instance = None
 
-    mock_mcp_acl = {
-        "mcp": {
-            "context": {"user_id": body.get("user_id", "test"), "session_id": body.get("session_id", "s1")},
-            "workflow": body.get("workflow", "default"),
-        },
-        "acl": [
-            {
-                "agent": "Disease Prediction Agent",
-                "action": "predict_disease",
-                "params": {"symptoms": [s.strip() for s in prompt.split(',') if s.strip()] or ["fever", "cough"]},
-            }
-        ],
-        "answer": f"Mocked LLM response for prompt: {prompt}"
-    }
 
-    return mock_mcp_acl
+def _simulator():
+    global _simulator_instance
+    if _simulator_instance is None:
+        from services.llm_backends import SimulatedLLMBackend
+        _simulator_instance = SimulatedLLMBackend.from_env()
+    return _simulator_instance
@@ -0,0 +1,50 @@
+"""
+Single-process deployment: every agent app mounted into the orchestrator.
+
+The orchestrator's dispatcher calls the agents in-process (see
+orchestration/transports.py) instead of over HTTP, so a request never leaves
+this process. The agents stay reachable under their prefixes for direct use.
+
+Usage (from python_backend/):
+    uvicorn monolith:app --host 0.0.0.0 --port 8001
+
+The demo FHIR server is mounted at /fhir; point the symptom analyzer at it
+with FHIR_SERVER_URL=http://127.0.0.1:8001/fhir or keep an external server.
+"""
+import os
+from contextlib import AsyncExitStack, asynccontextmanager
+
+# Must be set before the orchestrator builds its dispatcher
+os.environ["DEPLOYMENT_MODE"] = "monolith"
+
+from orchestration_agent.main import app
+from services.prompt_processor import app as prompt_processor_app
+from agents.symptom_analyzer.main import app as symptom_analyzer_app
+from agents.disease_prediction.main import app as disease_prediction_app
+from agents.patient_journey.main import app as patient_journey_app
+from services.fhir_demo_server import app as fhir_demo_app
+
+MOUNTS = {
+    "/prompt_processor": prompt_processor_app,
+    "/agents/symptom_analyzer": symptom_analyzer_app,
+    "/agents/disease_prediction": disease_prediction_app,
+    "/agents/patient_journey": patient_journey_app,
+    "/fhir": fhir_demo_app,
+}
+
+for prefix, sub_app in MOUNTS.items():
+    app.mount(prefix, sub_app)
+
+# Starlette does not run a mounted app's lifespan, so the orchestrator's runs theirs
+_orchestrator_lifespan = app.router.lifespan_context
+
+
+@asynccontextmanager
+async def lifespan(app):
+    async with AsyncExitStack() as stack:
+        await stack.enter_async_context(_orchestrator_lifespan(app))
+        for sub_app in MOUNTS.values():
+            await stack.enter_async_context(sub_app.router.lifespan_context(sub_app))
+        yield
+
+app.router.lifespan_context = lifespan
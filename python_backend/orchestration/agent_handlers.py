@@ -0,0 +1,217 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import logging
+from orchestration.transports import AgentTransportError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def enrich_with_semantics(params: Dict[str, Any], task: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of `params` with the task's semantic understanding and priority added"""
+    enriched_params = params.copy()
+
+    # Add semantic context if available
+    if "semantic_understanding" in task.get("params", {}):
+        enriched_params["semantic_context"] = task["params"]["semantic_understanding"]
+
+    # Add task priority if available
+    if "priority" in task:
+        enriched_params["priority"] = task["priority"]
+
+    return enriched_params
+
+
+class AgentHandler:
+    """
+    Plugin that shapes one agent's request and response for the dispatcher.
+    A handler is registered for an agent and one or more action names, and
+    declares the data keys it reads from earlier tasks (`input_keys`) and
+    publishes for later ones (`output_keys`); the dispatcher passes it only
+    its inputs and keeps only its declared outputs.
+    """
+    agent: str = ""
+    actions: Tuple[str, ...] = ()
+    input_keys: Tuple[str, ...] = ()
+    output_keys: Tuple[str, ...] = ()
+
+    def build_request(self, task: Dict[str, Any], inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """Payload sent to the agent"""
+        raise NotImplementedError
+
+    def build_result(self, task: Dict[str, Any], request: Dict[str, Any],
+                     response: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Result entry for the caller, and the output data published to later tasks"""
+        return {
+            'agent': task.get('agent'),
+            'result': response.get('result'),
+            'error': response.get('error')
+        }, {}
+
+    def handle_error(self, task: Dict[str, Any], error: AgentTransportError) -> Optional[Dict[str, Any]]:
+        """Result entry for a failed agent call, or None to report it as a dispatch error"""
+        return None
+
+
+class SymptomAnalyzerHandler(AgentHandler):
+    agent = "symptom_analyzer"
+    actions = ("analyze_symptoms",)
+    output_keys = ("structured_symptoms", "severity_level", "patient_id", "symptom_analysis")
+
+    def build_request(self, task, inputs):
+        params = task.get('params', {})
+        return enrich_with_semantics({'symptoms_text': params.get('symptoms_text', '')}, task)
+
+    def build_result(self, task, request, response):
+        # Store the identified symptoms and semantic context
+        result_data = response.get('result') or {}
+        outputs = {}
+        if result_data.get('identified_symptoms'):
+            outputs = {
+                'structured_symptoms': result_data['identified_symptoms'],
+                'severity_level': result_data.get('severity_level', 'medium'),
+                # Patient ID from the result or the top-level response
+                'patient_id': result_data.get('patient_id') or response.get('patient_id'),
+                # Preserve semantic understanding for the next agent
+                'symptom_analysis': result_data.get('semantic_analysis', {}),
+            }
+        return {
+            'agent': task.get('agent'),
+            'result': response.get('result'),
+            'error': response.get('error'),
+            'semantic_context': outputs.get('symptom_analysis', {}),
+            'patient_id': outputs.get('patient_id')
+        }, outputs
+
+
+class DiseasePredictionHandler(AgentHandler):
+    agent = "disease_prediction"
+    actions = ("predict_disease",)
+    input_keys = ("patient_id", "structured_symptoms", "severity_level", "symptom_analysis")
+
+    def build_request(self, task, inputs):
+        params = task.get('params', {})
+        request_params = {}
+
+        # Patient ID from the symptom analysis, else from params
+        if inputs.get('patient_id'):
+            request_params['patient_id'] = inputs['patient_id']
+        elif 'patient_id' in params:
+            request_params['patient_id'] = params['patient_id']
+        logger.info(f"Using patient ID for disease prediction: {request_params.get('patient_id')}")
+
+        # If we have symptoms from analyzer or params, use them
+        if 'structured_symptoms' in inputs:
+            request_params['symptoms'] = inputs['structured_symptoms']
+            request_params['severity_level'] = inputs.get('severity_level', 'medium')
+        elif 'symptoms' in params:
+            request_params['symptoms'] = params['symptoms']
+
+        # Add any semantic context
+        if inputs.get('symptom_analysis'):
+            request_params['semantic_context'] = inputs['symptom_analysis']
+        return request_params
+
+    def build_result(self, task, request, response):
+        # Include patient_id in the result structure
+        prediction_result = response.get('result', {})
+        if prediction_result is not None and request.get('patient_id'):
+            prediction_result['patient_id'] = request['patient_id']
+        return {
+            'agent': task.get('agent'),
+            'result': prediction_result,
+            'error': response.get('error'),
+            'patient_id': request.get('patient_id')
+        }, {}
+
+
+class PatientJourneyHandler(AgentHandler):
+    agent = "patient_journey"
+    actions = ("get_journey", "update_journey")
+    output_keys = ("patient_journey",)
+
+    def build_request(self, task, inputs):
+        params = task.get('params', {})
+        enriched_params = enrich_with_semantics(params, task)
+        # Ensure patient_id is always set
+        enriched_params['patient_id'] = params.get('patient_id', 'pat1')
+        # Add default context
+        enriched_params['context'] = {
+            'hospital': 'City General Hospital',
+            'primary_doctor': 'Dr. Jane Smith'
+        }
+        return enriched_params
+
+    def build_result(self, task, request, response):
+        # The agent returns {"result": {...}, "error": null}
+        actual_result = response.get('result', {})
+        # If there's an error, wrap it in result so frontend can display it
+        if response.get('error'):
+            actual_result = {'error': response.get('error')}
+        return {
+            'agent': task.get('agent'),
+            'result': actual_result,
+            'error': response.get('error')
+        }, {'patient_journey': actual_result}
+
+    def handle_error(self, task, error):
+        logger.error(f"Patient Journey agent error: {error.detail}")
+        return {
+            'agent': task.get('agent'),
+            'error': f"Patient Journey agent error: {error.detail}"
+        }
+
+
+class TrackJourneyHandler(AgentHandler):
+    agent = "patient_journey"
+    actions = ("track_journey",)
+    input_keys = ("patient_id", "structured_symptoms")
+
+    def build_request(self, task, inputs):
+        params = task.get('params', {})
+        return {
+            'prompt': params.get('prompt', ''),
+            'patient_id': params.get('patient_id') or inputs.get('patient_id', ''),
+            'symptoms': params.get('symptoms') or inputs.get('structured_symptoms', [])
+        }
+
+
+class HandlerRegistry:
+    """Agent handlers keyed by (agent, action) for constant-time dispatch"""
+    def __init__(self, handlers: Iterable[AgentHandler] = ()):
+        self._handlers: Dict[Tuple[str, str], AgentHandler] = {}
+        self._agents = set()
+        for handler in handlers:
+            self.register(handler)
+
+    def register(self, handler: AgentHandler, replace: bool = False):
+        for action in handler.actions:
+            key = (handler.agent.lower(), action)
+            if key in self._handlers and not replace:
+                raise ValueError(f"Handler already registered for {handler.agent}.{action}")
+            self._handlers[key] = handler
+        self._agents.add(handler.agent.lower())
+
+    def get(self, agent: Optional[str], action: Optional[str]) -> Optional[AgentHandler]:
+        return self._handlers.get(((agent or "").lower(), action))
+
+    def unknown(self, agent: Optional[str], action: Optional[str]) -> Dict[str, Any]:
+        """Result entry for a task no handler is registered for"""
+        if (agent or "").lower() in self._agents:
+            return {'agent': agent, 'error': f'Unknown action for {agent}: {action}'}
+        return {'agent': agent, 'result': None, 'error': f'No handler implemented for agent: {agent}'}
+
+    def handlers(self) -> List[AgentHandler]:
+        return list({id(handler): handler for handler in self._handlers.values()}.values())
+
+
+# Built-in handlers; register_handler adds more
+HANDLERS = HandlerRegistry([
+    SymptomAnalyzerHandler(),
+    DiseasePredictionHandler(),
+    PatientJourneyHandler(),
+    TrackJourneyHandler(),
+])
+
+
+def register_handler(handler: AgentHandler, replace: bool = False):
+    HANDLERS.register(handler, replace=replace)
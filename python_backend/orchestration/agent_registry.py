@@ -0,0 +1,221 @@
+import os
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+import logging
+from common.metrics import REGISTRY
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ("least_outstanding", "ewma")
+
+ENDPOINT_HEALTHY = REGISTRY.gauge(
+    "agent_endpoint_healthy", "1 when an agent endpoint is in rotation, 0 while ejected",
+    ("agent", "endpoint"))
+ENDPOINT_OUTSTANDING = REGISTRY.gauge(
+    "agent_endpoint_outstanding_requests", "Requests in flight per agent endpoint",
+    ("agent", "endpoint"))
+ENDPOINT_EWMA_SECONDS = REGISTRY.gauge(
+    "agent_endpoint_ewma_latency_seconds", "Exponentially weighted latency per agent endpoint",
+    ("agent", "endpoint"))
+ENDPOINT_EJECTIONS_TOTAL = REGISTRY.counter(
+    "agent_endpoint_ejections_total", "Times an agent endpoint was taken out of rotation",
+    ("agent", "endpoint", "reason"))
+
+
+class AgentEndpoint:
+    """One replica of an agent and its load-balancing state"""
+    def __init__(self, agent: str, url: str):
+        self.agent = agent
+        self.url = url
+        parts = urlsplit(url)
+        self.health_url = f"{parts.scheme}://{parts.netloc}/health"
+        self.outstanding = 0
+        self.ewma_seconds: Optional[float] = None
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    def is_ejected(self, now: Optional[float] = None) -> bool:
+        return (now or time.monotonic()) < self.ejected_until
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "ewma_ms": round(self.ewma_seconds * 1000, 3) if self.ewma_seconds is not None else None,
+            "ejected": self.is_ejected(),
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class AgentRegistry:
+    """
+    Endpoints per agent with client-side load balancing. Endpoints are chosen
+    by fewest outstanding requests or lowest EWMA latency; an endpoint is
+    ejected for `eject_seconds` after `failure_threshold` consecutive failed
+    calls or a failed /health probe, and probes run in a background thread.
+    """
+    def __init__(self, endpoints: Dict[str, List[str]], strategy: str = "least_outstanding",
+                 probe_interval: float = 10.0, probe_timeout: float = 2.0, eject_seconds: float = 30.0,
+                 failure_threshold: int = 3, ewma_alpha: float = 0.3):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown balancing strategy '{strategy}' (expected one of {', '.join(STRATEGIES)})")
+        self.strategy = strategy
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.eject_seconds = eject_seconds
+        self.failure_threshold = failure_threshold
+        self.ewma_alpha = ewma_alpha
+        self.endpoints: Dict[str, List[AgentEndpoint]] = {
+            agent: [AgentEndpoint(agent, url) for url in urls] for agent, urls in endpoints.items()
+        }
+        self._lock = threading.Lock()
+        self._probe_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        for endpoint in self.all_endpoints():
+            ENDPOINT_HEALTHY.set(1, agent=endpoint.agent, endpoint=endpoint.url)
+
+    @classmethod
+    def from_config(cls, path: Optional[str] = None) -> "AgentRegistry":
+        """
+        Build the registry from AGENT_REGISTRY_FILE (JSON), else AGENT_ENDPOINTS
+        ("agent=url1,url2;agent2=url3"), else the single default URL per agent.
+        """
+        from orchestration.transports import default_agent_urls
+
+        endpoints = {agent: [url] for agent, url in default_agent_urls().items()}
+        settings: Dict[str, Any] = {}
+        path = path or os.getenv("AGENT_REGISTRY_FILE")
+        if path:
+            with open(path) as f:
+                config = json.load(f)
+            endpoints.update(config.get("agents", {}))
+            settings = {key: config[key] for key in (
+                "strategy", "probe_interval", "probe_timeout", "eject_seconds",
+                "failure_threshold", "ewma_alpha") if key in config}
+            logger.info(f"Loaded agent registry from {path}")
+        elif os.getenv("AGENT_ENDPOINTS"):
+            for entry in os.getenv("AGENT_ENDPOINTS").split(";"):
+                if "=" in entry:
+                    agent, urls = entry.split("=", 1)
+                    endpoints[agent.strip()] = [url.strip() for url in urls.split(",") if url.strip()]
+        if os.getenv("AGENT_BALANCING"):
+            settings["strategy"] = os.getenv("AGENT_BALANCING")
+        return cls(endpoints, **settings)
+
+    def all_endpoints(self) -> List[AgentEndpoint]:
+        return [endpoint for endpoints in self.endpoints.values() for endpoint in endpoints]
+
+    def _score(self, endpoint: AgentEndpoint):
+        # Unmeasured endpoints score as fastest so new replicas get traffic
+        ewma = endpoint.ewma_seconds or 0.0
+        if self.strategy == "ewma":
+            return (ewma, endpoint.outstanding)
+        return (endpoint.outstanding, ewma)
+
+    def choose(self, agent: str) -> AgentEndpoint:
+        """Best endpoint for `agent`; if all are ejected, the one returning soonest"""
+        self.start()
+        endpoints = self.endpoints.get(agent)
+        if not endpoints:
+            raise KeyError(f"No endpoints registered for agent '{agent}'")
+        now = time.monotonic()
+        with self._lock:
+            candidates = [e for e in endpoints if not e.is_ejected(now)]
+            if not candidates:
+                return min(endpoints, key=lambda e: e.ejected_until)
+            return min(candidates, key=self._score)
+
+    @contextmanager
+    def acquire(self, agent: str):
+        """Choose an endpoint and track the call's outstanding count and outcome"""
+        endpoint = self.choose(agent)
+        with self._lock:
+            endpoint.outstanding += 1
+        ENDPOINT_OUTSTANDING.set(endpoint.outstanding, agent=agent, endpoint=endpoint.url)
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield endpoint
+            ok = True
+        finally:
+            with self._lock:
+                endpoint.outstanding -= 1
+            ENDPOINT_OUTSTANDING.set(endpoint.outstanding, agent=agent, endpoint=endpoint.url)
+            self.record(endpoint, time.perf_counter() - start, ok)
+
+    def record(self, endpoint: AgentEndpoint, seconds: float, ok: bool):
+        with self._lock:
+            if ok:
+                endpoint.consecutive_failures = 0
+                if endpoint.ewma_seconds is None:
+                    endpoint.ewma_seconds = seconds
+                else:
+                    endpoint.ewma_seconds += self.ewma_alpha * (seconds - endpoint.ewma_seconds)
+            else:
+                endpoint.consecutive_failures += 1
+            failures = endpoint.consecutive_failures
+        if ok:
+            ENDPOINT_EWMA_SECONDS.set(endpoint.ewma_seconds, agent=endpoint.agent, endpoint=endpoint.url)
+        elif failures >= self.failure_threshold:
+            self.eject(endpoint, "failures")
+
+    def eject(self, endpoint: AgentEndpoint, reason: str, seconds: Optional[float] = None):
+        with self._lock:
+            already_ejected = endpoint.is_ejected()
+            endpoint.ejected_until = time.monotonic() + (seconds if seconds is not None else self.eject_seconds)
+        if not already_ejected:
+            logger.warning(f"Ejecting {endpoint.agent} endpoint {endpoint.url} ({reason})")
+            ENDPOINT_EJECTIONS_TOTAL.inc(agent=endpoint.agent, endpoint=endpoint.url, reason=reason)
+        ENDPOINT_HEALTHY.set(0, agent=endpoint.agent, endpoint=endpoint.url)
+
+    def restore(self, endpoint: AgentEndpoint):
+        with self._lock:
+            was_ejected = endpoint.is_ejected()
+            endpoint.ejected_until = 0.0
+            endpoint.consecutive_failures = 0
+        if was_ejected:
+            logger.info(f"Restoring {endpoint.agent} endpoint {endpoint.url}")
+        ENDPOINT_HEALTHY.set(1, agent=endpoint.agent, endpoint=endpoint.url)
+
+    def probe(self):
+        """Check every endpoint's /health once"""
+        import requests
+
+        for endpoint in self.all_endpoints():
+            try:
+                healthy = requests.get(endpoint.health_url, timeout=self.probe_timeout).status_code == 200
+            except requests.RequestException:
+                healthy = False
+            if healthy:
+                self.restore(endpoint)
+            else:
+                self.eject(endpoint, "health_probe")
+
+    def _probe_loop(self):
+        while not self._stop.wait(self.probe_interval):
+            try:
+                self.probe()
+            except Exception as e:
+                logger.error(f"Agent health probe failed: {str(e)}")
+
+    def start(self):
+        """Start background health probes (once; no-op when probe_interval <= 0)"""
+        if self._probe_thread is not None or self.probe_interval <= 0:
+            return
+        with self._lock:
+            if self._probe_thread is not None:
+                return
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="agent-health-probe", daemon=True)
+            self._probe_thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self) -> Dict[str, List[Dict[str, Any]]]:
+        with self._lock:
+            return {agent: [e.snapshot() for e in endpoints] for agent, endpoints in self.endpoints.items()}
@@ -1,7 +1,296 @@
+import contextvars
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, Optional
+import logging
+from common.deadline import DeadlineExceeded, current_deadline, timeout_for
+from common.metrics import REGISTRY, record_error
+from orchestration.transports import AgentTransportError
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Actions that can safely be sent more than once (retried or hedged). process_prompt is not
+# among them: every attempt is another paid LLM call
+IDEMPOTENT_ACTIONS = {"analyze_symptoms", "predict_disease", "get_journey", "track_journey"}
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_STATE = REGISTRY.gauge(
+    "circuit_breaker_state", "Circuit breaker state per agent (0 closed, 1 half-open, 2 open)",
+    ("agent",))
+CIRCUIT_TRANSITIONS_TOTAL = REGISTRY.counter(
+    "circuit_breaker_transitions_total", "Circuit breaker state changes per agent",
+    ("agent", "state"))
+RESILIENCE_DECISIONS_TOTAL = REGISTRY.counter(
+    "orchestration_resilience_decisions_total",
+    "Retry, circuit breaker and hedging decisions per agent",
+    ("agent", "decision"))
+
+
+class CircuitOpenError(AgentTransportError):
+    """Raised without calling the agent while its circuit breaker is open"""
+    def __init__(self, agent: str):
+        super().__init__(agent, "circuit breaker open, agent temporarily skipped")
+
+
+def is_agent_failure(error: Exception) -> bool:
+    """Failures that say the agent is unhealthy: unreachable, 5xx or an in-process crash"""
+    if isinstance(error, (CircuitOpenError, DeadlineExceeded)):
+        return False
+    if isinstance(error, AgentTransportError):
+        return error.status_code is None or error.status_code >= 500
+    return True
+
+
+class CircuitBreaker:
+    """
+    Per-agent breaker: opens after `failure_threshold` consecutive failures,
+    lets one probe call through after `reset_timeout` (half-open), and closes
+    again when the probe succeeds.
+    """
+    def __init__(self, agent: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.agent = agent
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.set(STATE_VALUES[CLOSED], agent=agent)
+
+    def _transition(self, state: str):
+        # Caller holds the lock
+        if state == self.state:
+            return
+        logger.warning(f"Circuit breaker for {self.agent}: {self.state} -> {state}")
+        self.state = state
+        CIRCUIT_STATE.set(STATE_VALUES[state], agent=self.agent)
+        CIRCUIT_TRANSITIONS_TOTAL.inc(agent=self.agent, state=state)
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._transition(HALF_OPEN)
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            self._transition(CLOSED)
+
+    def release(self):
+        """Give back a half-open probe slot when the call never reached the agent"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._transition(OPEN)
+
+
+class RetryPolicy:
+    """Bounded exponential backoff with full jitter"""
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.05, max_delay: float = 1.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        """Sleep before retry number `attempt` (1-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+class LatencyTracker:
+    """Recent successful call latencies per agent, for the hedging delay"""
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, agent: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(agent, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, agent: str, pct: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(agent, ()))
+        if len(samples) < min_samples or not samples:
+            return None
+        # Nearest rank: the smallest sample with at least pct% of the samples at or below it
+        return samples[max(0, math.ceil(pct / 100.0 * len(samples)) - 1)]
+
+
+def _run_into(future: Future, context: contextvars.Context, call: Callable[[], Any]):
+    try:
+        future.set_result(context.run(call))
+    except BaseException as e:
+        future.set_exception(e)
+
+
+def _env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
 class ErrorHandler:
     """
     Monitors for errors, manages retries/fallbacks, logs issues.
+    Agent calls run through `execute`, which applies a per-agent circuit
+    breaker, retries idempotent actions with jittered backoff and, when
+    enabled, hedges slow idempotent calls with a second request after the
+    agent's p95 latency. Hedges run on a pool of HEDGE_POOL_SIZE threads
+    and are skipped, not queued, while it is busy. No retry is started
+    once the request deadline would pass before it. Every decision is
+    counted in orchestration_resilience_decisions_total.
     """
+    def __init__(self, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None,
+                 retry_policy: Optional[RetryPolicy] = None, hedging: Optional[bool] = None,
+                 hedge_percentile: float = 95.0, hedge_min_samples: Optional[int] = None,
+                 idempotent_actions: Optional[Iterable[str]] = None):
+        self.failure_threshold = failure_threshold or int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+        self.reset_timeout = reset_timeout or float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+        self.retry_policy = retry_policy or RetryPolicy(
+            max_attempts=int(os.getenv("RETRY_MAX_ATTEMPTS", "3")),
+            base_delay=float(os.getenv("RETRY_BASE_DELAY_MS", "50")) / 1000.0,
+            max_delay=float(os.getenv("RETRY_MAX_DELAY_MS", "1000")) / 1000.0,
+        )
+        self.hedging = _env_flag("HEDGE_REQUESTS") if hedging is None else hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples or int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+        self.hedge_pool_size = int(os.getenv("HEDGE_POOL_SIZE", "16"))
+        self._hedge_slots = threading.BoundedSemaphore(self.hedge_pool_size)
+        self.idempotent_actions = set(idempotent_actions or IDEMPOTENT_ACTIONS)
+        self.latencies = LatencyTracker()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+
     def handle(self, errors):
-        # TODO: Implement error handling logic
+        # Count agent errors so they show up on /metrics
+        for error in errors:
+            record_error("orchestration", error if isinstance(error, Exception) else "AgentError")
         return errors
+
+    def breaker(self, agent: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(agent)
+            if breaker is None:
+                breaker = CircuitBreaker(agent, self.failure_threshold, self.reset_timeout)
+                self._breakers[agent] = breaker
+            return breaker
+
+    def circuit_states(self) -> Dict[str, str]:
+        """State of each agent's circuit breaker (closed, open or half_open)"""
+        with self._lock:
+            return {agent: breaker.state for agent, breaker in self._breakers.items()}
+
+    def _decision(self, agent: str, decision: str):
+        RESILIENCE_DECISIONS_TOTAL.inc(agent=agent, decision=decision)
+
+    def execute(self, agent: str, action: str, call: Callable[[], Any]) -> Any:
+        """Run one agent call with the circuit breaker, retries and hedging applied"""
+        breaker = self.breaker(agent)
+        idempotent = action in self.idempotent_actions
+        attempts = self.retry_policy.max_attempts if idempotent else 1
+
+        for attempt in range(1, attempts + 1):
+            if not breaker.allow():
+                self._decision(agent, "circuit_open_rejected")
+                raise CircuitOpenError(agent)
+            start = time.perf_counter()
+            try:
+                if idempotent and self.hedging:
+                    result = self._hedged(agent, call)
+                else:
+                    result = call()
+            except DeadlineExceeded:
+                breaker.release()
+                self._decision(agent, "deadline_exceeded")
+                raise
+            except Exception as e:
+                if not is_agent_failure(e):
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if attempt >= attempts:
+                    self._decision(agent, "gave_up" if attempts > 1 else "failed")
+                    raise
+                delay = self.retry_policy.delay(attempt)
+                deadline = current_deadline()
+                if deadline is not None and deadline.remaining() <= delay:
+                    # No budget left for another attempt
+                    self._decision(agent, "deadline_exceeded")
+                    raise
+                logger.info(f"Retrying {agent}.{action} in {delay * 1000:.0f} ms after: {str(e)}")
+                self._decision(agent, "retry")
+                time.sleep(delay)
+                continue
+            breaker.record_success()
+            self.latencies.observe(agent, time.perf_counter() - start)
+            if attempt > 1:
+                self._decision(agent, "retry_succeeded")
+            return result
+
+    def _hedged(self, agent: str, call: Callable[[], Any]) -> Any:
+        """Send a second request if the first is slower than the agent's p95; first success wins"""
+        delay = self.latencies.percentile(agent, self.hedge_percentile, self.hedge_min_samples)
+        if delay is None:
+            return call()
+
+        # The primary gets a thread of its own so it starts at once (the hedge delay is measured
+        # from when it is really sent) and the caller stays free to take whichever answer is first.
+        # Threads do not inherit the caller's context (request deadline), so both run in a copy
+        primary = Future()
+        threading.Thread(target=_run_into, args=(primary, contextvars.copy_context(), call),
+                         name=f"primary-{agent}", daemon=True).start()
+        done, _ = wait([primary], timeout=timeout_for(delay, stage="hedge"))
+        if done:
+            return primary.result()
+
+        pending = {primary}
+        hedge = None
+        if self._hedge_slots.acquire(blocking=False):
+            self._decision(agent, "hedge_launched")
+            hedge = self._hedge_executor().submit(contextvars.copy_context().run, call)
+            hedge.add_done_callback(lambda _: self._hedge_slots.release())
+            pending.add(hedge)
+        else:
+            self._decision(agent, "hedge_skipped")
+        error = None
+        while pending:
+            timeout = timeout_for(None, stage="hedge")
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded(f"{agent} call still running at the request deadline")
+            for future in done:
+                if future.exception() is None:
+                    if hedge is not None:
+                        self._decision(agent, "hedge_won" if future is hedge else "hedge_lost")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _hedge_executor(self) -> ThreadPoolExecutor:
+        if self._hedge_pool is None:
+            with self._lock:
+                if self._hedge_pool is None:
+                    self._hedge_pool = ThreadPoolExecutor(max_workers=self.hedge_pool_size,
+                                                          thread_name_prefix="hedge")
+        return self._hedge_pool
@@ -1,7 +1,9 @@
 
 from typing import Dict, Any, List, Optional
+from collections import defaultdict
 from pydantic import BaseModel
 import logging
+from orchestration.agent_handlers import HANDLERS, HandlerRegistry
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -18,7 +20,11 @@ class InputHandler:
     Handles semantically enriched MCP/ACL validation and preparation for task planning.
     Processes semantic context for improved task planning and agent coordination.
     """
-    
+    def __init__(self, handlers: Optional[HandlerRegistry] = None):
+        # Data keys declared by agent handlers complete the plan's data flows
+        self.handlers = handlers or HANDLERS
+
+
     def validate(self, mcp_acl_json: Dict[str, Any]) -> bool:
         """
         Validates the structure and content of enriched MCP/ACL JSON
@@ -79,18 +85,19 @@ class InputHandler:
             except Exception as e:
                 logger.warning(f"Could not parse semantic context: {str(e)}")
 
+        # Index data flows by agent once instead of scanning them per action
+        flows_to = defaultdict(list)
+        flows_from = defaultdict(list)
+        for flow in mcp_acl_json["data_flow"]:
+            flows_to[flow["to"]].append(flow)
+            flows_from[flow["from"]].append(flow)
+
         # Extract ordered list of actions with their dependencies
         plan = []
         for action in mcp_acl_json["actions"]:
             # Find related data flows
-            input_flows = [
-                flow for flow in mcp_acl_json["data_flow"]
-                if flow["to"] == action["agent"]
-            ]
-            output_flows = [
-                flow for flow in mcp_acl_json["data_flow"]
-                if flow["from"] == action["agent"]
-            ]
+            input_flows = flows_to.get(action["agent"], [])
+            output_flows = flows_from.get(action["agent"], [])
 
             # Enrich action parameters with semantic understanding
             enriched_params = action["params"].copy()
@@ -103,13 +110,21 @@ class InputHandler:
                     "severity_indicators": semantic_context.severity_indicators
                 }
 
+            inputs = [flow["data"] for flow in input_flows]
+            outputs = [flow["data"] for flow in output_flows]
+            # Wire the handler's declared keys even when data_flow leaves them out
+            handler = self.handlers.get(action["agent"], action["action"])
+            if handler is not None:
+                inputs += [key for key in handler.input_keys if key not in inputs]
+                outputs += [key for key in handler.output_keys if key not in outputs]
+
             # Create plan entry with semantic enrichment
             plan_entry = {
                 "agent": action["agent"],
                 "action": action["action"],
                 "params": enriched_params,
-                "inputs": [flow["data"] for flow in input_flows],
-                "outputs": [flow["data"] for flow in output_flows]
+                "inputs": inputs,
+                "outputs": outputs
             }
 
             # Add semantic priority if available
@@ -0,0 +1,138 @@
+import os
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional, Set
+import logging
+from common.deadline import Deadline, current_deadline, deadline_scope
+from common.metrics import REGISTRY
+from orchestration.transports import AgentTransport
+from services.llm_service import extract_explicit_patient_id
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PREFETCH_TOTAL = REGISTRY.counter(
+    "speculative_prefetch_total",
+    "Cache warm-ups started while the prompt was being classified, by agent and outcome "
+    "(warmed, cold, failed, cancelled, skipped_busy)",
+    ("agent", "outcome"))
+
+
+class PrefetchHandle:
+    """
+    Warm-ups started for one prompt. Once the plan is known, `retain` cancels
+    those for agents the plan does not call; `cancel` drops them all. A
+    warm-up already talking to its agent cannot be interrupted, it is only
+    counted as cancelled; its budget cap bounds the wasted work.
+    """
+    def __init__(self, patient_id: Optional[str] = None):
+        self.patient_id = patient_id
+        self._futures: Dict[str, Future] = {}
+        self._cancelled: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def agents(self) -> Set[str]:
+        return set(self._futures)
+
+    def retain(self, agents: Iterable[str]):
+        keep = set(agents)
+        for agent in list(self._futures):
+            if agent not in keep:
+                self._cancel(agent)
+
+    def cancel(self):
+        for agent in list(self._futures):
+            self._cancel(agent)
+
+    def cancelled(self, agent: str) -> bool:
+        with self._lock:
+            return agent in self._cancelled
+
+    def _cancel(self, agent: str):
+        with self._lock:
+            if agent in self._cancelled:
+                return
+            self._cancelled.add(agent)
+        if self._futures[agent].cancel():
+            PREFETCH_TOTAL.inc(agent=agent, outcome="cancelled")
+
+
+class SpeculativePrefetcher:
+    """
+    Starts warming the agents' patient caches (FHIR history in the symptom
+    analyzer, the Neo4j journey in the journey agent) as soon as a patient
+    ID shows up in the raw prompt, so the fetches run while the prompt
+    processor's LLM call classifies the intent instead of after it.
+
+    Each warm-up gets at most PREFETCH_BUDGET_MS (and never more than the
+    request has left), and at most PREFETCH_MAX_IN_FLIGHT run at once;
+    beyond that prompts are not prefetched rather than queued.
+    SPECULATIVE_PREFETCH=false turns the stage off.
+    """
+    def __init__(self, transport: AgentTransport, budget_ms: Optional[float] = None,
+                 max_in_flight: Optional[int] = None, enabled: Optional[bool] = None):
+        self.transport = transport
+        self.budget = (budget_ms if budget_ms is not None
+                       else float(os.getenv("PREFETCH_BUDGET_MS", "2000"))) / 1000.0
+        self.max_in_flight = max_in_flight or int(os.getenv("PREFETCH_MAX_IN_FLIGHT", "32"))
+        self.enabled = enabled if enabled is not None else (
+            os.getenv("SPECULATIVE_PREFETCH", "true").lower() in ("1", "true", "yes"))
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="prefetch")
+
+    def targets(self, prompt: str) -> Dict[str, Dict[str, Any]]:
+        """Prefetch payload per agent for a raw prompt; empty when it names no patient"""
+        patient_id = extract_explicit_patient_id(prompt or "")
+        if not patient_id:
+            return {}
+        return {
+            # The analyzer resolves the ID from the text exactly as the analysis will
+            "symptom_analyzer": {"symptoms_text": prompt},
+            "patient_journey": {"patient_id": patient_id},
+        }
+
+    def start(self, prompt: str) -> PrefetchHandle:
+        """Launch the warm-ups for a prompt without waiting for them"""
+        targets = self.targets(prompt) if self.enabled else {}
+        handle = PrefetchHandle(targets.get("patient_journey", {}).get("patient_id"))
+        if not targets:
+            return handle
+
+        budget = self.budget
+        deadline = current_deadline()
+        if deadline is not None:
+            budget = min(budget, deadline.remaining())
+        if budget <= 0:
+            return handle
+        # One deadline for all warm-ups of the prompt, forwarded to the agents
+        prefetch_deadline = Deadline(budget)
+
+        for agent, payload in targets.items():
+            if not self._slots.acquire(blocking=False):
+                PREFETCH_TOTAL.inc(agent=agent, outcome="skipped_busy")
+                continue
+            future = self._pool.submit(contextvars.copy_context().run,
+                                       self._warm, handle, agent, payload, prefetch_deadline)
+            # Frees the slot whether the warm-up ran or was cancelled before starting
+            future.add_done_callback(lambda _: self._slots.release())
+            handle._futures[agent] = future
+        logger.info(f"Prefetching {sorted(handle.agents())} for patient {handle.patient_id}")
+        return handle
+
+    def _warm(self, handle: PrefetchHandle, agent: str, payload: Dict[str, Any], deadline: Deadline):
+        if handle.cancelled(agent):
+            PREFETCH_TOTAL.inc(agent=agent, outcome="cancelled")
+            return
+        with deadline_scope(deadline):
+            try:
+                response = self.transport.prefetch(agent, payload)
+                outcome = "warmed" if response.get("warmed") else "cold"
+            except Exception as e:
+                # Speculative: the real call fetches the data itself if this did not
+                logger.debug(f"Prefetch for {agent} failed: {str(e)}")
+                outcome = "failed"
+        PREFETCH_TOTAL.inc(agent=agent, outcome="cancelled" if handle.cancelled(agent) else outcome)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
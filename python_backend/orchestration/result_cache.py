@@ -0,0 +1,221 @@
+import os
+import json
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+import logging
+from common.metrics import REGISTRY, record_cache_lookup
+from common.singleflight import SingleFlight
+from orchestration.error_handler import IDEMPOTENT_ACTIONS
+from services.prompt_templates import TEMPLATES
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CACHE_NAME = "workflow_results"
+
+# Seconds a workflow's results stay fresh; 0 disables caching for that workflow
+DEFAULT_WORKFLOW_TTLS = {
+    "medical_diagnosis": 300.0,
+    "patient_journey_tracking": 60.0,
+}
+
+WORKFLOW_CACHE_INVALIDATIONS_TOTAL = REGISTRY.counter(
+    "workflow_cache_invalidations_total", "Cached workflow results dropped, by reason",
+    ("reason",))
+WORKFLOW_CACHE_ENTRIES = REGISTRY.gauge(
+    "workflow_cache_entries", "Workflow results currently cached")
+
+
+def plan_key(workflow: str, plan: List[Dict[str, Any]]) -> str:
+    """
+    Canonical hash of a validated plan: key order and whitespace do not
+    matter. Results produced under other prompt template versions miss.
+    """
+    canonical = json.dumps({"workflow": workflow, "plan": plan, "templates": TEMPLATES.fingerprint()},
+                           sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def parse_ttls(spec: Optional[str]) -> Dict[str, float]:
+    """"medical_diagnosis=300,patient_journey_tracking=60" -> {workflow: seconds}"""
+    ttls = {}
+    for entry in (spec or "").split(","):
+        if "=" in entry:
+            workflow, seconds = entry.split("=", 1)
+            ttls[workflow.strip()] = float(seconds)
+    return ttls
+
+
+def plan_patient_ids(plan: Iterable[Dict[str, Any]], results: Iterable[Dict[str, Any]] = ()) -> Set[str]:
+    """Patients a plan reads, from task params and the IDs agents resolved"""
+    patient_ids = set()
+    for task in plan:
+        patient_id = task.get("params", {}).get("patient_id")
+        if patient_id:
+            patient_ids.add(str(patient_id).lower())
+    for result in results:
+        patient_id = result.get("patient_id")
+        if patient_id:
+            patient_ids.add(str(patient_id).lower())
+    return patient_ids
+
+
+class _Entry:
+    def __init__(self, results: List[Dict[str, Any]], expires_at: float, patient_ids: Set[str]):
+        self.results = results
+        self.expires_at = expires_at
+        self.patient_ids = patient_ids
+
+
+class WorkflowResultCache:
+    """
+    Dispatch results per validated plan. Identical plans (same workflow,
+    symptoms text, patient and actions) are served from the cache until
+    their workflow's TTL passes or one of their patients' data changes;
+    concurrent identical plans wait for a single dispatch. Plans with
+    non-idempotent actions are never cached, and they invalidate the
+    entries of the patients they touch. Results containing agent errors
+    are not cached, so a retry gets a fresh attempt.
+
+    The agents keep short caches of their own (FHIR histories, journeys),
+    so for `invalidation_hold` seconds after a patient is invalidated
+    (every patient after clear()) results that read the patient are
+    returned but not stored: they may come from an agent cache that still
+    holds the old data. The hold should match the longest agent cache TTL;
+    past it, results are cached again even if an agent kept an old entry
+    longer (a fetch in flight during the invalidation stores its result
+    late), so that window stays open by up to one agent request.
+    """
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, default_ttl: Optional[float] = None,
+                 max_entries: Optional[int] = None, cacheable_actions: Optional[Iterable[str]] = None,
+                 invalidation_hold: Optional[float] = None):
+        self.ttls = dict(DEFAULT_WORKFLOW_TTLS)
+        self.ttls.update(ttls if ttls is not None else parse_ttls(os.getenv("WORKFLOW_CACHE_TTLS")))
+        self.default_ttl = default_ttl if default_ttl is not None else float(
+            os.getenv("WORKFLOW_CACHE_TTL_SECONDS", "60"))
+        self.max_entries = max_entries or int(os.getenv("WORKFLOW_CACHE_MAX_ENTRIES", "1024"))
+        self.cacheable_actions = set(cacheable_actions or IDEMPOTENT_ACTIONS)
+        self.invalidation_hold = invalidation_hold if invalidation_hold is not None else float(
+            os.getenv("WORKFLOW_CACHE_INVALIDATION_HOLD_SECONDS", "30"))
+        # Patient ID (lowercased) -> monotonic time until which its results are not stored
+        self._held: Dict[str, float] = {}
+        self._held_all_until = 0.0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_patient: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._flight = SingleFlight(CACHE_NAME)
+        # Bumped by every invalidation so a dispatch that overlapped one is not stored
+        self._epoch = 0
+
+    def ttl(self, workflow: str) -> float:
+        return self.ttls.get(workflow, self.default_ttl)
+
+    def cacheable(self, plan: List[Dict[str, Any]]) -> bool:
+        return all(task.get("action") in self.cacheable_actions for task in plan)
+
+    def get_or_compute(self, workflow: str, plan: List[Dict[str, Any]],
+                       compute: Callable[[], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Cached results for the plan, or compute() run once for all concurrent callers"""
+        if not self.cacheable(plan):
+            results = compute()
+            for patient_id in plan_patient_ids(plan, results):
+                self.invalidate_patient(patient_id, reason="write")
+            return results
+        if self.ttl(workflow) <= 0:
+            return compute()
+
+        key = plan_key(workflow, plan)
+        results = self._get(key)
+        record_cache_lookup(CACHE_NAME, results is not None)
+        if results is not None:
+            return results
+
+        results, _ = self._flight.do(key, lambda: self._compute_and_store(key, workflow, plan, compute))
+        return results
+
+    def _compute_and_store(self, key, workflow, plan, compute):
+        epoch = self._epoch
+        results = compute()
+        if any(result.get("error") for result in results):
+            return results
+        entry = _Entry(results, time.monotonic() + self.ttl(workflow), plan_patient_ids(plan, results))
+        with self._lock:
+            if epoch != self._epoch or self._is_held(entry.patient_ids):
+                return results
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            for patient_id in entry.patient_ids:
+                self._by_patient.setdefault(patient_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._unindex(evicted_key, evicted)
+            WORKFLOW_CACHE_ENTRIES.set(len(self._entries))
+        return results
+
+    def _get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._drop(key)
+                WORKFLOW_CACHE_INVALIDATIONS_TOTAL.inc(reason="expired")
+                return None
+            self._entries.move_to_end(key)
+            return entry.results
+
+    def _is_held(self, patient_ids: Set[str]) -> bool:
+        # Caller holds the lock
+        now = time.monotonic()
+        if now < self._held_all_until:
+            return True
+        for patient_id, until in list(self._held.items()):
+            if until <= now:
+                del self._held[patient_id]
+        return any(patient_id in self._held for patient_id in patient_ids)
+
+    def _unindex(self, key: str, entry: _Entry):
+        # Caller holds the lock
+        for patient_id in entry.patient_ids:
+            keys = self._by_patient.get(patient_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_patient[patient_id]
+
+    def _drop(self, key: str):
+        # Caller holds the lock
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._unindex(key, entry)
+        WORKFLOW_CACHE_ENTRIES.set(len(self._entries))
+
+    def invalidate_patient(self, patient_id: str, reason: str = "patient_data_changed") -> int:
+        """Drop every cached workflow that read this patient's data; returns the number dropped"""
+        with self._lock:
+            self._epoch += 1
+            if self.invalidation_hold > 0:
+                self._held[str(patient_id).lower()] = time.monotonic() + self.invalidation_hold
+            keys = list(self._by_patient.get(str(patient_id).lower(), ()))
+            for key in keys:
+                self._drop(key)
+        if keys:
+            logger.info(f"Invalidated {len(keys)} cached workflow result(s) for patient {patient_id} ({reason})")
+            WORKFLOW_CACHE_INVALIDATIONS_TOTAL.inc(len(keys), reason=reason)
+        return len(keys)
+
+    def clear(self) -> int:
+        with self._lock:
+            self._epoch += 1
+            self._held_all_until = time.monotonic() + self.invalidation_hold
+            self._held.clear()
+            count = len(self._entries)
+            self._entries.clear()
+            self._by_patient.clear()
+            WORKFLOW_CACHE_ENTRIES.set(0)
+        if count:
+            WORKFLOW_CACHE_INVALIDATIONS_TOTAL.inc(count, reason="cleared")
+        return count
@@ -1,12 +1,17 @@
+from common.metrics import TASK_STATUS_TOTAL
+
+
 class StateManager:
     """
     Maintains workflow context, tracks task status and intermediate results.
+    Every status update is also exported as a metric.
     """
     def __init__(self):
         self.state = {}
 
     def update(self, agent, status):
         self.state[agent] = status
+        TASK_STATUS_TOTAL.inc(agent=agent or 'unknown', status=status)
 
     def get_state(self):
         return self.state
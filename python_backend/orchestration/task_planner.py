@@ -22,9 +22,13 @@ class TaskPlanner:
         # Track semantic priorities
         priority_tasks = defaultdict(list)  # high, medium, low priorities
         
+        # Index tasks by id so the topological sort does not rescan the plan
+        tasks_by_id = {}
+
         # First pass: identify data providers
         for task in plan:
             task_id = f"{task['agent']}_{task['action']}"
+            tasks_by_id.setdefault(task_id, task)
             # Check what data this task provides
             if 'outputs' in task:
                 for output in task['outputs']:
@@ -56,12 +60,11 @@ class TaskPlanner:
                 visit(dep)
             temp_visited.remove(task_id)
             visited.add(task_id)
-            for task in plan:
-                if f"{task['agent']}_{task['action']}" == task_id:
-                    # Consider semantic priority when sequencing
-                    priority = task.get('priority', 'medium')
-                    priority_tasks[priority].append(task)
-                    break
+            task = tasks_by_id.get(task_id)
+            if task is not None:
+                # Consider semantic priority when sequencing
+                priority = task.get('priority', 'medium')
+                priority_tasks[priority].append(task)
 
         # Process all tasks considering priorities
         for task in plan:
@@ -0,0 +1,221 @@
+import os
+import importlib
+from typing import Any, Callable, Dict, Optional
+import logging
+from common.deadline import deadline_headers, timeout_for
+from common.metrics import track_outbound
+from common.priority import priority_headers
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEPLOYMENT_MODES = ("distributed", "monolith")
+
+
+class AgentTransportError(Exception):
+    """Raised when an agent cannot be reached or answers with a non-200 status"""
+    def __init__(self, agent: str, detail: str, status_code: Optional[int] = None):
+        super().__init__(f"{agent} error ({status_code}): {detail}" if status_code else f"{agent} error: {detail}")
+        self.agent = agent
+        self.detail = detail
+        self.status_code = status_code
+
+
+class AgentTransport:
+    """
+    How the orchestrator reaches an agent. `call` takes the request payload
+    as a dict and returns the agent's response body as a dict, e.g.
+    {"result": {...}, "error": None}.
+    """
+    def call(self, agent: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        with track_outbound("agent", agent):
+            return self._call(agent, payload)
+
+    def _call(self, agent: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def prefetch(self, agent: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Ask an agent to warm its caches for a request that may follow"""
+        with track_outbound("agent_prefetch", agent):
+            return self._prefetch(agent, payload)
+
+    def _prefetch(self, agent: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        raise AgentTransportError(agent, "prefetch not supported by this transport")
+
+    def invalidate(self, agent: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Drop an agent's cached patient data ({"patient_id": ...}, or {} for
+        everything); returns {"invalidated": <entries dropped>}
+        """
+        with track_outbound("agent_invalidate", agent):
+            return self._invalidate(agent, payload)
+
+    def _invalidate(self, agent: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        raise AgentTransportError(agent, "cache invalidation not supported by this transport")
+
+
+def default_agent_urls() -> Dict[str, str]:
+    """Agent endpoints, overridable with AGENT_HOST or the per-agent *_URL variables"""
+    # Use the same IP as the frontend configuration
+    host = os.getenv("AGENT_HOST", "192.168.1.25")  # Your machine's IP address
+    return {
+        "prompt_processor": os.getenv("PROMPT_PROCESSOR_URL", "http://127.0.0.1:8000/process_prompt"),
+        "disease_prediction": os.getenv("DISEASE_PREDICTION_URL", f"http://{host}:8002/predict_disease"),
+        "symptom_analyzer": os.getenv("SYMPTOM_ANALYZER_URL", f"http://{host}:8003/analyze_symptoms"),
+        "patient_journey": os.getenv("PATIENT_JOURNEY_URL", f"http://{host}:8005/patient_journey"),
+    }
+
+
+class HTTPTransport(AgentTransport):
+    """
+    JSON over HTTP to agents running as separate services. Each call goes to
+    the endpoint the registry picks among the agent's replicas.
+    """
+    def __init__(self, registry=None, timeout: Optional[float] = None):
+        import requests
+        from orchestration.agent_registry import AgentRegistry
+
+        self.registry = registry or AgentRegistry.from_config()
+        # Upper bound per call; the request deadline shortens it further
+        self.timeout = timeout or float(os.getenv("AGENT_TIMEOUT_SECONDS", "30"))
+        # One pooled session so calls reuse connections to each agent
+        self.session = requests.Session()
+
+    def _call(self, agent: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        import requests
+
+        timeout = timeout_for(self.timeout, stage="agent_call")
+        try:
+            with self.registry.acquire(agent) as endpoint:
+                try:
+                    response = self.session.post(endpoint.url, json=payload,
+                                                 headers={**deadline_headers(), **priority_headers()},
+                                                 timeout=timeout)
+                except requests.Timeout as e:
+                    raise AgentTransportError(agent, f"no response within {timeout:.3f}s", 504) from e
+                except requests.RequestException as e:
+                    raise AgentTransportError(agent, str(e)) from e
+                # Server errors count against the endpoint, client errors do not
+                if response.status_code >= 500:
+                    raise AgentTransportError(agent, response.text, response.status_code)
+        except KeyError as e:
+            raise AgentTransportError(agent, "no endpoint configured") from e
+        if response.status_code != 200:
+            raise AgentTransportError(agent, response.text, response.status_code)
+        return response.json()
+
+    def _prefetch(self, agent: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        import requests
+
+        # Speculative work: not tracked as endpoint load or counted towards ejection
+        try:
+            endpoint = self.registry.choose(agent)
+        except KeyError as e:
+            raise AgentTransportError(agent, "no endpoint configured") from e
+        url = endpoint.url.rsplit("/", 1)[0] + "/prefetch"
+        timeout = timeout_for(self.timeout, stage="agent_prefetch")
+        try:
+            response = self.session.post(url, json=payload, headers=deadline_headers(), timeout=timeout)
+        except requests.Timeout as e:
+            raise AgentTransportError(agent, f"no response within {timeout:.3f}s", 504) from e
+        except requests.RequestException as e:
+            raise AgentTransportError(agent, str(e)) from e
+        if response.status_code != 200:
+            raise AgentTransportError(agent, response.text, response.status_code)
+        return response.json()
+
+    def _invalidate(self, agent: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        import requests
+
+        # Every replica keeps its own cache, including ejected ones that may come back
+        endpoints = self.registry.endpoints.get(agent)
+        if not endpoints:
+            raise AgentTransportError(agent, "no endpoint configured")
+        timeout = timeout_for(self.timeout, stage="agent_invalidate")
+        invalidated, failures = 0, []
+        for endpoint in endpoints:
+            url = endpoint.url.rsplit("/", 1)[0] + "/cache/invalidate"
+            try:
+                response = self.session.post(url, json=payload, headers=deadline_headers(), timeout=timeout)
+            except requests.RequestException as e:
+                failures.append(f"{endpoint.url}: {e}")
+                continue
+            if response.status_code != 200:
+                failures.append(f"{endpoint.url}: {response.status_code} {response.text}")
+                continue
+            invalidated += response.json().get("invalidated", 0)
+        if failures:
+            raise AgentTransportError(agent, "; ".join(failures))
+        return {"invalidated": invalidated}
+
+
+def _handler(module_name: str, function_name: str) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """In-process handler calling an agent's dict-level function, imported on first use"""
+    def handler(payload: Dict[str, Any]) -> Dict[str, Any]:
+        return getattr(importlib.import_module(module_name), function_name)(payload)
+    return handler
+
+
+def _prompt_processor(payload: Dict[str, Any]) -> Dict[str, Any]:
+    from services.prompt_processor import build_mcp_acl
+    return {"mcp_acl": build_mcp_acl(payload)}
+
+
+class InProcessTransport(AgentTransport):
+    """
+    Calls the agents' functions directly in this process: the payload dict is
+    handed to the agent's dict-level function and its response dict comes
+    back as is, with no HTTP hop, JSON encoding or model validation in
+    between. Requests are validated only at the agents' HTTP routes.
+    """
+    def __init__(self, handlers: Optional[Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]]] = None,
+                 prefetch_handlers: Optional[Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]]] = None,
+                 invalidate_handlers: Optional[Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]]] = None):
+        self.invalidate_handlers = invalidate_handlers or {
+            "symptom_analyzer": _handler("agents.symptom_analyzer.main", "invalidate"),
+            "patient_journey": _handler("agents.patient_journey.main", "invalidate"),
+        }
+        self.prefetch_handlers = prefetch_handlers or {
+            "symptom_analyzer": _handler("agents.symptom_analyzer.main", "prefetch_history"),
+            "patient_journey": _handler("agents.patient_journey.main", "prefetch"),
+        }
+        self.handlers = handlers or {
+            "prompt_processor": _prompt_processor,
+            "symptom_analyzer": _handler("agents.symptom_analyzer.main", "analyze"),
+            "disease_prediction": _handler("agents.disease_prediction.main", "predict"),
+            "patient_journey": _handler("agents.patient_journey.main", "journey"),
+        }
+
+    def _call(self, agent: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return self._invoke(agent, self.handlers.get(agent), payload)
+
+    def _prefetch(self, agent: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return self._invoke(agent, self.prefetch_handlers.get(agent), payload)
+
+    def _invalidate(self, agent: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return self._invoke(agent, self.invalidate_handlers.get(agent), payload)
+
+    def _invoke(self, agent: str, handler: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]],
+                payload: Dict[str, Any]) -> Dict[str, Any]:
+        from fastapi import HTTPException
+
+        if handler is None:
+            raise AgentTransportError(agent, "no in-process handler registered")
+        try:
+            return handler(payload)
+        except HTTPException as e:
+            raise AgentTransportError(agent, str(e.detail), e.status_code) from e
+
+
+def deployment_mode() -> str:
+    mode = os.getenv("DEPLOYMENT_MODE", "distributed").lower()
+    if mode not in DEPLOYMENT_MODES:
+        raise ValueError(f"Unknown DEPLOYMENT_MODE '{mode}' (expected one of {', '.join(DEPLOYMENT_MODES)})")
+    return mode
+
+
+def get_transport() -> AgentTransport:
+    """Transport for the configured DEPLOYMENT_MODE"""
+    mode = deployment_mode()
+    logger.info(f"Agent transport: {mode}")
+    return InProcessTransport() if mode == "monolith" else HTTPTransport()
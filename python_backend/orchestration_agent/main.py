@@ -1,8 +1,8 @@
 import os
-import requests
 from fastapi import FastAPI, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import traceback
 import logging
 
@@ -11,6 +11,15 @@ from orchestration.task_planner import TaskPlanner
 from orchestration.agent_dispatcher import AgentDispatcher
 from services.enrichment_service import EnrichmentService
 from services.llm_service import LLMService
+from orchestration.state_manager import StateManager
+from orchestration.error_handler import ErrorHandler
+from orchestration.prefetch import SpeculativePrefetcher
+from orchestration.result_cache import WorkflowResultCache
+from orchestration.transports import AgentTransportError
+from common.deadline import DeadlineExceeded, DeadlineMiddleware
+from common.priority import PriorityMiddleware
+from common.metrics import instrument_app, record_error
+from common.responses import use_fast_json
 
 # Initialize logger
 logging.basicConfig(
@@ -21,6 +30,10 @@ logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
 app = FastAPI(title="Orchestration Agent API")
+use_fast_json(app)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(PriorityMiddleware)
+instrument_app(app, "orchestration_agent")
 
 @app.get("/health")
 async def health_check():
@@ -66,7 +79,52 @@ enrichment_service = EnrichmentService()
 llm_service = LLMService()
 input_handler = InputHandler()
 task_planner = TaskPlanner()
-agent_dispatcher = AgentDispatcher()
+error_handler = ErrorHandler()
+agent_dispatcher = AgentDispatcher(error_handler=error_handler)
+state_manager = StateManager()
+workflow_cache = WorkflowResultCache()
+prefetcher = SpeculativePrefetcher(agent_dispatcher.transport)
+
+@app.get("/agents")
+def agent_endpoints():
+    """Registered agent endpoints with their load-balancing and health state"""
+    registry = getattr(agent_dispatcher.transport, "registry", None)
+    circuits = error_handler.circuit_states()
+    if registry is None:
+        return {"deployment_mode": "monolith", "agents": {}, "circuits": circuits}
+    return {"deployment_mode": "distributed", "strategy": registry.strategy,
+            "agents": registry.status(), "circuits": circuits}
+
+class CacheInvalidation(BaseModel):
+    patient_id: Optional[str] = None
+
+# Agents that cache patient data themselves
+CACHING_AGENTS = ("symptom_analyzer", "patient_journey")
+
+@app.post("/cache/invalidate")
+def invalidate_cache(request: CacheInvalidation):
+    """
+    Drop cached patient data, for one patient when patient_id is given.
+    Called when a patient's FHIR data or journey changes outside the
+    orchestrator. The agents' caches are cleared first, so a workflow
+    dispatched after this returns reads fresh data; the workflow cache
+    then holds off storing that patient's results for
+    WORKFLOW_CACHE_INVALIDATION_HOLD_SECONDS in case an agent (or a
+    replica that could not be reached) still serves the old data.
+    """
+    payload = {"patient_id": request.patient_id} if request.patient_id else {}
+    agents = {}
+    for agent in CACHING_AGENTS:
+        try:
+            agents[agent] = agent_dispatcher.transport.invalidate(agent, payload)
+        except AgentTransportError as e:
+            logger.warning(f"Could not invalidate {agent} caches: {e}")
+            agents[agent] = {"error": str(e)}
+    if request.patient_id:
+        invalidated = workflow_cache.invalidate_patient(request.patient_id)
+    else:
+        invalidated = workflow_cache.clear()
+    return {"invalidated": invalidated, "agents": agents}
 
 class MCPACLInput(BaseModel):
     mcp_acl: Dict[str, Any]
@@ -119,27 +177,29 @@ async def orchestrate(request: ChatRequest):
             "workflow": request.workflow
         }
         
+        # Warm the patient's FHIR history and journey while the LLM classifies the prompt
+        prefetch = prefetcher.start(request.prompt)
         try:
-            prompt_response = requests.post(
-                "http://127.0.0.1:8000/process_prompt",
-                json=prompt_payload
-            )
-            if prompt_response.status_code != 200:
+            prompt_response = await run_in_threadpool(agent_dispatcher.call_agent, "prompt_processor", "process_prompt", prompt_payload)
+        except AgentTransportError as e:
+            prefetch.cancel()
+            if e.status_code is None:
                 raise HTTPException(
-                    status_code=prompt_response.status_code,
-                    detail=f"Prompt Processor Error: {prompt_response.text}"
+                    status_code=503,
+                    detail=f"Error communicating with prompt processor: {e.detail}"
                 )
-            
-            mcp_acl = prompt_response.json().get("mcp_acl")
-            if not mcp_acl:
-                raise HTTPException(
-                    status_code=400,
-                    detail="No MCP/ACL structure returned from prompt processor"
-                )
-        except requests.RequestException as e:
             raise HTTPException(
-                status_code=503,
-                detail=f"Error communicating with prompt processor: {str(e)}"
+                status_code=e.status_code,
+                detail=f"Prompt Processor Error: {e.detail}"
+            )
+
+        mcp_acl = prompt_response.get("mcp_acl")
+        # Only the agents the plan calls will read what was prefetched
+        prefetch.retain((mcp_acl or {}).get("agents", []))
+        if not mcp_acl:
+            raise HTTPException(
+                status_code=400,
+                detail="No MCP/ACL structure returned from prompt processor"
             )
 
         if not input_handler.validate(mcp_acl):
@@ -147,7 +207,16 @@ async def orchestrate(request: ChatRequest):
 
         plan = input_handler.extract_plan(mcp_acl)
         sequenced_tasks = task_planner.sequence_tasks(plan)
-        results = agent_dispatcher.dispatch(sequenced_tasks)
+        # Dispatch blocks on the agents (or runs them in-process), keep it off the event loop.
+        # Retries and duplicate submissions of the same plan are served from the workflow cache.
+        results = await run_in_threadpool(
+            workflow_cache.get_or_compute, mcp_acl.get("workflow", request.workflow), plan,
+            lambda: agent_dispatcher.dispatch(sequenced_tasks))
+
+        # Feed task outcomes into state tracking and error metrics
+        for result in results:
+            state_manager.update(result.get('agent'), 'failed' if result.get('error') else 'completed')
+        error_handler.handle([result['error'] for result in results if result.get('error')])
         
         # Store results for this session
         session_results[request.session_id] = results
@@ -156,11 +225,14 @@ async def orchestrate(request: ChatRequest):
             "status": "success",
             "results": results
         }
+    except DeadlineExceeded as de:
+        raise HTTPException(status_code=504, detail=str(de))
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         logger.error(f"Orchestration error: {str(e)}")
         logger.error(traceback.format_exc())
+        record_error("orchestration_agent", e)
         raise HTTPException(status_code=500, detail=f"Orchestration error: {str(e)}")
 
 class DiseasePredictionRequest(BaseModel):
@@ -215,14 +287,17 @@ async def orchestrate_with_prompt(request: Request):
             "workflow": input_data.get("workflow")
         }
 
-        # Step 2: Call the prompt_processor service
-        import httpx
-        async with httpx.AsyncClient() as client:
-            response = await client.post("http://127.0.0.1:8000/process_prompt", json=prompt_payload)
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail=f"Prompt Processor Error: {response.text}")
+        # Step 2: Call the prompt_processor service (off the event loop, the transport blocks),
+        # warming the patient's data in the agents meanwhile
+        prefetch = prefetcher.start(prompt_payload["prompt"])
+        try:
+            response = await run_in_threadpool(agent_dispatcher.call_agent, "prompt_processor", "process_prompt", prompt_payload)
+        except AgentTransportError as e:
+            prefetch.cancel()
+            raise HTTPException(status_code=e.status_code or 503, detail=f"Prompt Processor Error: {e.detail}")
 
-            mcp_acl = response.json().get("mcp_acl")
+        mcp_acl = response.get("mcp_acl")
+        prefetch.retain((mcp_acl or {}).get("agents", []))
 
         # Step 3: Validate MCP/ACL structure
         if not input_handler.validate(mcp_acl):
@@ -234,8 +309,10 @@ async def orchestrate_with_prompt(request: Request):
         # Step 5: Sequence tasks
         sequenced_tasks = task_planner.sequence_tasks(plan)
 
-        # Step 6: Dispatch tasks to sub-agents
-        dispatch_results = agent_dispatcher.dispatch(sequenced_tasks)
+        # Step 6: Dispatch tasks to sub-agents (or reuse the cached results of the same plan)
+        dispatch_results = await run_in_threadpool(
+            workflow_cache.get_or_compute, mcp_acl.get("workflow", input_data.get("workflow")), plan,
+            lambda: agent_dispatcher.dispatch(sequenced_tasks))
 
         # Step 7: Return results
         return {
@@ -1,8 +1,12 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import Dict, List, Optional, Any
+from common.metrics import instrument_app
+from common.responses import use_fast_json
 
 app = FastAPI(title="FHIR Demo Server")
+use_fast_json(app)
+instrument_app(app, "fhir_demo_server")
 
 # Mock FHIR database
 mock_patient_data = {
@@ -0,0 +1,554 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import os
+import importlib.util
+import json
+import math
+import random
+import threading
+import time
+from collections import deque
+import logging
+from common.deadline import timeout_for
+from common.metrics import REGISTRY
+from services.structured_output import parse_json_object, stream_until
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gemini-2.5-pro"
+# Model tiers tried in order, "model=min_confidence"; the last tier always answers
+DEFAULT_CASCADE = f"gemini-2.5-flash-lite=0.8,{DEFAULT_MODEL}"
+
+LLM_TIER_CALLS_TOTAL = REGISTRY.counter(
+    "llm_tier_calls_total",
+    "LLM calls per model tier, by outcome (accepted, or escalated because of "
+    "low_confidence, invalid or error)",
+    ("tier", "outcome"))
+LLM_TIER_SECONDS = REGISTRY.histogram(
+    "llm_tier_seconds", "LLM call latency per model tier", ("tier",))
+LLM_TIER_TOKENS_TOTAL = REGISTRY.counter(
+    "llm_tier_tokens_total", "Estimated LLM tokens per model tier", ("tier", "direction"))
+LLM_TIER_COST_TOTAL = REGISTRY.counter(
+    "llm_tier_cost_total", "Estimated LLM spend per model tier, in the unit of the configured costs",
+    ("tier",))
+
+
+class LLMBackendError(Exception):
+    """Raised when an LLM backend cannot be created or a call fails"""
+
+
+class LLMTimeoutError(LLMBackendError):
+    """Raised when an LLM call does not finish within its timeout"""
+
+
+class LLMRateLimitError(LLMBackendError):
+    """Raised when a call would exceed the backend's token rate limit"""
+
+
+class LLMOverloadedError(LLMRateLimitError):
+    """Raised when the LLM gateway sheds a call or it waits too long for quota"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return max(1, math.ceil(len(text) / 4))
+
+
+class LLMBackend:
+    """
+    Interface every LLM backend implements. Backends are callable with a
+    prompt, like the LangChain LLM objects they replace, and can stream
+    the response as text chunks.
+    """
+    name = "base"
+
+    def __call__(self, prompt: str, timeout: Optional[float] = None,
+                 validate: Optional[Callable[[str], bool]] = None,
+                 schema: Optional[Dict[str, Any]] = None,
+                 stop_when: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                 max_output_tokens: Optional[int] = None) -> str:
+        """
+        `validate` checks an answer; only a model cascade uses it, to decide
+        when to escalate. `schema` asks for JSON matching it where the model
+        supports a JSON mode. `stop_when` streams the answer and stops once
+        it holds for the completed top-level JSON fields. `max_output_tokens`
+        caps the length of the answer.
+        """
+        return self.complete(prompt, timeout=timeout, schema=schema, stop_when=stop_when,
+                             max_output_tokens=max_output_tokens)
+
+    def complete(self, prompt: str, timeout: Optional[float] = None, schema: Optional[Dict[str, Any]] = None,
+                 stop_when: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                 max_output_tokens: Optional[int] = None) -> str:
+        if stop_when is None:
+            return self.generate(prompt, timeout=timeout, schema=schema, max_output_tokens=max_output_tokens)
+        chunks = self.stream(prompt, timeout=timeout, schema=schema, max_output_tokens=max_output_tokens)
+        text, _ = stream_until(chunks, stop_when)
+        return text
+
+    def generate(self, prompt: str, timeout: Optional[float] = None, schema: Optional[Dict[str, Any]] = None,
+                 max_output_tokens: Optional[int] = None) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str, timeout: Optional[float] = None, schema: Optional[Dict[str, Any]] = None,
+               max_output_tokens: Optional[int] = None) -> Iterator[str]:
+        yield self.generate(prompt, timeout=timeout, schema=schema, max_output_tokens=max_output_tokens)
+
+
+class VertexAIBackend(LLMBackend):
+    """
+    Gemini on Vertex AI through LangChain. The LangChain import and client
+    are deferred to the first call because they dominate service cold start.
+    Timeouts are passed to the API request itself, so a call that times out
+    stops holding anything. LangChain's own retries are off by default
+    (VERTEX_MAX_RETRIES): each retry would get the full timeout again, and
+    the cascade, gateway and orchestrator already decide when to try again.
+    """
+    name = "vertex"
+
+    def __init__(self, project: Optional[str] = None, model_name: str = DEFAULT_MODEL):
+        if importlib.util.find_spec("langchain_google_vertexai") is None:
+            raise LLMBackendError("langchain_google_vertexai is not installed")
+
+        self.project = project or os.getenv("GOOGLE_CLOUD_PROJECT")
+        if not self.project:
+            raise LLMBackendError("GOOGLE_CLOUD_PROJECT environment variable not set")
+        self.model_name = model_name
+        self.max_retries = int(os.getenv("VERTEX_MAX_RETRIES", "0"))
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from langchain_google_vertexai import VertexAI
+                    logger.info(f"Creating Vertex AI client for model {self.model_name}")
+                    self._client = VertexAI(project=self.project, model_name=self.model_name,
+                                            max_retries=self.max_retries)
+        return self._client
+
+    @staticmethod
+    def _generation_kwargs(schema: Optional[Dict[str, Any]], max_output_tokens: Optional[int],
+                           timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Gemini JSON mode (the response is constrained to the schema instead of
+        parsed out of prose), output cap and the API request timeout
+        """
+        kwargs: Dict[str, Any] = {"max_output_tokens": max_output_tokens} if max_output_tokens else {}
+        if schema:
+            kwargs.update(response_mime_type="application/json", response_schema=schema)
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        return kwargs
+
+    def generate(self, prompt: str, timeout: Optional[float] = None, schema: Optional[Dict[str, Any]] = None,
+                 max_output_tokens: Optional[int] = None) -> str:
+        from google.api_core.exceptions import DeadlineExceeded
+
+        try:
+            return self.client.invoke(prompt, **self._generation_kwargs(schema, max_output_tokens, timeout))
+        except DeadlineExceeded as e:
+            raise LLMTimeoutError(f"LLM call timed out after {timeout}s") from e
+
+    def stream(self, prompt: str, timeout: Optional[float] = None, schema: Optional[Dict[str, Any]] = None,
+               max_output_tokens: Optional[int] = None) -> Iterator[str]:
+        from google.api_core.exceptions import DeadlineExceeded
+
+        # The timeout bounds the whole streamed response, not each chunk
+        try:
+            for chunk in self.client.stream(prompt, **self._generation_kwargs(schema, max_output_tokens, timeout)):
+                yield chunk
+        except DeadlineExceeded as e:
+            raise LLMTimeoutError(f"LLM stream timed out after {timeout}s") from e
+
+
+class HTTPBackend(LLMBackend):
+    """LLM served over HTTP, e.g. the simulator behind llm_mock's /llm endpoint"""
+    name = "http"
+
+    def __init__(self, url: Optional[str] = None, model_name: Optional[str] = None):
+        self.url = url or os.getenv("LLM_BACKEND_URL", "http://127.0.0.1:8010/llm")
+        self.model_name = model_name
+
+    def generate(self, prompt: str, timeout: Optional[float] = None, schema: Optional[Dict[str, Any]] = None,
+                 max_output_tokens: Optional[int] = None) -> str:
+        response = self._post(prompt, timeout, schema, max_output_tokens)
+        return response.json().get("text", "")
+
+    def stream(self, prompt: str, timeout: Optional[float] = None, schema: Optional[Dict[str, Any]] = None,
+               max_output_tokens: Optional[int] = None) -> Iterator[str]:
+        # Closing the generator closes the connection, which stops the generation server-side
+        with self._post(prompt, timeout, schema, max_output_tokens, stream=True) as response:
+            for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+                if chunk:
+                    yield chunk
+
+    def _post(self, prompt: str, timeout: Optional[float], schema: Optional[Dict[str, Any]],
+              max_output_tokens: Optional[int] = None, stream: bool = False):
+        import requests
+
+        body = {"prompt": prompt}
+        if self.model_name:
+            body["model"] = self.model_name
+        if schema:
+            body["response_schema"] = schema
+        if max_output_tokens:
+            body["max_output_tokens"] = max_output_tokens
+        if stream:
+            body["stream"] = True
+        try:
+            response = requests.post(self.url, json=body, timeout=timeout, stream=stream)
+        except requests.Timeout as e:
+            raise LLMTimeoutError(f"LLM call timed out after {timeout}s") from e
+        except requests.RequestException as e:
+            raise LLMBackendError(f"LLM endpoint unreachable: {str(e)}") from e
+        if response.status_code == 429:
+            raise LLMRateLimitError("LLM endpoint rate limited the request")
+        if response.status_code != 200:
+            raise LLMBackendError(f"LLM endpoint error: {response.status_code} - {response.text}")
+        return response
+
+
+class SimulatedLLMBackend(LLMBackend):
+    """
+    Local stand-in for a hosted LLM. Answers the prompts used in this repo
+    with valid JSON (see llm_mock.MockLLM) and simulates latency, generation
+    speed, a token-per-minute quota, errors, timeouts and chunked streaming.
+    Seeded, so runs with the same settings draw the same latencies and failures.
+    """
+    name = "simulator"
+    DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal")
+
+    def __init__(self, latency_ms: float = 0.0, latency_jitter_ms: float = 0.0,
+                 latency_distribution: str = "fixed", tokens_per_second: float = 0.0,
+                 tokens_per_minute: int = 0, error_rate: float = 0.0, timeout_rate: float = 0.0,
+                 chunk_tokens: int = 4, seed: Optional[int] = None,
+                 responder: Optional[Callable[[str], Any]] = None, model_name: Optional[str] = None):
+        if latency_distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency_distribution}")
+        if responder is None:
+            from llm_mock import MockLLM
+            responder = MockLLM(latency_ms=0).respond
+
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.latency_distribution = latency_distribution
+        self.tokens_per_second = tokens_per_second
+        self.tokens_per_minute = tokens_per_minute
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.responder = responder
+        # Only a label: every simulated model answers the same way
+        self.model_name = model_name
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._token_window = deque()  # (timestamp, tokens) for the per-minute quota
+
+    @classmethod
+    def from_env(cls, model_name: Optional[str] = None) -> "SimulatedLLMBackend":
+        """Settings from LLM_SIM_* variables (MOCK_LLM_LATENCY_MS is honoured for latency)"""
+        env = os.getenv
+        seed = env("LLM_SIM_SEED")
+        return cls(
+            latency_ms=float(env("LLM_SIM_LATENCY_MS", env("MOCK_LLM_LATENCY_MS", "0"))),
+            latency_jitter_ms=float(env("LLM_SIM_LATENCY_JITTER_MS", "0")),
+            latency_distribution=env("LLM_SIM_LATENCY_DISTRIBUTION", "fixed"),
+            tokens_per_second=float(env("LLM_SIM_TOKENS_PER_SECOND", "0")),
+            tokens_per_minute=int(env("LLM_SIM_TOKENS_PER_MINUTE", "0")),
+            error_rate=float(env("LLM_SIM_ERROR_RATE", "0")),
+            timeout_rate=float(env("LLM_SIM_TIMEOUT_RATE", "0")),
+            chunk_tokens=int(env("LLM_SIM_CHUNK_TOKENS", "4")),
+            seed=int(seed) if seed else None,
+            model_name=model_name,
+        )
+
+    def _draw(self):
+        """Time to first token (seconds) and the failure to inject, if any"""
+        with self._lock:
+            base, jitter = self.latency_ms, self.latency_jitter_ms
+            if self.latency_distribution == "uniform":
+                latency = self._rng.uniform(base - jitter, base + jitter)
+            elif self.latency_distribution == "normal":
+                latency = self._rng.gauss(base, jitter)
+            elif self.latency_distribution == "lognormal" and base > 0:
+                # Median `base`, sigma derived from the jitter as a fraction of it
+                latency = self._rng.lognormvariate(math.log(base), jitter / base if jitter else 0.0)
+            else:
+                latency = base
+            roll = self._rng.random()
+        if roll < self.timeout_rate:
+            failure = "timeout"
+        elif roll < self.timeout_rate + self.error_rate:
+            failure = "error"
+        else:
+            failure = None
+        return max(0.0, latency) / 1000.0, failure
+
+    def _reserve_tokens(self, tokens: int):
+        if not self.tokens_per_minute:
+            return
+        now = time.monotonic()
+        with self._lock:
+            while self._token_window and now - self._token_window[0][0] >= 60:
+                self._token_window.popleft()
+            used = sum(count for _, count in self._token_window)
+            if used + tokens > self.tokens_per_minute:
+                raise LLMRateLimitError(
+                    f"Simulated token rate limit exceeded ({used + tokens}/{self.tokens_per_minute} tokens per minute)")
+            self._token_window.append((now, tokens))
+
+    def _generation_seconds(self, tokens: int) -> float:
+        return tokens / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _render(self, prompt: str) -> str:
+        response = self.responder(prompt)
+        return response if isinstance(response, str) else json.dumps(response)
+
+    def _start(self, prompt: str, timeout: Optional[float], max_output_tokens: Optional[int] = None) -> str:
+        """Apply failures, quota and time-to-first-token; returns the response text"""
+        latency, failure = self._draw()
+        if failure == "timeout":
+            time.sleep(timeout if timeout is not None else latency)
+            raise LLMTimeoutError("Simulated LLM timeout")
+        if failure == "error":
+            time.sleep(latency)
+            raise LLMBackendError("Simulated LLM error")
+
+        text = self._render(prompt)
+        if max_output_tokens:
+            # Like a real model at its output cap, the answer is cut off wherever it got to
+            text = text[:max_output_tokens * 4]
+        self._reserve_tokens(estimate_tokens(prompt) + estimate_tokens(text))
+        if timeout is not None and latency + self._generation_seconds(estimate_tokens(text)) > timeout:
+            time.sleep(timeout)
+            raise LLMTimeoutError(f"LLM call timed out after {timeout}s")
+        time.sleep(latency)
+        return text
+
+    def generate(self, prompt: str, timeout: Optional[float] = None, schema: Optional[Dict[str, Any]] = None,
+                 max_output_tokens: Optional[int] = None) -> str:
+        # The simulated answers are JSON already, so the schema needs no enforcing
+        text = self._start(prompt, timeout, max_output_tokens)
+        time.sleep(self._generation_seconds(estimate_tokens(text)))
+        return text
+
+    def stream(self, prompt: str, timeout: Optional[float] = None, schema: Optional[Dict[str, Any]] = None,
+               max_output_tokens: Optional[int] = None) -> Iterator[str]:
+        text = self._start(prompt, timeout, max_output_tokens)
+        size = self.chunk_tokens * 4
+        for i in range(0, len(text), size):
+            chunk = text[i:i + size]
+            time.sleep(self._generation_seconds(estimate_tokens(chunk)))
+            yield chunk
+
+
+class CascadeTier:
+    """One model in a cascade, with the confidence its answers need to be accepted"""
+    def __init__(self, name: str, backend: LLMBackend, min_confidence: float = 0.0,
+                 cost_per_1k_tokens: float = 0.0, timeout: Optional[float] = None):
+        self.name = name
+        self.backend = backend
+        self.min_confidence = min_confidence
+        self.cost_per_1k_tokens = cost_per_1k_tokens
+        # Upper bound for this tier's calls, so a slow cheap model cannot eat the budget
+        self.timeout = timeout
+
+
+class CascadeBackend(LLMBackend):
+    """
+    Model-tier cascade: a fast, cheap model answers first and the call moves
+    to the next tier only when the answer fails the caller's `validate`
+    check, is not a JSON object, reports a "confidence" below the tier's
+    `min_confidence`, or the call errors. The last tier's answer is always
+    returned. Latency, tokens, estimated cost and escalations are recorded
+    per tier.
+    """
+    name = "cascade"
+
+    def __init__(self, tiers: List[CascadeTier]):
+        if not tiers:
+            raise LLMBackendError("A model cascade needs at least one tier")
+        self.tiers = tiers
+
+    def __call__(self, prompt: str, timeout: Optional[float] = None,
+                 validate: Optional[Callable[[str], bool]] = None,
+                 schema: Optional[Dict[str, Any]] = None,
+                 stop_when: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                 max_output_tokens: Optional[int] = None) -> str:
+        return self.generate(prompt, timeout=timeout, schema=schema, validate=validate, stop_when=stop_when,
+                             max_output_tokens=max_output_tokens)
+
+    def complete(self, prompt: str, timeout: Optional[float] = None, schema: Optional[Dict[str, Any]] = None,
+                 stop_when: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                 max_output_tokens: Optional[int] = None) -> str:
+        return self.generate(prompt, timeout=timeout, schema=schema, stop_when=stop_when,
+                             max_output_tokens=max_output_tokens)
+
+    def generate(self, prompt: str, timeout: Optional[float] = None, schema: Optional[Dict[str, Any]] = None,
+                 validate: Optional[Callable[[str], bool]] = None,
+                 stop_when: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                 max_output_tokens: Optional[int] = None) -> str:
+        for tier in self.tiers[:-1]:
+            try:
+                text = self._call_tier(tier, prompt, timeout, schema, stop_when, max_output_tokens)
+            except LLMOverloadedError:
+                # Out of quota: a bigger model would only queue for the same quota
+                LLM_TIER_CALLS_TOTAL.inc(tier=tier.name, outcome="error")
+                raise
+            except LLMBackendError as e:
+                logger.warning(f"LLM tier {tier.name} failed, escalating: {str(e)}")
+                LLM_TIER_CALLS_TOTAL.inc(tier=tier.name, outcome="error")
+                continue
+            outcome = self._judge(tier, text, validate)
+            LLM_TIER_CALLS_TOTAL.inc(tier=tier.name, outcome=outcome)
+            if outcome == "accepted":
+                return text
+            logger.info(f"LLM tier {tier.name} answer rejected ({outcome}), escalating")
+
+        tier = self.tiers[-1]
+        text = self._call_tier(tier, prompt, timeout, schema, stop_when, max_output_tokens)
+        LLM_TIER_CALLS_TOTAL.inc(tier=tier.name, outcome="accepted")
+        return text
+
+    def stream(self, prompt: str, timeout: Optional[float] = None, schema: Optional[Dict[str, Any]] = None,
+               max_output_tokens: Optional[int] = None) -> Iterator[str]:
+        # A streamed answer cannot be judged before it is shown, so it comes from the last tier
+        yield from self.tiers[-1].backend.stream(prompt, timeout=timeout, schema=schema,
+                                                 max_output_tokens=max_output_tokens)
+
+    def _call_tier(self, tier: CascadeTier, prompt: str, timeout: Optional[float],
+                   schema: Optional[Dict[str, Any]] = None,
+                   stop_when: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                   max_output_tokens: Optional[int] = None) -> str:
+        caps = [t for t in (timeout, tier.timeout) if t is not None]
+        # Escalations re-check the request deadline: the previous tier used some of it
+        tier_timeout = timeout_for(min(caps) if caps else None, stage="llm")
+        start = time.perf_counter()
+        try:
+            text = tier.backend.complete(prompt, timeout=tier_timeout, schema=schema, stop_when=stop_when,
+                                         max_output_tokens=max_output_tokens)
+        finally:
+            LLM_TIER_SECONDS.observe(time.perf_counter() - start, tier=tier.name)
+        tokens_in, tokens_out = estimate_tokens(prompt), estimate_tokens(text)
+        LLM_TIER_TOKENS_TOTAL.inc(tokens_in, tier=tier.name, direction="input")
+        LLM_TIER_TOKENS_TOTAL.inc(tokens_out, tier=tier.name, direction="output")
+        if tier.cost_per_1k_tokens:
+            LLM_TIER_COST_TOTAL.inc((tokens_in + tokens_out) / 1000.0 * tier.cost_per_1k_tokens, tier=tier.name)
+        return text
+
+    def _judge(self, tier: CascadeTier, text: str, validate: Optional[Callable[[str], bool]]) -> str:
+        if validate is not None:
+            try:
+                valid = validate(text)
+            except Exception:
+                valid = False
+            if not valid:
+                return "invalid"
+        parsed = parse_json_object(text)
+        if parsed is None:
+            return "invalid"
+        confidence = parsed.get("confidence")
+        if isinstance(confidence, (int, float)) and confidence < tier.min_confidence:
+            return "low_confidence"
+        return "accepted"
+
+
+# Backend name -> factory; register_backend adds more. Factories take an
+# optional model_name, set when a cascade tier names the model to use.
+BACKENDS: Dict[str, Callable[..., LLMBackend]] = {
+    "vertex": VertexAIBackend,
+    "http": HTTPBackend,
+    "simulator": SimulatedLLMBackend.from_env,
+}
+
+
+def register_backend(name: str, factory: Callable[..., LLMBackend]):
+    BACKENDS[name] = factory
+
+
+def parse_cascade(spec: Optional[str], costs: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    "flash-lite=0.8,pro" and "flash-lite=0.0001,pro=0.00125" ->
+    [{"model", "min_confidence", "cost_per_1k_tokens"}, ...] in tier order
+    """
+    cost_by_model = {}
+    for entry in (costs or "").split(","):
+        if "=" in entry:
+            model, cost = entry.split("=", 1)
+            cost_by_model[model.strip()] = float(cost)
+    tiers = []
+    for entry in (spec or "").split(","):
+        model, _, threshold = entry.partition("=")
+        if model.strip():
+            tiers.append({
+                "model": model.strip(),
+                "min_confidence": float(threshold) if threshold else 0.0,
+                "cost_per_1k_tokens": cost_by_model.get(model.strip(), 0.0),
+            })
+    return tiers
+
+
+def cascade_config() -> List[Dict[str, Any]]:
+    """
+    Model tiers from LLM_CASCADE_FILE (JSON {"tiers": [...]}), else
+    LLM_CASCADE with LLM_CASCADE_COSTS, else DEFAULT_CASCADE.
+    LLM_CASCADE=off uses DEFAULT_MODEL alone.
+    """
+    path = os.getenv("LLM_CASCADE_FILE")
+    if path:
+        with open(path) as f:
+            return json.load(f).get("tiers", [])
+    spec = os.getenv("LLM_CASCADE", DEFAULT_CASCADE)
+    if spec.strip().lower() in ("", "off", "none", "false"):
+        return []
+    return parse_cascade(spec, os.getenv("LLM_CASCADE_COSTS"))
+
+
+def _create_backend(name: str, model_name: Optional[str] = None) -> LLMBackend:
+    factory = BACKENDS.get(name)
+    if factory is None:
+        raise LLMBackendError(f"Unknown LLM backend '{name}' (available: {', '.join(BACKENDS)})")
+    from services.llm_gateway import GatedBackend, shared_gateway
+
+    backend = factory(model_name=model_name) if model_name else factory()
+    # Every model call in the process shares one quota and priority queue
+    return GatedBackend(backend, shared_gateway())
+
+
+def backend_name() -> str:
+    """Configured backend: LLM_BACKEND, or the simulator when MOCK_LLM is set"""
+    from llm_mock import mock_llm_enabled
+
+    name = os.getenv("LLM_BACKEND")
+    if name:
+        return name.lower()
+    return "simulator" if mock_llm_enabled() else "vertex"
+
+
+def get_llm_backend(name: Optional[str] = None, tiers: Optional[List[Dict[str, Any]]] = None) -> LLMBackend:
+    """
+    Create the named (or configured) backend, as a model cascade when more
+    than one tier is configured; raises LLMBackendError if it is unavailable
+    """
+    name = name or backend_name()
+    tiers = cascade_config() if tiers is None else tiers
+    if len(tiers) <= 1:
+        backend = _create_backend(name, tiers[0]["model"] if tiers else None)
+        logger.info(f"Using LLM backend: {name}")
+        return backend
+
+    backend = CascadeBackend([
+        CascadeTier(
+            tier.get("name") or tier["model"],
+            _create_backend(name, tier["model"]),
+            min_confidence=float(tier.get("min_confidence", 0.0)),
+            cost_per_1k_tokens=float(tier.get("cost_per_1k_tokens", 0.0)),
+            timeout=tier.get("timeout_seconds"),
+        )
+        for tier in tiers
+    ])
+    logger.info(f"Using LLM backend: {name}, cascade {' -> '.join(t.name for t in backend.tiers)}")
+    return backend
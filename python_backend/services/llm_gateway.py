@@ -0,0 +1,266 @@
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import heapq
+import itertools
+import os
+import threading
+import time
+import logging
+from common.metrics import REGISTRY
+from common.priority import PRIORITIES, current_priority, normalize_priority
+from services.llm_backends import LLMBackend, LLMOverloadedError, estimate_tokens
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+GATEWAY_REQUESTS_TOTAL = REGISTRY.counter(
+    "llm_gateway_requests_total",
+    "LLM calls at the gateway by priority and outcome (admitted, shed, timed_out)",
+    ("priority", "outcome"))
+GATEWAY_QUEUE_SECONDS = REGISTRY.histogram(
+    "llm_gateway_queue_seconds",
+    "Time LLM calls waited at the gateway for request and token quota",
+    ("priority",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+GATEWAY_QUEUE_DEPTH = REGISTRY.gauge(
+    "llm_gateway_queue_depth", "LLM calls waiting at the gateway", ("priority",))
+
+
+class TokenBucket:
+    """
+    Refills at `per_minute / 60` units a second up to `burst_seconds` worth.
+    An amount larger than the bucket is let through once it is full and
+    leaves it in debt, so one oversized prompt cannot block forever. Not
+    thread-safe: the gateway holds its lock around every use.
+    """
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def available(self) -> float:
+        self._refill()
+        return self.level
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken; 0 when it can be now"""
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+    def adjust(self, amount: float):
+        """Charge (positive) or refund (negative) the difference once real usage is known"""
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+
+class _Waiter:
+    __slots__ = ("rank", "seq", "priority", "tokens")
+
+    def __init__(self, rank: int, seq: int, priority: str, tokens: int):
+        self.rank = rank
+        self.seq = seq
+        self.priority = priority
+        self.tokens = tokens
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.rank, self.seq) < (other.rank, other.seq)
+
+
+class LLMGateway:
+    """
+    Admission control shared by every LLM call in the process. Calls wait
+    in a priority queue (the plan task's priority, then arrival order)
+    until the request and token buckets, sized to the provider quota, have
+    room for them. Calls of a sheddable priority are refused straight away
+    when their estimated wait exceeds `shed_wait`, and any call is refused
+    when `max_queue` calls are already waiting, so quota pressure degrades
+    low-priority answers first instead of turning into provider errors.
+
+    Without a requests or tokens limit the gateway admits everything.
+    """
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 burst_seconds: float = 10.0, max_queue: int = 256,
+                 shed_priorities: Iterable[str] = ("low",), shed_wait: float = 1.0,
+                 expected_output_tokens: int = 256):
+        self.requests = TokenBucket(requests_per_minute, burst_seconds) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds) if tokens_per_minute > 0 else None
+        self.max_queue = max_queue
+        self.shed_priorities = {p.strip().lower() for p in shed_priorities} & set(PRIORITIES)
+        self.shed_wait = shed_wait
+        # Output tokens reserved per uncapped call until the answer shows how many it used
+        self.expected_output_tokens = expected_output_tokens
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_env(cls) -> "LLMGateway":
+        """Quota from LLM_GATEWAY_* variables; RPM and TPM of 0 (the default) mean unlimited"""
+        env = os.getenv
+        return cls(
+            requests_per_minute=float(env("LLM_GATEWAY_RPM", "0")),
+            tokens_per_minute=float(env("LLM_GATEWAY_TPM", "0")),
+            burst_seconds=float(env("LLM_GATEWAY_BURST_SECONDS", "10")),
+            max_queue=int(env("LLM_GATEWAY_MAX_QUEUE", "256")),
+            shed_priorities=env("LLM_GATEWAY_SHED_PRIORITIES", "low").split(","),
+            shed_wait=float(env("LLM_GATEWAY_SHED_WAIT_MS", "1000")) / 1000.0,
+            expected_output_tokens=int(env("LLM_GATEWAY_OUTPUT_TOKENS", "256")),
+        )
+
+    @property
+    def limited(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def admit(self, prompt: str, timeout: Optional[float] = None, priority: Optional[str] = None,
+              max_output_tokens: Optional[int] = None) -> "Admission":
+        """
+        Block until the call may go to the model, for at most `timeout`
+        seconds. Raises LLMOverloadedError when the call is shed or its
+        timeout runs out in the queue.
+        """
+        priority = normalize_priority(priority or current_priority())
+        tokens = estimate_tokens(prompt) + (max_output_tokens or self.expected_output_tokens)
+        if not self.limited:
+            GATEWAY_REQUESTS_TOTAL.inc(priority=priority, outcome="admitted")
+            return Admission(self, tokens, 0.0, timeout)
+
+        start = time.monotonic()
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                GATEWAY_REQUESTS_TOTAL.inc(priority=priority, outcome="shed")
+                raise LLMOverloadedError(f"LLM gateway queue is full ({self.max_queue} waiting)")
+            if priority in self.shed_priorities and self._estimated_wait(PRIORITIES.index(priority), tokens) > self.shed_wait:
+                GATEWAY_REQUESTS_TOTAL.inc(priority=priority, outcome="shed")
+                raise LLMOverloadedError(f"LLM quota exhausted, {priority}-priority call shed")
+
+            waiter = _Waiter(PRIORITIES.index(priority), next(self._seq), priority, tokens)
+            heapq.heappush(self._queue, waiter)
+            GATEWAY_QUEUE_DEPTH.inc(priority=priority)
+            try:
+                while True:
+                    wait = None
+                    if self._queue[0] is waiter:
+                        wait = self._wait_time(tokens)
+                        if wait <= 0:
+                            heapq.heappop(self._queue)
+                            self._take(tokens)
+                            break
+                    if timeout is not None:
+                        remaining = timeout - (time.monotonic() - start)
+                        if remaining <= 0:
+                            self._queue.remove(waiter)
+                            heapq.heapify(self._queue)
+                            GATEWAY_REQUESTS_TOTAL.inc(priority=priority, outcome="timed_out")
+                            raise LLMOverloadedError(f"LLM call waited {timeout:.3f}s for quota")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self._cond.wait(wait)
+            finally:
+                GATEWAY_QUEUE_DEPTH.dec(priority=priority)
+                # The next waiter may now be at the head
+                self._cond.notify_all()
+
+        waited = time.monotonic() - start
+        GATEWAY_QUEUE_SECONDS.observe(waited, priority=priority)
+        GATEWAY_REQUESTS_TOTAL.inc(priority=priority, outcome="admitted")
+        return Admission(self, tokens, waited, timeout)
+
+    def settle(self, reserved: int, used: int):
+        """Correct the token bucket once the call's real token use is known"""
+        if self.tokens is None or used == reserved:
+            return
+        with self._cond:
+            self.tokens.adjust(used - reserved)
+            self._cond.notify_all()
+
+    def _wait_time(self, tokens: int) -> float:
+        waits = [self.requests.wait_time(1)] if self.requests is not None else []
+        if self.tokens is not None:
+            waits.append(self.tokens.wait_time(tokens))
+        return max(waits)
+
+    def _take(self, tokens: int):
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+
+    def _estimated_wait(self, rank: int, tokens: int) -> float:
+        """Seconds until a new call of `rank` would be admitted, given the calls queued ahead of it"""
+        ahead = [w for w in self._queue if w.rank <= rank]
+        waits = []
+        if self.requests is not None:
+            waits.append((len(ahead) + 1 - self.requests.available()) / self.requests.rate)
+        if self.tokens is not None:
+            demand = sum(w.tokens for w in ahead) + tokens
+            waits.append((demand - self.tokens.available()) / self.tokens.rate)
+        return max(waits)
+
+
+class Admission:
+    """A call let through the gateway: the timeout it has left and its token reservation"""
+    def __init__(self, gateway: LLMGateway, reserved: int, waited: float, timeout: Optional[float]):
+        self.gateway = gateway
+        self.reserved = reserved
+        self.waited = waited
+        self.timeout = max(0.0, timeout - waited) if timeout is not None else None
+
+    def settle(self, prompt: str, text: str):
+        self.gateway.settle(self.reserved, estimate_tokens(prompt) + estimate_tokens(text))
+
+
+class GatedBackend(LLMBackend):
+    """Backend whose calls are admitted by an LLMGateway first; the queue time comes out of the timeout"""
+    def __init__(self, backend: LLMBackend, gateway: LLMGateway):
+        self.backend = backend
+        self.gateway = gateway
+        self.name = backend.name
+
+    def generate(self, prompt: str, timeout: Optional[float] = None, schema: Optional[Dict[str, Any]] = None,
+                 max_output_tokens: Optional[int] = None) -> str:
+        admission = self.gateway.admit(prompt, timeout, max_output_tokens=max_output_tokens)
+        text = ""
+        try:
+            text = self.backend.generate(prompt, timeout=admission.timeout, schema=schema,
+                                         max_output_tokens=max_output_tokens)
+            return text
+        finally:
+            admission.settle(prompt, text)
+
+    def stream(self, prompt: str, timeout: Optional[float] = None, schema: Optional[Dict[str, Any]] = None,
+               max_output_tokens: Optional[int] = None) -> Iterator[str]:
+        admission = self.gateway.admit(prompt, timeout, max_output_tokens=max_output_tokens)
+        chunks = []
+        try:
+            for chunk in self.backend.stream(prompt, timeout=admission.timeout, schema=schema,
+                                             max_output_tokens=max_output_tokens):
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            # A stream stopped early is charged only for what it generated
+            admission.settle(prompt, "".join(chunks))
+
+
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def shared_gateway() -> LLMGateway:
+    """The process-wide gateway, created from the environment on first use"""
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = LLMGateway.from_env()
+            if _gateway.limited:
+                logger.info(f"LLM gateway limits: {os.getenv('LLM_GATEWAY_RPM', '0')} requests/min, "
+                            f"{os.getenv('LLM_GATEWAY_TPM', '0')} tokens/min")
+        return _gateway
@@ -1,11 +1,22 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 import os
+import re
 import json
+import hashlib
 from datetime import datetime
 from dotenv import load_dotenv
-from langchain_google_vertexai import VertexAI
 from pydantic import BaseModel, Field
 import logging
+from common.deadline import DeadlineExceeded, timeout_for
+from common.metrics import track_outbound
+from common.micro_batch import MicroBatcher
+from common.near_duplicate import NearDuplicateIndex
+from common.priority import PRIORITIES, current_priority, priority_scope
+from common.ttl_cache import TTLCache
+from services.llm_backends import LLMBackendError, backend_name, get_llm_backend
+from services.prompt_templates import TEMPLATES, PromptTemplate
+from services.structured_output import StructuredOutputError, parse_json_object, request_structured
+from sub_agents.domain_logic import SEVERITY_TERMS, DomainLogic
 
 # Load environment variables
 load_dotenv()
@@ -13,6 +24,138 @@ load_dotenv()
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Keywords that mark a prompt as a patient journey query without an LLM call
+JOURNEY_KEYWORDS = ['history', 'journey', 'timeline', 'past', 'appointment', 'treatment', 'medication', 'visit', 'result', 'record', 'medical history', 'health journey']
+
+# Patient ID patterns, most specific first (compiled once at import)
+PATIENT_ID_PATTERNS = [
+    re.compile(r'patient\s+(?:id:?\s*)?([a-z]{0,3}\d+)', re.IGNORECASE),  # "patient pat1" or "patient id: pat1"
+    re.compile(r'for\s+(?:patient\s+)?([a-z]{0,3}\d+)', re.IGNORECASE),   # "for pat1"
+    re.compile(r'id:\s*([a-z]{0,3}\d+)', re.IGNORECASE),                  # "id: pat1"
+    re.compile(r'([a-z]{0,3}\d+)(?:\s|$)', re.IGNORECASE),                # standalone "pat1" followed by space or end
+    re.compile(r'\b([a-z]{0,3}\d{1,})\b', re.IGNORECASE),                 # word boundary with at least 1 digit
+]
+# Only the explicit forms are trusted once the LLM has classified the intent
+EXPLICIT_PATIENT_ID_PATTERNS = PATIENT_ID_PATTERNS[:3]
+
+PATIENT_ID_FORMAT = re.compile(r'^[a-z]{0,3}\d{1,}$')
+PATIENT_ID_PREFIX = re.compile(r'^[a-z]{1,3}\d*$')
+
+# Short words that look like ID prefixes but are ordinary English
+NON_ID_WORDS = {'the', 'and', 'for', 'my', 'show', 'get', 'is', 'are', 'was', 'been', 'have', 'has', 'do', 'does', 'did', 'will', 'can', 'could', 'should', 'would', 'may', 'might', 'must', 'of', 'in', 'on', 'at', 'to', 'by', 'or', 'as', 'with', 'from', 'about', 'history', 'medical', 'patient', 'journey', 'timeline', 'past', 'appointment', 'treatment', 'medication', 'visit', 'result', 'record', 'me', 'you', 'he', 'she', 'we', 'it'}
+
+
+INTENTS = ("patient_journey", "medical_diagnosis")
+# Workflow each intent routes a prompt to (see generate_mcp_acl)
+INTENT_WORKFLOWS = {"patient_journey": "patient_journey_tracking", "medical_diagnosis": "medical_diagnosis"}
+# Response schema for the prompt_analysis template; intent comes first so it can be read mid-stream
+STRING_LIST = {"type": "array", "items": {"type": "string"}}
+PROMPT_ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "intent": {"type": "string", "enum": list(INTENTS)},
+        "confidence": {"type": "number"},
+        "explicit_symptoms": STRING_LIST,
+        "implicit_symptoms": STRING_LIST,
+        "severity_indicators": STRING_LIST,
+        "duration_mentions": STRING_LIST,
+    },
+    "required": ["intent"],
+}
+
+
+# Batch items carry the 1-based number of the message they answer, so answers map back to prompts
+PROMPT_ANALYSIS_BATCH_ITEM_SCHEMA = {
+    "type": "object",
+    "properties": {"index": {"type": "integer"}, **PROMPT_ANALYSIS_SCHEMA["properties"]},
+    "required": ["index", "intent"],
+}
+PROMPT_ANALYSIS_BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {"analyses": {"type": "array", "items": PROMPT_ANALYSIS_BATCH_ITEM_SCHEMA}},
+    "required": ["analyses"],
+}
+
+
+def journey_decided(fields: Dict[str, Any]) -> bool:
+    """A journey query needs no symptoms, so its analysis can stop once intent and confidence are in"""
+    return fields.get("intent") == "patient_journey" and "confidence" in fields
+
+
+def usable_prompt_analysis(analysis: Any) -> bool:
+    """A known intent, a symptom list and a numeric (or missing) confidence"""
+    if (not isinstance(analysis, dict) or analysis.get("intent") not in INTENTS
+            or not isinstance(analysis.get("explicit_symptoms", []), list)):
+        return False
+    try:
+        float(analysis.get("confidence") or 0.5)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def valid_prompt_analysis(response: str) -> bool:
+    """Check a cheap model's answer must pass before it is used (see usable_prompt_analysis)"""
+    return usable_prompt_analysis(parse_json_object(response))
+
+
+def prompt_analysis_key(text: str, template: PromptTemplate) -> str:
+    """Cache key of an analysis: the normalized text under the template version that produced it"""
+    normalized = " ".join(text.lower().split())
+    return f"{template.key}:{hashlib.sha256(normalized.encode('utf-8')).hexdigest()}"
+
+
+def _string_list(value: Any) -> List[str]:
+    if not isinstance(value, list):
+        return []
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def extract_patient_id(raw_text: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Extracts a patient ID from a journey query.
+    Returns (patient_id, mentioned_patient) where mentioned_patient is an
+    incomplete ID-like word (e.g. "pat") used when no full ID is found.
+    """
+    text = raw_text.strip()
+    for pattern in PATIENT_ID_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            extracted = match.group(1).lower()
+            # Validate it looks like a patient ID (starts with letters, ends with digits, minimum 1 digit)
+            if PATIENT_ID_FORMAT.match(extracted):
+                return extracted, None
+
+    # Search from end of string backwards to find potential patient identifiers
+    for word in reversed(text.split()):
+        word_lower = word.lower().strip('.,!?;:')
+        # Check if word looks like patient ID prefix (1-3 letters, optional digits)
+        if PATIENT_ID_PREFIX.match(word_lower) and len(word_lower) <= 3 and word_lower not in NON_ID_WORDS:
+            return None, word_lower
+    return None, None
+
+
+def extract_explicit_patient_id(raw_text: str) -> Optional[str]:
+    """Extracts a patient ID only when it is written explicitly ("patient pat1", "id: pat1")"""
+    for pattern in EXPLICIT_PATIENT_ID_PATTERNS:
+        match = pattern.search(raw_text)
+        if match:
+            return match.group(1)
+    return None
+
+
+def semantic_context(analysis: Dict[str, Any]) -> Dict[str, Any]:
+    """MCP/ACL semantic_context (see InputHandler.SemanticContext) from a prompt analysis"""
+    durations = analysis.get("duration_mentions", [])
+    return {
+        "intent": analysis.get("intent", "medical_diagnosis"),
+        "identified_concepts": analysis.get("explicit_symptoms", []) + analysis.get("implicit_symptoms", []),
+        "confidence": analysis.get("confidence", 0.5),
+        "temporal_context": {"duration_mentions": durations} if durations else None,
+        "severity_indicators": analysis.get("severity_indicators", []),
+    }
+
+
 class MCPACLAction(BaseModel):
     agent: str
     action: str
@@ -31,68 +174,162 @@ class MCPACL(BaseModel):
 
 class LLMService:
     def __init__(self):
+        # Reason the backend is unavailable, surfaced by callers instead of a bare None
+        self.llm_error = None
+        # Upper bound per LLM call; the request deadline shortens it further
+        self.timeout = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+        # Combined intent + symptom analyses, so routing and symptom extraction share one call
+        self.analysis_cache = TTLCache("prompt_analysis", float(os.getenv("PROMPT_ANALYSIS_CACHE_SECONDS", "300")),
+                                       int(os.getenv("PROMPT_ANALYSIS_CACHE_MAX_ENTRIES", "1024")))
+        # Analyses reused for prompts that differ only trivially ("i've got a fever & a cough")
+        self.near_duplicates = None
+        near_duplicate_ttl = float(os.getenv("PROMPT_NEAR_DUPLICATE_CACHE_SECONDS", "300"))
+        if near_duplicate_ttl > 0:
+            self.near_duplicates = NearDuplicateIndex(
+                "prompt_analysis_near_duplicate",
+                threshold=float(os.getenv("PROMPT_NEAR_DUPLICATE_THRESHOLD", "0.9")),
+                ttl=near_duplicate_ttl,
+                max_entries=int(os.getenv("PROMPT_NEAR_DUPLICATE_MAX_ENTRIES", "2048")),
+                # Prompts naming different symptoms or severities never share an analysis
+                guard_terms=list(DomainLogic().known_symptoms()) + SEVERITY_TERMS)
+        self.near_duplicate_disabled_workflows = {
+            workflow.strip() for workflow in os.getenv("PROMPT_NEAR_DUPLICATE_DISABLED_WORKFLOWS", "").split(",")
+            if workflow.strip()}
         try:
-            project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
-            if not project_id:
-                raise ValueError("GOOGLE_CLOUD_PROJECT environment variable not set")
-                
-            self.llm = VertexAI(
-                project=project_id,
-                model_name="gemini-2.5-pro"
-            )
-            # Define patterns for different query types
-            self.journey_patterns = [
-                "medication history", "medical history",
-                "last visit", "next appointment",
-                "doctor visits", "hospital", "treatment",
-                "prescription", "diagnosis"
-            ]
-            logger.info("LLM service initialized successfully")
+            self.llm = get_llm_backend()
         except Exception as e:
-            logger.error(f"Error initializing LLM service: {str(e)}")
             self.llm = None
+            self.llm_error = str(e)
+            logger.warning(
+                f"LLM backend '{backend_name()}' unavailable: {self.llm_error}. "
+                "LLM features are disabled; set LLM_BACKEND=simulator to run without Vertex AI")
+        # Define patterns for different query types
+        self.journey_patterns = [
+            "medication history", "medical history",
+            "last visit", "next appointment",
+            "doctor visits", "hospital", "treatment",
+            "prescription", "diagnosis"
+        ]
+        # Optional micro-batching of concurrent analyses into one multi-message call
+        self.batcher = None
+        batch_window_ms = float(os.getenv("PROMPT_ANALYSIS_BATCH_WINDOW_MS", "0"))
+        if batch_window_ms > 0:
+            self.batcher = MicroBatcher("prompt_analysis", self._analyze_batch, batch_window_ms / 1000.0,
+                                        int(os.getenv("PROMPT_ANALYSIS_BATCH_SIZE", "8")))
+        if self.llm:
+            logger.info("LLM service initialized successfully")
+
+    def analyze_prompt(self, text: str, workflow: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Intent, symptoms, severity words and durations for a prompt from a
+        single LLM call. Cached per normalized text, so routing a prompt and
+        extracting its symptoms cost one round trip between them; a
+        near-duplicate of a recent prompt reuses that prompt's analysis
+        unless `workflow` (the requested one) or the workflow the analysis
+        routes to is in PROMPT_NEAR_DUPLICATE_DISABLED_WORKFLOWS.
+        """
+        template = TEMPLATES.get("prompt_analysis")
+        key = prompt_analysis_key(text, template)
+        cached = self.analysis_cache.get(key)
+        if cached is not None:
+            return cached
+        if self.near_duplicates is not None and workflow not in self.near_duplicate_disabled_workflows:
+            similar = self.near_duplicates.get(text, scope=template.key, accept=self._near_duplicate_allowed)
+            if similar is not None:
+                logger.info(f"Prompt analysis reused from a near-duplicate prompt: {similar}")
+                return similar
+
+        prompt = template.render(text=text)
+        try:
+            parsed = None
+            if self.batcher is not None:
+                # None when the batched answer had nothing usable for this prompt
+                try:
+                    parsed = self.batcher.submit((text, current_priority()),
+                                                 timeout=timeout_for(self.timeout, stage="llm"))
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Batched prompt analysis failed, analysing the prompt alone: {str(e)}")
+            if parsed is None:
+                with track_outbound("llm", "prompt_analysis"):
+                    parsed = request_structured(
+                        template.bind(self.llm), prompt, PROMPT_ANALYSIS_SCHEMA, "prompt_analysis",
+                        timeout=self.timeout, validate=valid_prompt_analysis, stop_when=journey_decided)
+            logger.info(f"LLM prompt analysis: {parsed}")
+        except StructuredOutputError as e:
+            logger.error(f"Unusable prompt analysis, defaulting to medical_diagnosis: {str(e)}")
+            return {"intent": "medical_diagnosis"}
+        except Exception as e:
+            logger.error(f"LLM call error: {str(e)}, defaulting to medical_diagnosis")
+            return {"intent": "medical_diagnosis"}
+
+        analysis = {
+            "intent": parsed.get("intent") if parsed.get("intent") in INTENTS else "medical_diagnosis",
+            "confidence": float(parsed.get("confidence") or 0.5),
+            "explicit_symptoms": _string_list(parsed.get("explicit_symptoms")),
+            "implicit_symptoms": _string_list(parsed.get("implicit_symptoms")),
+            "severity_indicators": _string_list(parsed.get("severity_indicators")),
+            "duration_mentions": _string_list(parsed.get("duration_mentions")),
+        }
+        self.analysis_cache.put(key, analysis)
+        if self.near_duplicates is not None:
+            self.near_duplicates.put(text, analysis, scope=template.key)
+        return analysis
+
+    def _near_duplicate_allowed(self, analysis: Dict[str, Any]) -> bool:
+        return INTENT_WORKFLOWS.get(analysis.get("intent")) not in self.near_duplicate_disabled_workflows
+
+    def _analyze_batch(self, items: List[Tuple[str, str]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Raw analyses for several prompts from one LLM call, in item order.
+        An item comes back None when the answer did not cover it; its caller
+        then makes the single call. Every item comes back None when the call
+        fails or the answer cannot be mapped to the prompts reliably (an
+        entry per message, each with its own number). A lone item goes
+        straight to the single call, which can stop streaming early.
+        """
+        texts = list(dict.fromkeys(text for text, _ in items))
+        if len(texts) == 1:
+            return [None] * len(items)
+
+        template = TEMPLATES.get("prompt_analysis_batch")
+        prompt = template.render(messages="\n".join(f"{i}. {json.dumps(text)}" for i, text in enumerate(texts, 1)))
+        # The batch is as urgent as its most urgent member
+        priority = min((priority for _, priority in items), key=PRIORITIES.index)
+        try:
+            with priority_scope(priority), track_outbound("llm", "prompt_analysis_batch"):
+                answer = template.bind(self.llm)(
+                    prompt, timeout=timeout_for(self.timeout, stage="llm"), schema=PROMPT_ANALYSIS_BATCH_SCHEMA,
+                    max_output_tokens=template.max_output_tokens * len(texts))
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logger.warning(f"Batched prompt analysis failed, analysing {len(texts)} prompts alone: {str(e)}")
+            return [None] * len(items)
+
+        parsed = parse_json_object(answer) or {}
+        analyses = parsed.get("analyses") if isinstance(parsed.get("analyses"), list) else []
+        indices = [analysis.get("index") if isinstance(analysis, dict) else None for analysis in analyses]
+        if (len(analyses) != len(texts)
+                or sorted(index for index in indices if type(index) is int) != list(range(1, len(texts) + 1))):
+            # A dropped, repeated or renumbered entry would hand one prompt another's analysis
+            logger.warning(f"Batched prompt analysis numbered its {len(analyses)} answers {indices} "
+                           f"for {len(texts)} prompts; analysing them alone")
+            return [None] * len(items)
+        # Held to the same checks as a single answer; a bad item falls back to its own call
+        by_index = {analysis["index"]: analysis for analysis in analyses if usable_prompt_analysis(analysis)}
+        by_text = {text: by_index.get(i) for i, text in enumerate(texts, 1)}
+        return [by_text[text] for text, _ in items]
 
     def get_structured_symptoms(self, text: str) -> List[str]:
         """Extract structured symptoms from text using semantic understanding"""
         try:
             if not self.llm:
                 return []
-
-            prompt = f"""Analyze this text for medical symptoms and related health information. Consider both explicit and implicit symptoms.
-
-Text: "{text}"
-
-Provide your analysis in this exact JSON format:
-{{
-    "explicit_symptoms": ["symptom1", "symptom2"],
-    "implicit_symptoms": ["inferred_symptom1"],
-    "duration_mentions": ["started 2 days ago", "occurs daily"],
-    "severity_indicators": ["mild", "severe", etc],
-    "contextual_health_info": ["relevant medical history", "medications", etc]
-}}
-
-Focus on medical accuracy and completeness."""
-
-            response = self.llm(prompt)
-            try:
-                # Extract JSON from response
-                start_idx = response.find('{')
-                end_idx = response.rfind('}') + 1
-                if start_idx != -1 and end_idx != -1:
-                    analysis = json.loads(response[start_idx:end_idx])
-                    
-                    # Combine explicit and implicit symptoms
-                    all_symptoms = (
-                        analysis.get("explicit_symptoms", []) +
-                        analysis.get("implicit_symptoms", [])
-                    )
-                    return [s for s in all_symptoms if s.strip()]
-                else:
-                    logger.warning("No valid JSON found in symptom analysis response")
-                    return []
-            except json.JSONDecodeError as e:
-                logger.error(f"Error parsing symptom analysis: {str(e)}")
-                return []
+            analysis = self.analyze_prompt(text)
+            # Combine explicit and implicit symptoms
+            return analysis.get("explicit_symptoms", []) + analysis.get("implicit_symptoms", [])
         except Exception as e:
             logger.error(f"Error extracting symptoms: {str(e)}")
             return []
@@ -106,52 +343,20 @@ Focus on medical accuracy and completeness."""
             user_id = enriched_context.get('user_id')
             
             if not self.llm:
-                raise ValueError("LLM service not initialized")
+                raise ValueError(f"LLM service not initialized: {self.llm_error}")
 
             # First, check for explicit patient_journey keywords without LLM call
-            journey_keywords = ['history', 'journey', 'timeline', 'past', 'appointment', 'treatment', 'medication', 'visit', 'result', 'record', 'medical history', 'health journey']
-            is_journey_query = any(keyword in raw_text.lower() for keyword in journey_keywords)
+            is_journey_query = any(keyword in raw_text.lower() for keyword in JOURNEY_KEYWORDS)
             
             # If clearly a journey query, skip LLM and go directly
             if is_journey_query:
                 logger.info("Direct patient_journey detection (no LLM needed)")
                 # Extract patient_id from query
-                import re
-                patient_id = None
-                mentioned_patient = None  # Track if user mentioned any patient-like string
-                
-                patterns = [
-                    r'patient\s+(?:id:?\s*)?([a-z]{0,3}\d+)',  # "patient pat1" or "patient id: pat1"
-                    r'for\s+(?:patient\s+)?([a-z]{0,3}\d+)',   # "for pat1"
-                    r'id:\s*([a-z]{0,3}\d+)',                  # "id: pat1"
-                    r'([a-z]{0,3}\d+)(?:\s|$)',                # standalone "pat1" followed by space or end
-                    r'\b([a-z]{0,3}\d{1,})\b',                 # word boundary with at least 1 digit
-                ]
-                
-                for pattern in patterns:
-                    match = re.search(pattern, raw_text.strip(), re.IGNORECASE)
-                    if match:
-                        extracted = match.group(1).lower()
-                        # Validate it looks like a patient ID (starts with letters, ends with digits, minimum 1 digit)
-                        if re.match(r'^[a-z]{0,3}\d{1,}$', extracted):
-                            patient_id = extracted
-                            logger.info(f"Extracted patient_id: {patient_id}")
-                            break
-                
-                # Also check if user mentioned patient-like strings (even incomplete)
-                # Look specifically for patterns that look like patient IDs: pat, p, pat without digits at end of query
-                if not patient_id:
-                    # Search from end of string backwards to find potential patient identifiers
-                    words = raw_text.strip().split()
-                    for word in reversed(words):  # Start from end
-                        word_lower = word.lower().strip('.,!?;:')
-                        # Check if word looks like patient ID prefix (1-3 letters, optional digits)
-                        if re.match(r'^[a-z]{1,3}\d*$', word_lower) and len(word_lower) <= 3:
-                            # If it's a common word, skip it
-                            if word_lower not in ['the', 'and', 'for', 'my', 'show', 'get', 'is', 'are', 'was', 'been', 'have', 'has', 'do', 'does', 'did', 'will', 'can', 'could', 'should', 'would', 'may', 'might', 'must', 'of', 'in', 'on', 'at', 'to', 'by', 'or', 'as', 'with', 'from', 'about', 'history', 'medical', 'patient', 'journey', 'timeline', 'past', 'appointment', 'treatment', 'medication', 'visit', 'result', 'record', 'me', 'you', 'he', 'she', 'we', 'it']:
-                                mentioned_patient = word_lower
-                                logger.info(f"User mentioned potential patient identifier from end: {mentioned_patient}")
-                                break
+                patient_id, mentioned_patient = extract_patient_id(raw_text)
+                if patient_id:
+                    logger.info(f"Extracted patient_id: {patient_id}")
+                elif mentioned_patient:
+                    logger.info(f"User mentioned potential patient identifier from end: {mentioned_patient}")
                 
                 # Use extracted patient_id, or use mentioned string if it looks like incomplete patient ID
                 if not patient_id:
@@ -187,58 +392,18 @@ Focus on medical accuracy and completeness."""
                         flow["from"] = flow.pop("fr")
                 return result
             
-            # Use Gemini Pro for diagnosis queries (with timeout)
+            # One call classifies the intent and extracts the symptoms (cheapest model tier first)
             logger.info("Using LLM for intent analysis")
-            prompt = f"""Medical chat query analysis - Be concise!
-
-User: "{raw_text}"
-
-Is this asking about THEIR medical history/past events (patient_journey) or CURRENT symptoms (medical_diagnosis)?
-
-Respond with ONLY this JSON (no explanation):
-{{"intent": "patient_journey" or "medical_diagnosis"}}"""
-
-            # Get semantic analysis from LLM with timeout
-            import signal
-            
-            try:
-                response = self.llm(prompt)
-                logger.info(f"LLM response: {response[:200]}")
-            except Exception as e:
-                logger.error(f"LLM call error: {str(e)}, defaulting to medical_diagnosis")
-                response = '{"intent": "medical_diagnosis"}'
-            
-            try:
-                # Extract JSON from response
-                start_idx = response.find('{')
-                end_idx = response.rfind('}') + 1
-                if start_idx != -1 and end_idx != -1:
-                    analysis = json.loads(response[start_idx:end_idx])
-                else:
-                    raise ValueError("No valid JSON found")
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON parse error: {str(e)}")
-                analysis = {"intent": "medical_diagnosis"}
+            analysis = self.analyze_prompt(raw_text, enriched_data.get('workflow'))
             
             # Create MCP/ACL structure based on intent
             intent = analysis.get("intent", "medical_diagnosis")
             
             if intent == "patient_journey":
                 # Extract patient_id from query
-                import re
-                patient_id = None
-                patterns = [
-                    r'patient\s+(?:id:?\s*)?([a-z]{0,3}\d+)',  # "patient pat1"
-                    r'for\s+(?:patient\s+)?([a-z]{0,3}\d+)',   # "for pat1"
-                    r'id:\s*([a-z]{0,3}\d+)',                  # "id: pat1"
-                ]
-                
-                for pattern in patterns:
-                    match = re.search(pattern, raw_text, re.IGNORECASE)
-                    if match:
-                        patient_id = match.group(1)
-                        logger.info(f"Extracted patient_id: {patient_id}")
-                        break
+                patient_id = extract_explicit_patient_id(raw_text)
+                if patient_id:
+                    logger.info(f"Extracted patient_id: {patient_id}")
                 
                 # Default to authenticated user or 'pat1'
                 if not patient_id:
@@ -263,6 +428,7 @@ Respond with ONLY this JSON (no explanation):
                     data_flow=[]
                 )
             else:
+                symptoms = analysis.get("explicit_symptoms", []) + analysis.get("implicit_symptoms", [])
                 mcp = MCPACL(
                     agents=["symptom_analyzer", "disease_prediction"],
                     workflow="medical_diagnosis",
@@ -272,14 +438,15 @@ Respond with ONLY this JSON (no explanation):
                             action="analyze_symptoms",
                             params={
                                 "symptoms_text": raw_text,
-                                "concepts": analysis.get("identified_concepts", []),
+                                "concepts": symptoms,
                                 "intent": "medical_diagnosis"
                             }
                         ),
                         MCPACLAction(
                             agent="disease_prediction",
                             action="predict_disease",
-                            params={"symptoms": []}  # Will be populated from symptom_analyzer's output
+                            # Replaced by symptom_analyzer's output when it finds symptoms
+                            params={"symptoms": symptoms}
                         )
                     ],
                 data_flow=[
@@ -297,7 +464,9 @@ Respond with ONLY this JSON (no explanation):
                 # Fix the field name if needed
                 if "fr" in flow:
                     flow["from"] = flow.pop("fr")
-            
+
+            # Extracted concepts travel with the plan so agents need not ask the LLM again
+            result["semantic_context"] = semantic_context(analysis)
             return result
         except Exception as e:
             logger.error(f"Error generating MCP/ACL: {str(e)}")
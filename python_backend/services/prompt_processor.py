@@ -1,9 +1,15 @@
 import sys
 import logging
 from fastapi import FastAPI, HTTPException
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from typing import Any, Dict
 from services.enrichment_service import EnrichmentService
 from services.llm_service import LLMService
+from common.deadline import DeadlineMiddleware
+from common.priority import PriorityMiddleware
+from common.metrics import instrument_app, record_error
+from common.responses import use_fast_json
 
 # Configure logging
 logging.basicConfig(
@@ -14,6 +20,10 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Prompt Processing Service")
+use_fast_json(app)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(PriorityMiddleware)
+instrument_app(app, "prompt_processor")
 
 @app.get("/health")
 async def health_check():
@@ -31,6 +41,54 @@ class PromptInput(BaseModel):
 
 from fastapi import Request
 
+def build_mcp_acl(input_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Enrich a prompt (a PromptInput dict) and generate its validated MCP/ACL
+    structure. Shared by the HTTP route, which validates the request, and
+    the orchestrator's in-process transport, which passes its payload as is.
+    """
+    logger.info(f"Processing prompt: {input_data['prompt']}")
+    logger.info(f"User ID: {input_data['user_id']}, Session: {input_data['session_id']}")
+    
+    # Step 1: Enrich data
+    try:
+        enriched_data = enrichment_service.enrich_prompt(
+            prompt=input_data['prompt'],
+            user_id=input_data['user_id'],
+            session_id=input_data['session_id'],
+            workflow=input_data['workflow']
+        )
+        logger.info("Data enrichment successful")
+        logger.debug(f"Enriched data: {enriched_data}")
+    except Exception as enrich_error:
+        logger.error(f"Enrichment error: {str(enrich_error)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Data enrichment failed: {str(enrich_error)}")
+    
+    # Step 2: Generate MCP/ACL via LLM
+    try:
+        logger.info("Generating MCP/ACL structure...")
+        mcp_acl = llm_service.generate_mcp_acl(enriched_data)
+        logger.info("MCP/ACL generation successful")
+        logger.debug(f"Generated MCP/ACL: {mcp_acl}")
+    except Exception as llm_error:
+        logger.error(f"LLM service error: {str(llm_error)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"LLM service error: {str(llm_error)}")
+    
+    # Step 3: Validate LLM output format
+    try:
+        logger.info("Validating MCP/ACL format...")
+        if not llm_service.validate_mcp_acl_format(mcp_acl):
+            error_msg = "LLM generated invalid MCP/ACL format"
+            logger.error(error_msg)
+            raise HTTPException(status_code=400, detail=error_msg)
+        logger.info("MCP/ACL validation successful")
+    except Exception as validate_error:
+        logger.error(f"Validation error: {str(validate_error)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"MCP/ACL validation failed: {str(validate_error)}")
+    
+    logger.info("Request processing completed successfully")
+    return mcp_acl
+
 @app.post("/process_prompt")
 async def process_prompt(request: Request, input_data: PromptInput):
     """
@@ -41,51 +99,15 @@ async def process_prompt(request: Request, input_data: PromptInput):
         raw_body = await request.body()
         logger.debug(f"Raw request body: {raw_body}")
         
-        logger.debug(f"Received input data: {input_data.dict()}")
-        logger.info(f"Processing prompt: {input_data.prompt}")
-        logger.info(f"User ID: {input_data.user_id}, Session: {input_data.session_id}")
-        
-        # Step 1: Enrich data
-        try:
-            enriched_data = enrichment_service.enrich_prompt(
-                prompt=input_data.prompt,
-                user_id=input_data.user_id,
-                session_id=input_data.session_id,
-                workflow=input_data.workflow
-            )
-            logger.info("Data enrichment successful")
-            logger.debug(f"Enriched data: {enriched_data}")
-        except Exception as enrich_error:
-            logger.error(f"Enrichment error: {str(enrich_error)}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Data enrichment failed: {str(enrich_error)}")
-        
-        # Step 2: Generate MCP/ACL via LLM
-        try:
-            logger.info("Generating MCP/ACL structure...")
-            mcp_acl = llm_service.generate_mcp_acl(enriched_data)
-            logger.info("MCP/ACL generation successful")
-            logger.debug(f"Generated MCP/ACL: {mcp_acl}")
-        except Exception as llm_error:
-            logger.error(f"LLM service error: {str(llm_error)}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"LLM service error: {str(llm_error)}")
-        
-        # Step 3: Validate LLM output format
-        try:
-            logger.info("Validating MCP/ACL format...")
-            if not llm_service.validate_mcp_acl_format(mcp_acl):
-                error_msg = "LLM generated invalid MCP/ACL format"
-                logger.error(error_msg)
-                raise HTTPException(status_code=400, detail=error_msg)
-            logger.info("MCP/ACL validation successful")
-        except Exception as validate_error:
-            logger.error(f"Validation error: {str(validate_error)}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"MCP/ACL validation failed: {str(validate_error)}")
-        
-        logger.info("Request processing completed successfully")
-        return {"mcp_acl": mcp_acl}
+        payload = input_data.model_dump()
+        logger.debug(f"Received input data: {payload}")
+        # The LLM call blocks (gateway queue, micro-batch window), so it runs on a worker thread
+        # where concurrent requests can queue and batch together without stalling the event loop
+        return {"mcp_acl": await run_in_threadpool(build_mcp_acl, payload)}
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error in process_prompt: {str(e)}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        record_error("prompt_processor", e)
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,184 @@
+from typing import Any, Callable, Dict, Iterator, List, Optional
+import os
+import time
+import logging
+from common.metrics import REGISTRY
+from services.llm_backends import estimate_tokens
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+TEMPLATE_TOKENS_TOTAL = REGISTRY.counter(
+    "llm_template_tokens_total",
+    "Estimated LLM tokens per prompt template version, by direction (input, output)",
+    ("template", "version", "direction"))
+TEMPLATE_OUTPUT_TOKENS = REGISTRY.histogram(
+    "llm_template_output_tokens",
+    "Estimated output tokens per LLM call, by prompt template version",
+    ("template", "version"),
+    buckets=(16, 32, 64, 128, 256, 512, 1024, 2048, 4096))
+TEMPLATE_SECONDS = REGISTRY.histogram(
+    "llm_template_seconds", "LLM call latency per prompt template version", ("template", "version"))
+
+
+class PromptTemplate:
+    """
+    A versioned prompt with the output budget its answers get. Bump the
+    version whenever the text changes: the version is part of the keys of
+    everything cached from its answers and of the metric labels.
+    """
+    def __init__(self, name: str, version: int, text: str, max_output_tokens: int):
+        self.name = name
+        self.version = version
+        self.text = text
+        self.max_output_tokens = max_output_tokens
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@v{self.version}"
+
+    def render(self, **values: Any) -> str:
+        return self.text.format(**values)
+
+    def bind(self, llm: Callable[..., str]) -> "TemplatedLLM":
+        """`llm` with this template's output cap applied and its usage recorded"""
+        return TemplatedLLM(llm, self)
+
+    def observe(self, prompt: str, text: str, seconds: float):
+        version = str(self.version)
+        output_tokens = estimate_tokens(text) if text else 0
+        TEMPLATE_TOKENS_TOTAL.inc(estimate_tokens(prompt), template=self.name, version=version, direction="input")
+        TEMPLATE_TOKENS_TOTAL.inc(output_tokens, template=self.name, version=version, direction="output")
+        TEMPLATE_OUTPUT_TOKENS.observe(output_tokens, template=self.name, version=version)
+        TEMPLATE_SECONDS.observe(seconds, template=self.name, version=version)
+
+
+class TemplatedLLM:
+    """Callable LLM (and its `stream`) for one template: capped output, tokens and latency recorded"""
+    def __init__(self, llm: Callable[..., str], template: PromptTemplate):
+        self.llm = llm
+        self.template = template
+
+    def __call__(self, prompt: str, **kwargs: Any) -> str:
+        kwargs.setdefault("max_output_tokens", self.template.max_output_tokens)
+        start = time.perf_counter()
+        text = ""
+        try:
+            text = self.llm(prompt, **kwargs)
+            return text
+        finally:
+            self.template.observe(prompt, text, time.perf_counter() - start)
+
+    def stream(self, prompt: str, **kwargs: Any) -> Iterator[str]:
+        kwargs.setdefault("max_output_tokens", self.template.max_output_tokens)
+        start = time.perf_counter()
+        chunks: List[str] = []
+        try:
+            for chunk in self.llm.stream(prompt, **kwargs):
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            self.template.observe(prompt, "".join(chunks), time.perf_counter() - start)
+
+
+def parse_overrides(spec: Optional[str]) -> Dict[str, int]:
+    """"prompt_analysis=2,disease_prediction=1" -> {template: number}"""
+    overrides = {}
+    for entry in (spec or "").split(","):
+        if "=" in entry:
+            name, value = entry.split("=", 1)
+            try:
+                overrides[name.strip()] = int(value)
+            except ValueError:
+                logger.warning(f"Ignoring template setting '{entry.strip()}'")
+    return overrides
+
+
+class TemplateRegistry:
+    """
+    Every prompt the services send, by name and version. `get` returns the
+    newest version unless PROMPT_TEMPLATE_VERSIONS pins another;
+    PROMPT_MAX_OUTPUT_TOKENS overrides a template's output cap.
+    """
+    def __init__(self):
+        self._templates: Dict[str, Dict[int, PromptTemplate]] = {}
+
+    def register(self, template: PromptTemplate) -> PromptTemplate:
+        self._templates.setdefault(template.name, {})[template.version] = template
+        return template
+
+    def get(self, name: str) -> PromptTemplate:
+        versions = self._templates.get(name)
+        if not versions:
+            raise KeyError(f"No prompt template named '{name}'")
+        pinned = parse_overrides(os.getenv("PROMPT_TEMPLATE_VERSIONS")).get(name)
+        if pinned is not None and pinned not in versions:
+            logger.warning(f"Template {name} has no version {pinned}, using the newest")
+            pinned = None
+        template = versions[pinned if pinned is not None else max(versions)]
+        cap = parse_overrides(os.getenv("PROMPT_MAX_OUTPUT_TOKENS")).get(name)
+        if cap is not None and cap != template.max_output_tokens:
+            template = PromptTemplate(template.name, template.version, template.text, cap)
+        return template
+
+    def fingerprint(self) -> str:
+        """Active version of every template, for cache keys of results derived from LLM answers"""
+        return ",".join(self.get(name).key for name in sorted(self._templates))
+
+
+TEMPLATES = TemplateRegistry()
+
+# Intent and symptoms in one round trip; lists are kept short because output
+# tokens drive the latency of this call, which every request waits for
+PROMPT_ANALYSIS = TEMPLATES.register(PromptTemplate("prompt_analysis", 1, """Medical chat query analysis - Be concise!
+
+User: "{text}"
+
+Is this asking about THEIR medical history/past events (patient_journey) or CURRENT symptoms (medical_diagnosis)?
+Also list the symptoms it mentions (explicit) or implies (implicit), with any severity words and durations.
+Use short phrases and at most 5 items per list.
+
+Respond with ONLY this JSON (no explanation), confidence between 0 and 1:
+{{
+    "intent": "patient_journey" or "medical_diagnosis",
+    "confidence": 0.9,
+    "explicit_symptoms": ["symptom1", "symptom2"],
+    "implicit_symptoms": ["inferred_symptom1"],
+    "severity_indicators": ["mild", "severe"],
+    "duration_mentions": ["started 2 days ago"]
+}}""", max_output_tokens=256))
+
+DISEASE_PREDICTION = TEMPLATES.register(PromptTemplate("disease_prediction", 1, """Based on the following symptoms: {symptoms}
+Please provide a disease prediction in this format (explanation and recommendation in one sentence each):
+{{
+    "predicted_diseases": ["Disease1", "Disease2"],
+    "confidence": 0.85,
+    "explanation": "Brief explanation of the predictions",
+    "severity": "low/medium/high",
+    "recommendation": "Brief medical recommendation"
+}}""", max_output_tokens=256))
+
+# prompt_analysis for several prompts at once (micro-batching); the cap is per message
+PROMPT_ANALYSIS_BATCH = TEMPLATES.register(PromptTemplate("prompt_analysis_batch", 1, """Medical chat query analysis for several independent messages - Be concise!
+
+Messages:
+{messages}
+
+For EACH message: is it asking about THEIR medical history/past events (patient_journey) or CURRENT symptoms (medical_diagnosis)?
+Also list the symptoms it mentions (explicit) or implies (implicit), with any severity words and durations.
+Use short phrases and at most 5 items per list.
+
+Respond with ONLY this JSON (no explanation), one entry per message with its number, confidence between 0 and 1:
+{{
+    "analyses": [
+        {{
+            "index": 1,
+            "intent": "patient_journey" or "medical_diagnosis",
+            "confidence": 0.9,
+            "explicit_symptoms": ["symptom1", "symptom2"],
+            "implicit_symptoms": ["inferred_symptom1"],
+            "severity_indicators": ["mild", "severe"],
+            "duration_mentions": ["started 2 days ago"]
+        }}
+    ]
+}}""", max_output_tokens=256))
@@ -0,0 +1,275 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import os
+import re
+import json
+import logging
+from common.deadline import timeout_for
+from common.metrics import REGISTRY
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+STRUCTURED_OUTPUT_TOTAL = REGISTRY.counter(
+    "llm_structured_output_total",
+    "Structured LLM answers by operation and outcome (parsed, repaired, retried, failed)",
+    ("operation", "outcome"))
+LLM_EARLY_EXIT_TOTAL = REGISTRY.counter(
+    "llm_stream_early_exit_total",
+    "Streamed LLM answers cut short once the fields the caller needed were complete")
+
+# Repair-and-retry attempts after the first answer fails to parse or match its schema
+DEFAULT_RETRIES = 1
+
+JSON_TYPES = {
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+    "array": list,
+    "object": dict,
+}
+
+
+class StructuredOutputError(Exception):
+    """Raised when no valid JSON object matching the schema came back within the retries"""
+
+
+class IncrementalJSONParser:
+    """
+    Parses one JSON object as it streams in. Each top-level member is
+    decoded as soon as the comma or brace after it arrives, so a caller can
+    act on e.g. "intent" before the rest of the answer is generated. Text
+    before the opening brace (prose, code fences) is skipped.
+    """
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.done = False
+        self.errors = 0
+        self._buffer = ""
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._member_start = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._end: Optional[int] = None
+
+    @property
+    def text(self) -> str:
+        return self._buffer
+
+    def feed(self, chunk: str) -> Dict[str, Any]:
+        """Add a chunk; returns the top-level fields completed so far"""
+        self._buffer += chunk
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer) and not self.done:
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif self._start is None:
+                if ch == '{':
+                    self._start = i
+                    self._member_start = i + 1
+                    self._depth = 1
+            elif ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._close_member(buffer[self._member_start:i])
+                    self._end = i + 1
+                    self.done = True
+            elif ch == ',' and self._depth == 1:
+                self._close_member(buffer[self._member_start:i])
+                self._member_start = i + 1
+            i += 1
+        self._pos = i
+        return self.fields
+
+    def _close_member(self, member: str):
+        if not member.strip():
+            return
+        try:
+            self.fields.update(json.loads("{" + member + "}"))
+        except json.JSONDecodeError:
+            self.errors += 1
+
+    def result(self) -> Optional[Dict[str, Any]]:
+        """The complete object, or None if it has not closed or is not valid JSON"""
+        if not self.done:
+            return None
+        try:
+            parsed = json.loads(self._buffer[self._start:self._end])
+        except json.JSONDecodeError:
+            return None
+        return parsed if isinstance(parsed, dict) else None
+
+
+def repair_json(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Best-effort fix of a truncated or sloppy JSON object: code fences,
+    trailing commas, Python literals, single quotes and unclosed strings
+    or brackets. An answer cut off mid-value (e.g. at its output token cap)
+    keeps the members before the cut. Returns None when nothing parses.
+    """
+    start = text.find('{')
+    if start == -1:
+        return None
+    candidate = text[start:].replace("```", "")
+
+    # Close whatever is still open at the end of the text
+    stack: List[str] = []
+    in_string = escape = False
+    end = len(candidate)
+    # Where the last complete member ended, and the brackets open there
+    last_member: Optional[Tuple[int, List[str]]] = None
+    for i, ch in enumerate(candidate):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+        elif ch in '}]':
+            if stack:
+                stack.pop()
+            if not stack:
+                end = i + 1
+                break
+        elif ch == ',':
+            last_member = (i, list(stack))
+    truncated = stack and end == len(candidate)
+    candidate = candidate[:end]
+    if in_string:
+        candidate += '"'
+    candidate = re.sub(r'[,:]\s*$', '', candidate.rstrip())
+    candidate += "".join(reversed(stack))
+
+    attempts = [candidate]
+    fixed = re.sub(r',\s*([}\]])', r'\1', candidate)
+    fixed = re.sub(r'\bTrue\b', 'true', re.sub(r'\bFalse\b', 'false', re.sub(r'\bNone\b', 'null', fixed)))
+    attempts.append(fixed)
+    if '"' not in fixed:
+        attempts.append(fixed.replace("'", '"'))
+    if truncated and last_member is not None:
+        cut, open_brackets = last_member
+        attempts.append(candidate[:cut] + "".join(reversed(open_brackets)))
+    for attempt in attempts:
+        try:
+            parsed = json.loads(attempt)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(parsed, dict):
+            return parsed
+    return None
+
+
+def parse_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """The JSON object in a model response, repaired if needed; None when there is none"""
+    parser = IncrementalJSONParser()
+    parser.feed(text)
+    parsed = parser.result()
+    return parsed if parsed is not None else repair_json(text)
+
+
+def schema_errors(value: Dict[str, Any], schema: Optional[Dict[str, Any]]) -> List[str]:
+    """Mismatches against the subset of JSON Schema the prompts use (required, type, enum, items)"""
+    if not schema:
+        return []
+    errors = [f"missing '{key}'" for key in schema.get("required", []) if key not in value]
+    for key, spec in schema.get("properties", {}).items():
+        if key not in value or value[key] is None:
+            continue
+        expected = JSON_TYPES.get(spec.get("type"))
+        if expected and (not isinstance(value[key], expected) or
+                         (spec.get("type") in ("number", "integer") and isinstance(value[key], bool))):
+            errors.append(f"'{key}' should be {spec['type']}")
+        elif "enum" in spec and value[key] not in spec["enum"]:
+            errors.append(f"'{key}' should be one of {spec['enum']}")
+        elif spec.get("type") == "array" and spec.get("items", {}).get("type") == "string":
+            if not all(isinstance(item, str) for item in value[key]):
+                errors.append(f"'{key}' should contain strings")
+    return errors
+
+
+def stream_until(chunks: Iterable[str], stop_when: Callable[[Dict[str, Any]], bool]) -> Tuple[str, bool]:
+    """
+    Consume a streamed JSON answer until `stop_when(fields)` holds for the
+    completed top-level fields. Returns the text (the completed fields as
+    JSON when cut short) and whether the stream was cut short; closing the
+    generator lets the backend cancel the rest of the generation.
+    """
+    parser = IncrementalJSONParser()
+    iterator: Iterator[str] = iter(chunks)
+    try:
+        for chunk in iterator:
+            fields = parser.feed(chunk)
+            if parser.done:
+                break
+            if fields and stop_when(fields):
+                LLM_EARLY_EXIT_TOTAL.inc()
+                return json.dumps(fields), True
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+    return parser.text, False
+
+
+def request_structured(llm: Callable[..., str], prompt: str, schema: Dict[str, Any],
+                       operation: str, timeout: Optional[float] = None,
+                       validate: Optional[Callable[[str], bool]] = None,
+                       stop_when: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                       retries: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Ask `llm` for a JSON object matching `schema` (passed on, so backends
+    with a JSON mode or response schema enforce it) and return it parsed.
+    A malformed answer is repaired locally when possible; otherwise the
+    model is asked again, told what was wrong, up to `retries` times
+    (STRUCTURED_OUTPUT_RETRIES, default 1). Raises StructuredOutputError
+    after that instead of letting callers guess from a bad answer.
+    """
+    retries = retries if retries is not None else int(os.getenv("STRUCTURED_OUTPUT_RETRIES", str(DEFAULT_RETRIES)))
+    attempt_prompt = prompt
+    problem = ""
+    for attempt in range(retries + 1):
+        if attempt:
+            STRUCTURED_OUTPUT_TOTAL.inc(operation=operation, outcome="retried")
+        text = llm(attempt_prompt, timeout=timeout_for(timeout, stage="llm"), validate=validate,
+                   schema=schema, stop_when=stop_when)
+
+        parser = IncrementalJSONParser()
+        parser.feed(text)
+        parsed = parser.result()
+        outcome = "parsed"
+        if parsed is None:
+            parsed = repair_json(text)
+            outcome = "repaired"
+
+        if parsed is None:
+            problem = "the answer was not a JSON object"
+        else:
+            errors = schema_errors(parsed, schema)
+            if not errors:
+                STRUCTURED_OUTPUT_TOTAL.inc(operation=operation, outcome=outcome)
+                return parsed
+            problem = "; ".join(errors)
+        logger.warning(f"Structured {operation} answer rejected ({problem}): {text[:200]}")
+        attempt_prompt = (f"{prompt}\n\nYour previous answer was invalid: {problem}. "
+                          "Respond with ONLY the corrected JSON object.")
+
+    STRUCTURED_OUTPUT_TOTAL.inc(operation=operation, outcome="failed")
+    raise StructuredOutputError(f"No valid {operation} JSON after {retries + 1} attempt(s): {problem}")
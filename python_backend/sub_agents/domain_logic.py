@@ -1,8 +1,71 @@
+# Define specific symptom combinations
+SYMPTOM_PATTERNS = {
+    ('headache', 'nausea'): {
+        'low': ['Migraine', 'Tension Headache'],
+        'medium': ['Migraine with Aura'],
+        'high': ['Severe Migraine', 'Chronic Migraine']
+    },
+    ('headache', 'fever'): {
+        'low': ['Viral Infection'],
+        'medium': ['Flu', 'Sinus Infection'],
+        'high': ['Meningitis']
+    },
+    ('nausea', 'stomach pain'): {
+        'low': ['Gastritis'],
+        'medium': ['Food Poisoning'],
+        'high': ['Appendicitis']
+    }
+}
+
+# Common symptom groups and their associated conditions
+SYMPTOM_GROUPS = {
+    'headache_related': {
+        'symptoms': ['headache', 'head pain', 'migraine'],
+        'conditions': {
+            'low': ['Tension Headache', 'Mild Migraine'],
+            'medium': ['Migraine', 'Sinus Headache'],
+            'high': ['Severe Migraine', 'Cluster Headache']
+        }
+    },
+    'respiratory': {
+        'symptoms': ['cough', 'sore throat', 'runny nose', 'congestion'],
+        'conditions': {
+            'low': ['Common Cold'],
+            'medium': ['Flu', 'Bronchitis'],
+            'high': ['Pneumonia', 'COVID-19']
+        }
+    },
+    'gastrointestinal': {
+        'symptoms': ['nausea', 'vomiting', 'diarrhea', 'stomach pain'],
+        'conditions': {
+            'low': ['Gastritis', 'Food Sensitivity'],
+            'medium': ['Food Poisoning', 'Gastroenteritis'],
+            'high': ['Appendicitis', 'Severe Food Poisoning']
+        }
+    },
+    'fever_related': {
+        'symptoms': ['fever', 'chills', 'sweating', 'fatigue'],
+        'conditions': {
+            'low': ['Viral Infection', 'Common Cold'],
+            'medium': ['Flu', 'Bacterial Infection'],
+            'high': ['Severe Infection', 'COVID-19']
+        }
+    }
+}
+
+# Words that change how serious a described symptom is
+SEVERITY_TERMS = [
+    'mild', 'slight', 'moderate', 'severe', 'intense', 'extreme', 'unbearable', 'terrible', 'worst',
+    'worse', 'worsening', 'better', 'improving', 'sudden', 'constant', 'persistent', 'chronic', 'acute'
+]
 
-import requests
 
 class DomainLogic:
     """Executes the core business logic (e.g., disease prediction, journey tracking)."""
+    def __init__(self, symptom_patterns=None, symptom_groups=None):
+        self.symptom_patterns = symptom_patterns or SYMPTOM_PATTERNS
+        self.symptom_groups = symptom_groups or SYMPTOM_GROUPS
+
     def extract_fhir_data_from_context(self, semantic_context):
         """Extract FHIR data from semantic context instead of making a new call"""
         if not semantic_context:
@@ -42,66 +105,11 @@ class DomainLogic:
         conditions = []
         confidence = 0.5
 
-        # Define specific symptom combinations
-        symptom_patterns = {
-            ('headache', 'nausea'): {
-                'low': ['Migraine', 'Tension Headache'],
-                'medium': ['Migraine with Aura'],
-                'high': ['Severe Migraine', 'Chronic Migraine']
-            },
-            ('headache', 'fever'): {
-                'low': ['Viral Infection'],
-                'medium': ['Flu', 'Sinus Infection'],
-                'high': ['Meningitis']
-            },
-            ('nausea', 'stomach pain'): {
-                'low': ['Gastritis'],
-                'medium': ['Food Poisoning'],
-                'high': ['Appendicitis']
-            }
-        }
-
-        # Common symptom groups and their associated conditions
-        symptom_groups = {
-            'headache_related': {
-                'symptoms': ['headache', 'head pain', 'migraine'],
-                'conditions': {
-                    'low': ['Tension Headache', 'Mild Migraine'],
-                    'medium': ['Migraine', 'Sinus Headache'],
-                    'high': ['Severe Migraine', 'Cluster Headache']
-                }
-            },
-            'respiratory': {
-                'symptoms': ['cough', 'sore throat', 'runny nose', 'congestion'],
-                'conditions': {
-                    'low': ['Common Cold'],
-                    'medium': ['Flu', 'Bronchitis'],
-                    'high': ['Pneumonia', 'COVID-19']
-                }
-            },
-            'gastrointestinal': {
-                'symptoms': ['nausea', 'vomiting', 'diarrhea', 'stomach pain'],
-                'conditions': {
-                    'low': ['Gastritis', 'Food Sensitivity'],
-                    'medium': ['Food Poisoning', 'Gastroenteritis'],
-                    'high': ['Appendicitis', 'Severe Food Poisoning']
-                }
-            },
-            'fever_related': {
-                'symptoms': ['fever', 'chills', 'sweating', 'fatigue'],
-                'conditions': {
-                    'low': ['Viral Infection', 'Common Cold'],
-                    'medium': ['Flu', 'Bacterial Infection'],
-                    'high': ['Severe Infection', 'COVID-19']
-                }
-            }
-        }
-
         # Convert symptoms to lowercase for matching
         symptoms_lower = set(s.lower() for s in symptoms)
         
         # First check for specific symptom combinations
-        for symptom_combo, severity_conditions in symptom_patterns.items():
+        for symptom_combo, severity_conditions in self.symptom_patterns.items():
             if all(s in symptoms_lower for s in symptom_combo):
                 severity = severity_level or 'medium'
                 conditions.extend(severity_conditions[severity])
@@ -112,7 +120,7 @@ class DomainLogic:
         # If no combination matches, check individual symptom groups
         if not conditions:
             matched_groups = []
-            for group_name, group_data in symptom_groups.items():
+            for group_name, group_data in self.symptom_groups.items():
                 if any(s in symptoms_lower for s in group_data['symptoms']):
                     matched_groups.append(group_name)
                     # Add conditions based on severity
@@ -126,7 +134,22 @@ class DomainLogic:
                 if severity_level == 'high':
                     confidence += 0.1  # Higher confidence for severe cases
         
-        return list(set(conditions)), min(confidence, 0.95)  # Cap confidence at 0.95
+        # Deduplicated in match order, so the list doubles as a ranking
+        return list(dict.fromkeys(conditions)), min(confidence, 0.95)  # Cap confidence at 0.95
+
+    def known_symptoms(self):
+        """Every symptom a pattern or group rule matches on"""
+        known = {s for combo in self.symptom_patterns for s in combo}
+        for group_data in self.symptom_groups.values():
+            known.update(group_data['symptoms'])
+        return known
+
+    def symptom_coverage(self, symptoms):
+        """Fraction of the (distinct, lowercased) symptoms some rule matches on; 0 for none"""
+        symptoms_lower = set(s.lower() for s in symptoms)
+        if not symptoms_lower:
+            return 0.0
+        return len(symptoms_lower & self.known_symptoms()) / len(symptoms_lower)
 
     def predict_disease(self, params):
         """Main prediction function that uses FHIR data from semantic context"""
@@ -0,0 +1,113 @@
+import pytest
+
+from orchestration.agent_dispatcher import AgentDispatcher
+from orchestration.agent_handlers import AgentHandler, HANDLERS, HandlerRegistry
+from orchestration.input_handler import InputHandler
+from orchestration.transports import AgentTransportError, InProcessTransport
+
+
+class PassThrough:
+    """Error handler stand-in: one attempt, no breakers"""
+    def execute(self, agent, action, call):
+        return call()
+
+
+def dispatcher(handlers, registry=None):
+    return AgentDispatcher(transport=InProcessTransport(handlers=handlers), error_handler=PassThrough(),
+                           handlers=registry)
+
+
+def symptom_agent(payload):
+    return {"result": {"identified_symptoms": ["fever", "cough"], "severity_level": "high",
+                       "patient_id": "pat7", "semantic_analysis": {"intent": "diagnose"}},
+            "error": None}
+
+
+def test_symptom_outputs_feed_the_prediction_request():
+    requests = []
+
+    def prediction_agent(payload):
+        requests.append(payload)
+        return {"result": {"possible_conditions": []}, "error": None}
+
+    results = dispatcher({"symptom_analyzer": symptom_agent, "disease_prediction": prediction_agent}).dispatch([
+        {"agent": "symptom_analyzer", "action": "analyze_symptoms", "params": {"symptoms_text": "fever"}},
+        {"agent": "disease_prediction", "action": "predict_disease", "params": {"symptoms": ["ignored"]}},
+    ])
+    assert requests == [{"patient_id": "pat7", "symptoms": ["fever", "cough"], "severity_level": "high",
+                         "semantic_context": {"intent": "diagnose"}}]
+    assert results[0]["patient_id"] == "pat7"
+    assert results[1]["result"] == {"possible_conditions": [], "patient_id": "pat7"}
+
+
+def test_track_journey_has_its_own_handler():
+    requests = []
+
+    def journey_agent(payload):
+        requests.append(payload)
+        return {"result": {"stage": "triage"}, "error": None}
+
+    results = dispatcher({"symptom_analyzer": symptom_agent, "patient_journey": journey_agent}).dispatch([
+        {"agent": "symptom_analyzer", "action": "analyze_symptoms", "params": {"symptoms_text": "fever"}},
+        {"agent": "patient_journey", "action": "track_journey", "params": {"prompt": "where am I"}},
+    ])
+    assert requests == [{"prompt": "where am I", "patient_id": "pat7", "symptoms": ["fever", "cough"]}]
+    assert results[1] == {"agent": "patient_journey", "result": {"stage": "triage"}, "error": None}
+
+
+def test_unknown_actions_and_agents_are_reported():
+    results = dispatcher({}).dispatch([
+        {"agent": "patient_journey", "action": "delete_journey", "params": {}},
+        {"agent": "radiology", "action": "read_scan", "params": {}},
+    ])
+    assert results[0]["error"] == "Unknown action for patient_journey: delete_journey"
+    assert results[1]["error"] == "No handler implemented for agent: radiology"
+
+
+def test_transport_errors_use_the_handler_or_become_dispatch_errors():
+    def unavailable(payload):
+        raise AgentTransportError("agent", "down", 503)
+
+    results = dispatcher({"patient_journey": unavailable, "disease_prediction": unavailable}).dispatch([
+        {"agent": "patient_journey", "action": "get_journey", "params": {"patient_id": "pat1"}},
+        {"agent": "disease_prediction", "action": "predict_disease", "params": {"symptoms": ["fever"]}},
+    ])
+    assert results[0] == {"agent": "patient_journey", "error": "Patient Journey agent error: down"}
+    assert results[1]["result"] is None
+    assert results[1]["error"].startswith("Error dispatching to disease_prediction:")
+
+
+def test_registered_handlers_are_dispatched_and_wired_into_the_plan():
+    class ImagingHandler(AgentHandler):
+        agent = "imaging"
+        actions = ("read_scan",)
+        input_keys = ("patient_id",)
+
+        def build_request(self, task, inputs):
+            return {"patient_id": inputs.get("patient_id"), "scan": task["params"]["scan"]}
+
+    registry = HandlerRegistry(HANDLERS.handlers())
+    registry.register(ImagingHandler())
+    with pytest.raises(ValueError):
+        registry.register(ImagingHandler())
+
+    requests = []
+
+    def imaging_agent(payload):
+        requests.append(payload)
+        return {"result": {"finding": "clear"}, "error": None}
+
+    results = dispatcher({"symptom_analyzer": symptom_agent, "imaging": imaging_agent}, registry).dispatch([
+        {"agent": "symptom_analyzer", "action": "analyze_symptoms", "params": {"symptoms_text": "fever"}},
+        {"agent": "imaging", "action": "read_scan", "params": {"scan": "chest"}},
+    ])
+    assert requests == [{"patient_id": "pat7", "scan": "chest"}]
+    assert results[1]["result"] == {"finding": "clear"}
+
+    plan = InputHandler(registry).extract_plan({
+        "agents": ["symptom_analyzer", "imaging"], "workflow": [], "data_flow": [],
+        "actions": [{"agent": "symptom_analyzer", "action": "analyze_symptoms", "params": {}},
+                    {"agent": "imaging", "action": "read_scan", "params": {"scan": "chest"}}],
+    })
+    assert "patient_id" in plan[0]["outputs"]
+    assert plan[1]["inputs"] == ["patient_id"]
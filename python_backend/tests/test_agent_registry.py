@@ -0,0 +1,110 @@
+import json
+
+import pytest
+
+from orchestration.agent_registry import AgentRegistry
+
+URLS = ["http://a:8002/predict_disease", "http://b:8002/predict_disease"]
+
+
+def registry(**settings):
+    # probe_interval=0 keeps the background health probes off
+    return AgentRegistry({"disease_prediction": list(URLS)}, probe_interval=0, **settings)
+
+
+def test_least_outstanding_spreads_concurrent_calls():
+    agents = registry()
+    with agents.acquire("disease_prediction") as first:
+        with agents.acquire("disease_prediction") as second:
+            assert {first.url, second.url} == set(URLS)
+
+
+def test_ewma_prefers_the_faster_replica():
+    agents = registry(strategy="ewma")
+    slow, fast = agents.endpoints["disease_prediction"]
+    agents.record(slow, 0.5, ok=True)
+    agents.record(fast, 0.05, ok=True)
+    assert agents.choose("disease_prediction") is fast
+
+
+def test_failing_replica_is_ejected_and_restored():
+    agents = registry(failure_threshold=2, eject_seconds=60)
+    bad, good = agents.endpoints["disease_prediction"]
+    agents.record(bad, 0.01, ok=False)
+    assert not bad.is_ejected()
+    agents.record(bad, 0.01, ok=False)
+    assert bad.is_ejected()
+    assert all(agents.choose("disease_prediction") is good for _ in range(3))
+
+    agents.restore(bad)
+    assert not bad.is_ejected()
+    assert agents.status()["disease_prediction"][0]["consecutive_failures"] == 0
+
+
+def test_all_ejected_picks_the_replica_returning_soonest():
+    agents = registry()
+    first, second = agents.endpoints["disease_prediction"]
+    agents.eject(first, "test", seconds=60)
+    agents.eject(second, "test", seconds=5)
+    assert agents.choose("disease_prediction") is second
+
+
+def test_registry_file_and_environment_configure_replicas(tmp_path, monkeypatch):
+    path = tmp_path / "agents.json"
+    path.write_text(json.dumps({"agents": {"symptom_analyzer": ["http://s1:8003/analyze_symptoms",
+                                                                "http://s2:8003/analyze_symptoms"]},
+                                "strategy": "ewma", "probe_interval": 0}))
+    from_file = AgentRegistry.from_config(str(path))
+    assert from_file.strategy == "ewma"
+    assert [e.url for e in from_file.endpoints["symptom_analyzer"]] == ["http://s1:8003/analyze_symptoms",
+                                                                         "http://s2:8003/analyze_symptoms"]
+    assert from_file.endpoints["symptom_analyzer"][0].health_url == "http://s1:8003/health"
+
+    monkeypatch.delenv("AGENT_REGISTRY_FILE", raising=False)
+    monkeypatch.setenv("AGENT_ENDPOINTS", "patient_journey=http://j1:8005/patient_journey, http://j2:8005/patient_journey")
+    from_env = AgentRegistry.from_config()
+    assert len(from_env.endpoints["patient_journey"]) == 2
+    assert len(from_env.endpoints["disease_prediction"]) == 1
+
+    with pytest.raises(ValueError):
+        AgentRegistry({}, strategy="random")
+
+
+def test_failed_call_through_acquire_counts_against_its_replica():
+    agents = registry(failure_threshold=1)
+    with pytest.raises(RuntimeError):
+        with agents.acquire("disease_prediction") as endpoint:
+            assert endpoint.outstanding == 1
+            raise RuntimeError("connection reset")
+    assert endpoint.outstanding == 0
+    assert endpoint.is_ejected()
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = "error"
+
+    def json(self):
+        return {"ok": True}
+
+
+class FakeSession:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        return FakeResponse(self.status_code)
+
+
+@pytest.mark.parametrize("status_code,counted", [(503, True), (422, False)])
+def test_http_transport_counts_only_server_errors(status_code, counted):
+    from orchestration.transports import AgentTransportError, HTTPTransport
+
+    agents = AgentRegistry({"disease_prediction": [URLS[0]]}, probe_interval=0, failure_threshold=1)
+    transport = HTTPTransport(registry=agents, timeout=1.0)
+    transport.session = FakeSession(status_code)
+    with pytest.raises(AgentTransportError) as error:
+        transport.call("disease_prediction", {"symptoms": ["fever"]})
+    assert error.value.status_code == status_code
+    assert agents.endpoints["disease_prediction"][0].is_ejected() is counted
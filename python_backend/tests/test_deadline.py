@@ -0,0 +1,40 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from common.deadline import DEADLINE_HEADER, DeadlineMiddleware, current_deadline, deadline_headers
+
+
+def deadline_app():
+    app = FastAPI()
+    app.add_middleware(DeadlineMiddleware, default_ms=5000)
+
+    @app.get("/budget")
+    def budget():
+        return {"remaining_ms": current_deadline().remaining_ms(), "forwarded": deadline_headers()}
+
+    return app
+
+
+def get_budget(header_value):
+    async def scenario():
+        transport = httpx.ASGITransport(app=deadline_app())
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/budget", headers={DEADLINE_HEADER: header_value})
+    return asyncio.run(scenario())
+
+
+def test_incoming_deadline_header_sets_the_budget():
+    response = get_budget("1500")
+    assert response.status_code == 200
+    assert 1000 < response.json()["remaining_ms"] <= 1500
+
+
+@pytest.mark.parametrize("value", ["inf", "-inf", "nan", "Infinity", "soon"])
+def test_unusable_deadline_header_falls_back_to_the_default_budget(value):
+    response = get_budget(value)
+    assert response.status_code == 200
+    assert 4000 < response.json()["remaining_ms"] <= 5000
+    assert 4000 < int(response.json()["forwarded"][DEADLINE_HEADER]) <= 5000
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import httpx
+
+from agents.disease_prediction import main as disease_prediction
+from services.llm_backends import SimulatedLLMBackend
+from services.llm_gateway import GatedBackend, LLMGateway
+
+
+def test_llm_predict_waits_for_quota_off_the_event_loop(monkeypatch):
+    # One request a second: the second prediction queues at the gateway for about a second
+    gateway = LLMGateway(requests_per_minute=60, burst_seconds=1, shed_priorities=())
+    monkeypatch.setattr(disease_prediction, "vertex_llm", GatedBackend(SimulatedLLMBackend(), gateway))
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=disease_prediction.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            start = time.monotonic()
+            predictions = [asyncio.create_task(client.post("/llm_predict", json={"symptoms": ["fever", "cough"]}))
+                           for _ in range(2)]
+            await asyncio.sleep(0.1)
+            health = await client.get("/health")
+            health_seconds = time.monotonic() - start
+            return health, health_seconds, await asyncio.gather(*predictions)
+
+    health, health_seconds, predictions = asyncio.run(scenario())
+
+    assert health.status_code == 200
+    assert health_seconds < 0.5
+    assert all(response.json()["result"]["predicted_diseases"] for response in predictions)
+
+
+def test_merge_rankings_weights_agreeing_sources():
+    merged = disease_prediction.merge_rankings([(["Flu", "Cold"], 0.9), (["cold", "Pneumonia"], 0.5)])
+    assert merged == ["Cold", "Flu", "Pneumonia"]
+
+
+def test_in_process_prediction_returns_the_route_response_as_a_dict(monkeypatch):
+    from orchestration.transports import InProcessTransport
+
+    def no_validation(*args, **kwargs):
+        raise AssertionError("in-process calls must not validate")
+    request = {"symptoms": ["fever", "cough"], "patient_id": "P123"}
+    expected = disease_prediction.predict_disease(disease_prediction.DiseasePredictionRequest(**request)).model_dump()
+    monkeypatch.setattr(disease_prediction.DiseasePredictionResponse, "model_validate", no_validation)
+
+    assert InProcessTransport().call("disease_prediction", request) == expected
+
+
+def test_confident_rules_answer_without_calling_the_llm(monkeypatch):
+    def no_llm(symptoms):
+        raise AssertionError("the rules answer was confident enough")
+    monkeypatch.setattr(disease_prediction, "vertex_llm", object())
+    monkeypatch.setattr(disease_prediction, "llm_prediction", no_llm)
+
+    result = disease_prediction.ensemble({"symptoms": ["fever", "cough"]})["result"]
+    assert result["source"] == "rules"
+    assert result["predicted_diseases"][0] == "Flu"
+
+
+def test_uncovered_symptoms_merge_the_llm_ranking_with_the_rules(monkeypatch):
+    monkeypatch.setattr(disease_prediction, "vertex_llm", object())
+    monkeypatch.setattr(disease_prediction, "llm_prediction",
+                        lambda symptoms: {"predicted_diseases": ["Chilblains", "Flu"], "confidence": 0.9})
+
+    result = disease_prediction.ensemble({"symptoms": ["fever", "cough", "purple toes"]})["result"]
+    assert result["source"] == "ensemble"
+    assert result["predicted_diseases"][:2] == ["Flu", "Chilblains"]
+    assert result["confidence"] == 0.9
+
+
+def test_llm_failure_falls_back_to_the_rules_with_a_warning(monkeypatch, caplog):
+    def failing_llm(symptoms):
+        raise RuntimeError("quota exceeded")
+    monkeypatch.setattr(disease_prediction, "vertex_llm", object())
+    monkeypatch.setattr(disease_prediction, "llm_prediction", failing_llm)
+
+    with caplog.at_level("WARNING", logger=disease_prediction.__name__):
+        result = disease_prediction.ensemble({"symptoms": ["fever", "cough", "purple toes"]})["result"]
+    assert result["source"] == "rules_fallback"
+    assert result["predicted_diseases"] == ["Flu", "Bronchitis", "Bacterial Infection"]
+    assert "quota exceeded" in caplog.text
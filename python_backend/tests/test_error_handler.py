@@ -0,0 +1,187 @@
+import time
+
+import pytest
+
+from common.deadline import DeadlineExceeded
+from orchestration.error_handler import (CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, ErrorHandler,
+                                         LatencyTracker, RetryPolicy)
+from orchestration.transports import AgentTransportError
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test_agent", failure_threshold=3, reset_timeout=60)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_breaker_lets_one_probe_through():
+    breaker = CircuitBreaker("test_agent", failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+    breaker.release()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_circuit_states_reports_every_agents_breaker():
+    handler = ErrorHandler(failure_threshold=1, reset_timeout=60)
+    assert handler.circuit_states() == {}
+
+    handler.breaker("symptom_analyzer").record_success()
+    handler.breaker("disease_prediction").record_failure()
+    assert handler.circuit_states() == {"symptom_analyzer": CLOSED, "disease_prediction": OPEN}
+
+
+def test_failed_probe_reopens_the_breaker():
+    breaker = CircuitBreaker("test_agent", failure_threshold=5, reset_timeout=0.01)
+    for _ in range(5):
+        breaker.record_failure()
+    time.sleep(0.02)
+
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_latency_percentile_is_nearest_rank():
+    tracker = LatencyTracker()
+    for ms in range(1, 101):
+        tracker.observe("agent", ms / 1000)
+
+    assert tracker.percentile("agent", 95) == 0.095
+    assert tracker.percentile("agent", 100) == 0.1
+    assert tracker.percentile("agent", 0) == 0.001
+    assert tracker.percentile("agent", 95, min_samples=101) is None
+    assert tracker.percentile("other", 95) is None
+
+
+def test_retry_delay_is_bounded_exponential_backoff():
+    policy = RetryPolicy(max_attempts=5, base_delay=0.1, max_delay=0.3)
+
+    for _ in range(100):
+        assert 0 <= policy.delay(1) <= 0.1
+        assert 0 <= policy.delay(2) <= 0.2
+        assert 0 <= policy.delay(4) <= 0.3
+
+
+def test_execute_retries_idempotent_actions_until_the_circuit_opens():
+    handler = ErrorHandler(failure_threshold=2, reset_timeout=60, hedging=False,
+                           retry_policy=RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.001))
+    calls = []
+
+    def failing_call():
+        calls.append(1)
+        raise AgentTransportError("test_agent", "unreachable")
+
+    with pytest.raises(CircuitOpenError):
+        handler.execute("test_agent", "analyze_symptoms", failing_call)
+    assert len(calls) == 2
+    assert handler.breaker("test_agent").state == OPEN
+
+
+def test_execute_does_not_retry_writes_or_client_errors():
+    handler = ErrorHandler(failure_threshold=5, hedging=False,
+                           retry_policy=RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.001))
+    calls = []
+
+    def failing_call(status_code):
+        def call():
+            calls.append(status_code)
+            raise AgentTransportError("test_agent", "failed", status_code)
+        return call
+
+    with pytest.raises(AgentTransportError):
+        handler.execute("test_agent", "update_record", failing_call(503))
+    with pytest.raises(AgentTransportError):
+        handler.execute("test_agent", "analyze_symptoms", failing_call(400))
+    assert calls == [503, 400]
+    assert handler.breaker("test_agent").state == CLOSED
+
+
+def test_process_prompt_is_never_retried():
+    handler = ErrorHandler(failure_threshold=5, hedging=False,
+                           retry_policy=RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.001))
+    calls = []
+
+    def failing_call():
+        calls.append(1)
+        raise AgentTransportError("test_prompt_processor", "unreachable")
+
+    with pytest.raises(AgentTransportError):
+        handler.execute("test_prompt_processor", "process_prompt", failing_call)
+    assert calls == [1]
+
+
+def hedging_handler(agent, p95=0.02):
+    handler = ErrorHandler(hedging=True, hedge_min_samples=1)
+    handler.latencies.observe(agent, p95)
+    return handler
+
+
+def test_slow_call_is_hedged_and_the_first_success_wins():
+    handler = hedging_handler("test_hedge_agent")
+    calls = []
+
+    def call():
+        calls.append(1)
+        time.sleep(0.5 if len(calls) == 1 else 0.0)
+        return len(calls)
+
+    start = time.monotonic()
+    assert handler.execute("test_hedge_agent", "analyze_symptoms", call) == 2
+    assert time.monotonic() - start < 0.4
+
+
+def test_fast_call_is_not_hedged():
+    handler = hedging_handler("test_fast_agent", p95=0.2)
+    calls = []
+
+    def call():
+        calls.append(1)
+        return "ok"
+
+    assert handler.execute("test_fast_agent", "analyze_symptoms", call) == "ok"
+    assert calls == [1]
+
+
+def test_no_hedge_is_queued_while_the_pool_is_busy(monkeypatch):
+    monkeypatch.setenv("HEDGE_POOL_SIZE", "1")
+    handler = hedging_handler("test_busy_agent")
+    assert handler._hedge_slots.acquire(blocking=False)
+    calls = []
+
+    def call():
+        calls.append(1)
+        time.sleep(0.1)
+        return "primary"
+
+    assert handler.execute("test_busy_agent", "analyze_symptoms", call) == "primary"
+    assert calls == [1]
+
+
+def test_hedged_wait_stops_at_the_request_deadline():
+    from common.deadline import Deadline, deadline_scope
+
+    handler = hedging_handler("test_deadline_agent")
+
+    start = time.monotonic()
+    with deadline_scope(Deadline(0.2)):
+        with pytest.raises(DeadlineExceeded):
+            handler.execute("test_deadline_agent", "analyze_symptoms", lambda: time.sleep(1.0))
+    assert time.monotonic() - start < 0.6
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+
+from benchmarks import import_bench
+
+# -X importtime lists a module after the modules it imported, indented two spaces per level
+IMPORTTIME = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   encodings.utf_8
+import time:      1400 |       1520 | site
+import time:       300 |        300 |     starlette.types
+import time:      1500 |       1800 |   fastapi
+import time:       800 |       2600 | agents.patient_journey.main
+"""
+
+
+def test_importtime_lines_are_parsed_with_their_depth():
+    modules = import_bench.parse_importtime(IMPORTTIME)
+    assert [m["module"] for m in modules] == ["encodings.utf_8", "site", "starlette.types", "fastapi",
+                                              "agents.patient_journey.main"]
+    assert modules[3] == {"module": "fastapi", "depth": 1, "self_ms": 1.5, "cumulative_ms": 1.8}
+    assert [m["depth"] for m in modules] == [1, 0, 2, 1, 0]
+    assert import_bench.top_modules(modules, 1)[0]["module"] == "fastapi"
+
+
+def test_service_import_time_excludes_interpreter_startup():
+    result = import_bench.measure_service("json")
+    json_line = next(m for m in result["modules"] if m["module"] == "json")
+    assert result["total_ms"] == round(json_line["cumulative_ms"], 1) > 0
+
+
+def test_services_over_their_budget_or_the_default_are_reported():
+    results = {"symptom_analyzer": {"total_ms": 900.0}, "patient_journey": {"total_ms": 400.0},
+               "disease_prediction": {"total_ms": 700.0}}
+    budgets = {"default": 600, "symptom_analyzer": 1000}
+    assert import_bench.check_budgets(results, budgets) == ["disease_prediction: 700.0 ms > budget 600 ms"]
+
+
+def test_agents_import_without_llm_or_neo4j_clients():
+    # Without Neo4j configured (an empty value also keeps .env from setting it) the driver is not imported
+    env = {**os.environ, "NEO4J_URI": "", "NEO4J_USER": "", "NEO4J_PASSWORD": ""}
+    code = ("import sys\n"
+            "import agents.patient_journey.main, agents.disease_prediction.main, agents.symptom_analyzer.main\n"
+            "heavy = ('neo4j', 'langchain_google_vertexai', 'langchain_core', 'vertexai')\n"
+            "print(sorted(name for name in sys.modules if name.split('.')[0] in heavy))\n")
+    proc = subprocess.run([sys.executable, "-c", code], cwd=import_bench.BACKEND_ROOT, env=env,
+                          capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    assert proc.stdout.strip().splitlines()[-1] == "[]"
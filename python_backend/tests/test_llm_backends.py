@@ -0,0 +1,130 @@
+import pytest
+
+from services.llm_backends import (LLM_TIER_CALLS_TOTAL, LLM_TIER_COST_TOTAL, CascadeBackend, CascadeTier,
+                                   LLMBackend, LLMBackendError, LLMOverloadedError, LLMTimeoutError,
+                                   VertexAIBackend, cascade_config, parse_cascade)
+
+
+class RecordingClient:
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+
+    def invoke(self, prompt, **kwargs):
+        self.calls.append(kwargs)
+        if self.error:
+            raise self.error
+        return "{}"
+
+    def stream(self, prompt, **kwargs):
+        self.calls.append(kwargs)
+        if self.error:
+            raise self.error
+        yield "{}"
+
+
+def vertex_backend(client):
+    backend = VertexAIBackend.__new__(VertexAIBackend)
+    backend._client = client
+    return backend
+
+
+def test_vertex_timeout_is_the_api_request_timeout():
+    pytest.importorskip("google.api_core")
+    client = RecordingClient()
+    backend = vertex_backend(client)
+
+    backend.generate("prompt", timeout=2.5, max_output_tokens=64)
+    list(backend.stream("prompt", timeout=1.5))
+
+    assert client.calls == [{"max_output_tokens": 64, "timeout": 2.5}, {"timeout": 1.5}]
+
+
+def test_vertex_deadline_is_an_llm_timeout():
+    exceptions = pytest.importorskip("google.api_core.exceptions")
+    backend = vertex_backend(RecordingClient(exceptions.DeadlineExceeded("too slow")))
+
+    with pytest.raises(LLMTimeoutError):
+        backend.generate("prompt", timeout=0.1)
+    with pytest.raises(LLMTimeoutError):
+        list(backend.stream("prompt", timeout=0.1))
+
+
+class ScriptedBackend(LLMBackend):
+    """Answers with the given text, or raises it when it is an exception"""
+    def __init__(self, answer):
+        self.answer = answer
+        self.prompts = []
+
+    def generate(self, prompt, timeout=None, schema=None, max_output_tokens=None):
+        self.prompts.append(prompt)
+        if isinstance(self.answer, Exception):
+            raise self.answer
+        return self.answer
+
+
+def cascade(cheap_answer, threshold=0.8):
+    cheap, large = ScriptedBackend(cheap_answer), ScriptedBackend('{"intent": "large"}')
+    backend = CascadeBackend([CascadeTier("test-cheap", cheap, min_confidence=threshold, cost_per_1k_tokens=1.0),
+                              CascadeTier("test-large", large)])
+    return backend, cheap, large
+
+
+def test_cascade_accepts_a_confident_cheap_answer():
+    backend, cheap, large = cascade('{"intent": "cheap", "confidence": 0.9}')
+    cost = LLM_TIER_COST_TOTAL.value(tier="test-cheap")
+
+    assert backend("classify") == '{"intent": "cheap", "confidence": 0.9}'
+    assert large.prompts == []
+    assert LLM_TIER_COST_TOTAL.value(tier="test-cheap") > cost
+
+
+@pytest.mark.parametrize("answer,outcome", [
+    ('{"intent": "cheap", "confidence": 0.4}', "low_confidence"),
+    ("not json", "invalid"),
+    (LLMTimeoutError("slow"), "error"),
+])
+def test_cascade_escalates_unusable_cheap_answers(answer, outcome):
+    backend, cheap, large = cascade(answer)
+    before = LLM_TIER_CALLS_TOTAL.value(tier="test-cheap", outcome=outcome)
+
+    assert backend("classify") == '{"intent": "large"}'
+    assert large.prompts == ["classify"]
+    assert LLM_TIER_CALLS_TOTAL.value(tier="test-cheap", outcome=outcome) == before + 1
+
+
+def test_cascade_escalates_answers_the_caller_rejects():
+    backend, cheap, large = cascade('{"intent": "cheap", "confidence": 0.9}')
+    assert backend("classify", validate=lambda text: "large" in text) == '{"intent": "large"}'
+    # A validator that raises counts as a rejection
+    assert backend("classify", validate=lambda text: 1 / 0) == '{"intent": "large"}'
+
+
+def test_cascade_does_not_escalate_when_out_of_quota():
+    backend, cheap, large = cascade(LLMOverloadedError("quota exhausted"))
+    with pytest.raises(LLMOverloadedError):
+        backend("classify")
+    assert large.prompts == []
+
+
+def test_cascade_streams_from_the_last_tier():
+    backend, cheap, large = cascade('{"intent": "cheap"}')
+    assert "".join(backend.stream("classify")) == '{"intent": "large"}'
+    assert cheap.prompts == []
+    with pytest.raises(LLMBackendError):
+        CascadeBackend([])
+
+
+def test_cascade_tiers_come_from_the_environment(monkeypatch, tmp_path):
+    assert parse_cascade("flash-lite=0.8, pro", "flash-lite=0.0001,pro=0.00125") == [
+        {"model": "flash-lite", "min_confidence": 0.8, "cost_per_1k_tokens": 0.0001},
+        {"model": "pro", "min_confidence": 0.0, "cost_per_1k_tokens": 0.00125},
+    ]
+    monkeypatch.delenv("LLM_CASCADE_FILE", raising=False)
+    monkeypatch.setenv("LLM_CASCADE", "off")
+    assert cascade_config() == []
+
+    path = tmp_path / "cascade.json"
+    path.write_text('{"tiers": [{"model": "flash", "min_confidence": 0.7}, {"model": "pro"}]}')
+    monkeypatch.setenv("LLM_CASCADE_FILE", str(path))
+    assert [tier["model"] for tier in cascade_config()] == ["flash", "pro"]
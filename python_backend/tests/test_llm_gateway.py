@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from services.llm_backends import LLMOverloadedError, SimulatedLLMBackend
+from services.llm_gateway import GatedBackend, LLMGateway, TokenBucket
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(per_minute=600, burst_seconds=1)  # 10 a second, 10 at most
+    assert bucket.available() == pytest.approx(10)
+    bucket.take(10)
+    assert bucket.wait_time(5) == pytest.approx(0.5, abs=0.05)
+    time.sleep(0.2)
+    assert bucket.available() == pytest.approx(2, abs=0.3)
+
+
+def test_unlimited_gateway_admits_immediately():
+    admission = LLMGateway().admit("hello", timeout=1.0, priority="low")
+    assert admission.waited == 0.0
+    assert admission.timeout == 1.0
+
+
+def _drain(gateway: LLMGateway):
+    # Takes the only request the bucket holds, so every following call has to queue
+    gateway.admit("drain", priority="high")
+
+
+def test_queued_calls_are_admitted_by_priority_then_arrival():
+    gateway = LLMGateway(requests_per_minute=600, burst_seconds=0.1, shed_priorities=())
+    _drain(gateway)
+    order = []
+
+    def call(priority, name):
+        gateway.admit(name, timeout=5.0, priority=priority)
+        order.append(name)
+
+    threads = []
+    for priority, name in [("low", "low-1"), ("medium", "medium-1"), ("low", "low-2"), ("high", "high-1")]:
+        thread = threading.Thread(target=call, args=(priority, name))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.01)  # Fixes the arrival order while the first waiter is still blocked
+    for thread in threads:
+        thread.join()
+
+    assert order == ["high-1", "medium-1", "low-1", "low-2"]
+
+
+def test_low_priority_calls_are_shed_when_quota_is_exhausted():
+    gateway = LLMGateway(requests_per_minute=6, burst_seconds=10, shed_wait=0.5)
+    _drain(gateway)
+    with pytest.raises(LLMOverloadedError):
+        gateway.admit("later", timeout=5.0, priority="low")
+
+
+def test_queue_timeout_raises_overloaded():
+    gateway = LLMGateway(requests_per_minute=6, burst_seconds=10, shed_priorities=())
+    _drain(gateway)
+    start = time.monotonic()
+    with pytest.raises(LLMOverloadedError):
+        gateway.admit("later", timeout=0.1, priority="high")
+    assert time.monotonic() - start < 1.0
+
+
+def test_full_queue_sheds_any_priority():
+    gateway = LLMGateway(requests_per_minute=6, burst_seconds=10, shed_priorities=())
+    _drain(gateway)
+    gateway.max_queue = 0
+    with pytest.raises(LLMOverloadedError):
+        gateway.admit("later", timeout=5.0, priority="high")
+
+
+def test_gated_backend_passes_the_remaining_timeout_on():
+    seen = {}
+
+    class Recording(SimulatedLLMBackend):
+        def generate(self, prompt, timeout=None, schema=None, max_output_tokens=None):
+            seen["timeout"] = timeout
+            return "ok"
+
+    gated = GatedBackend(Recording(), LLMGateway())
+    assert gated.generate("hi", timeout=2.0) == "ok"
+    assert seen["timeout"] == pytest.approx(2.0)
@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import llm_mock
+from services.llm_backends import LLMBackendError, LLMRateLimitError, LLMTimeoutError, SimulatedLLMBackend
+from services.prompt_templates import TEMPLATES
+
+
+def test_mock_answers_the_prediction_prompt_in_the_parsed_format():
+    prompt = TEMPLATES.get("disease_prediction").render(symptoms="fever, headache")
+    answer = json.loads(llm_mock.MockLLM(latency_ms=0)(prompt))
+    assert answer["predicted_diseases"] == ["Flu", "Migraine"]
+    assert answer["confidence"] == 0.75
+
+
+def test_mock_answers_the_prompt_analysis():
+    prompt = TEMPLATES.get("prompt_analysis").render(text="I have a severe cough since monday")
+    answer = llm_mock.MockLLM(latency_ms=0).respond(prompt)
+    assert answer["intent"] == "medical_diagnosis"
+    assert answer["explicit_symptoms"] == ["cough"]
+    assert answer["severity_indicators"] == ["severe"]
+
+
+def test_seeded_simulators_inject_the_same_failures():
+    def outcomes(seed):
+        backend = SimulatedLLMBackend(error_rate=0.5, seed=seed)
+        results = []
+        for _ in range(20):
+            try:
+                backend.generate("hello")
+                results.append("ok")
+            except LLMBackendError:
+                results.append("error")
+        return results
+
+    assert outcomes(7) == outcomes(7)
+    assert {"ok", "error"} == set(outcomes(7))
+
+
+def test_simulated_latency_past_the_timeout_is_a_timeout():
+    backend = SimulatedLLMBackend(latency_ms=200)
+    with pytest.raises(LLMTimeoutError):
+        backend.generate("hello", timeout=0.01)
+
+
+def test_simulated_token_quota_is_a_rate_limit():
+    backend = SimulatedLLMBackend(tokens_per_minute=60)
+    backend.generate("hello")
+    with pytest.raises(LLMRateLimitError):
+        for _ in range(10):
+            backend.generate("hello")
+
+
+def test_stream_chunks_add_up_to_the_generated_text():
+    backend = SimulatedLLMBackend(chunk_tokens=2)
+    prompt = TEMPLATES.get("disease_prediction").render(symptoms="cough")
+    chunks = list(backend.stream(prompt))
+    assert len(chunks) > 1
+    assert "".join(chunks) == backend.generate(prompt)
+
+
+def test_http_endpoint_maps_simulated_failures_to_status_codes(monkeypatch):
+    async def post(body):
+        transport = httpx.ASGITransport(app=llm_mock.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/llm", json=body)
+
+    monkeypatch.setattr(llm_mock, "_simulator_instance", SimulatedLLMBackend())
+    assert "answer" in json.loads(asyncio.run(post({"prompt": "hello"})).json()["text"])
+
+    monkeypatch.setattr(llm_mock, "_simulator_instance", SimulatedLLMBackend(error_rate=1.0))
+    assert asyncio.run(post({"prompt": "hello"})).status_code == 503
+
+    monkeypatch.setattr(llm_mock, "_simulator_instance", SimulatedLLMBackend(tokens_per_minute=1))
+    assert asyncio.run(post({"prompt": "hello", "stream": True})).status_code == 429
@@ -0,0 +1,148 @@
+import threading
+
+import pytest
+
+from services.llm_backends import SimulatedLLMBackend
+from services.llm_service import LLMService, valid_prompt_analysis
+
+FEVER = "I have a fever"
+COUGH = "I have a cough"
+
+
+def respond(prompt):
+    if "Messages:" in prompt:
+        return {"analyses": [
+            {"index": 1, "intent": "medical_diagnosis", "confidence": "high", "explicit_symptoms": ["fever"]},
+            {"index": 2, "intent": "medical_diagnosis", "confidence": 0.9, "explicit_symptoms": ["cough"]},
+        ]}
+    return {"intent": "medical_diagnosis", "confidence": 0.7, "explicit_symptoms": ["fever"]}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("LLM_BACKEND", "simulator")
+    monkeypatch.setenv("PROMPT_ANALYSIS_BATCH_WINDOW_MS", "200")
+    monkeypatch.setenv("PROMPT_NEAR_DUPLICATE_CACHE_SECONDS", "0")
+    service = LLMService()
+    service.llm = SimulatedLLMBackend(responder=respond)
+    return service
+
+
+def test_batched_items_get_the_single_answer_checks(service):
+    fever, cough = service._analyze_batch([(FEVER, "medium"), (COUGH, "medium")])
+
+    assert fever is None
+    assert cough["confidence"] == 0.9
+
+
+def test_unusable_batched_item_falls_back_to_its_own_call(service):
+    results = {}
+
+    def analyze(text):
+        results[text] = service.analyze_prompt(text)
+
+    threads = [threading.Thread(target=analyze, args=(text,)) for text in (FEVER, COUGH)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert results[FEVER]["confidence"] == 0.7
+    assert results[COUGH]["confidence"] == 0.9
+
+
+@pytest.mark.parametrize("analyses", [
+    [{"index": 2, "intent": "patient_journey", "explicit_symptoms": []}],
+    [{"intent": "patient_journey", "explicit_symptoms": []}, {"intent": "medical_diagnosis", "explicit_symptoms": []}],
+    [{"index": 1, "intent": "patient_journey", "explicit_symptoms": []},
+     {"index": 1, "intent": "medical_diagnosis", "explicit_symptoms": []}],
+    [{"index": 1, "intent": "patient_journey", "explicit_symptoms": []},
+     {"index": 3, "intent": "medical_diagnosis", "explicit_symptoms": []}],
+    [{"index": 1, "intent": "patient_journey", "explicit_symptoms": []},
+     {"index": 2, "intent": "medical_diagnosis", "explicit_symptoms": []},
+     {"index": 2, "intent": "medical_diagnosis", "explicit_symptoms": []}],
+])
+def test_unmappable_batch_answer_is_discarded(service, analyses):
+    service.llm = SimulatedLLMBackend(responder=lambda prompt: {"analyses": analyses})
+
+    assert service._analyze_batch([(FEVER, "medium"), (COUGH, "medium")]) == [None, None]
+
+
+def test_failed_batch_call_falls_back_to_single_calls(service):
+    def respond_or_fail(prompt):
+        if "Messages:" in prompt:
+            raise RuntimeError("quota exceeded")
+        return respond(prompt)
+
+    service.llm = SimulatedLLMBackend(responder=respond_or_fail)
+
+    assert service._analyze_batch([(FEVER, "medium"), (COUGH, "medium")]) == [None, None]
+    assert service.analyze_prompt(FEVER)["confidence"] == 0.7
+
+
+def test_batcher_error_falls_back_to_the_single_call(service):
+    def failing_submit(item, timeout=None):
+        raise TimeoutError()
+
+    service.batcher.submit = failing_submit
+
+    assert service.analyze_prompt(FEVER)["confidence"] == 0.7
+
+
+@pytest.mark.parametrize("answer, valid", [
+    ('{"intent": "medical_diagnosis", "confidence": 0.8, "explicit_symptoms": []}', True),
+    ('{"intent": "medical_diagnosis", "explicit_symptoms": []}', True),
+    ('{"intent": "medical_diagnosis", "confidence": "very", "explicit_symptoms": []}', False),
+    ('{"intent": "medical_diagnosis", "confidence": [0.8], "explicit_symptoms": []}', False),
+    ('{"intent": "small_talk", "confidence": 0.8, "explicit_symptoms": []}', False),
+    ('{"intent": "medical_diagnosis", "explicit_symptoms": "fever"}', False),
+    ("not json", False),
+])
+def test_valid_prompt_analysis(answer, valid):
+    assert valid_prompt_analysis(answer) is valid
+
+
+@pytest.fixture
+def counting_service(monkeypatch):
+    monkeypatch.setenv("LLM_BACKEND", "simulator")
+    monkeypatch.setenv("PROMPT_ANALYSIS_BATCH_WINDOW_MS", "0")
+    monkeypatch.setenv("PROMPT_NEAR_DUPLICATE_CACHE_SECONDS", "0")
+    service = LLMService()
+    service.prompts = []
+
+    def analyze(prompt):
+        service.prompts.append(prompt)
+        return {"intent": "medical_diagnosis", "confidence": 0.9, "explicit_symptoms": ["fever"],
+                "implicit_symptoms": ["fatigue"], "severity_indicators": ["severe"],
+                "duration_mentions": ["3 days"]}
+
+    service.llm = SimulatedLLMBackend(responder=analyze)
+    return service
+
+
+def test_routing_and_symptom_extraction_share_one_llm_call(counting_service):
+    prompt = "I have had a severe fever for 3 days and feel drained"
+    mcp_acl = counting_service.generate_mcp_acl({"raw_prompt": prompt, "enriched_context": {}})
+    symptoms = counting_service.get_structured_symptoms(prompt)
+
+    assert len(counting_service.prompts) == 1
+    assert symptoms == ["fever", "fatigue"]
+    assert mcp_acl["workflow"] == "medical_diagnosis"
+    assert mcp_acl["actions"][1]["params"] == {"symptoms": ["fever", "fatigue"]}
+    assert mcp_acl["semantic_context"] == {
+        "intent": "medical_diagnosis", "identified_concepts": ["fever", "fatigue"], "confidence": 0.9,
+        "temporal_context": {"duration_mentions": ["3 days"]}, "severity_indicators": ["severe"]}
+
+
+def test_forwarded_semantic_context_is_accepted_downstream(counting_service):
+    from agents.disease_prediction.main import prediction_symptoms
+    from agents.symptom_analyzer.main import SymptomAnalyzerRequest
+    from orchestration.input_handler import InputHandler
+
+    mcp_acl = counting_service.generate_mcp_acl({"raw_prompt": "I have a fever", "enriched_context": {}})
+    plan = InputHandler().extract_plan(mcp_acl)
+    understanding = plan[0]["params"]["semantic_understanding"]
+
+    request = SymptomAnalyzerRequest(symptoms_text="I have a fever", semantic_context=understanding)
+    assert request.semantic_context.identified_concepts == ["fever", "fatigue"]
+    assert prediction_symptoms({"semantic_context": understanding}) == ["fever", "fatigue"]
@@ -0,0 +1,70 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from common.metrics import REGISTRY, MetricsRegistry, instrument_app, track_outbound
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, route="/x")
+
+    lines = registry.render().splitlines()
+    assert '# TYPE latency_seconds histogram' in lines
+    assert 'latency_seconds_bucket{route="/x",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/x",le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{route="/x",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{route="/x"} 4' in lines
+
+
+def test_label_values_are_escaped_and_must_match_the_declared_names():
+    registry = MetricsRegistry()
+    counter = registry.counter("errors_total", "Errors", ("type",))
+    counter.inc(type='Bad "quote"\n')
+    assert 'errors_total{type="Bad \\"quote\\"\\n"} 1.0' in registry.render()
+
+    with pytest.raises(ValueError):
+        counter.inc(kind="x")
+
+
+def test_a_name_keeps_its_metric_type():
+    registry = MetricsRegistry()
+    assert registry.counter("calls_total", "Calls") is registry.counter("calls_total", "Calls")
+    with pytest.raises(ValueError):
+        registry.gauge("calls_total", "Calls")
+
+
+def test_outbound_errors_are_timed_counted_and_reraised():
+    with pytest.raises(RuntimeError):
+        with track_outbound("test_target", "boom"):
+            raise RuntimeError("down")
+    histogram = REGISTRY.histogram("outbound_request_duration_seconds", "")
+    assert histogram.count(target="test_target", operation="boom", outcome="error") == 1
+
+
+def test_instrumented_app_records_routes_and_serves_metrics():
+    registry = MetricsRegistry()
+    app = FastAPI()
+    instrument_app(app, "test_service", registry=registry)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        return {"id": item_id}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            await client.get("/items/1")
+            await client.get("/items/2")
+            return await client.get("/metrics")
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    # Requests are labelled by route template, not by path, so ids do not explode the label set
+    requests = REGISTRY.counter("http_requests_total", "")
+    assert requests.value(service="test_service", method="GET", route="/items/{item_id}", status="200") == 2
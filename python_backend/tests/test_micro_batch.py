@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from common.micro_batch import MicroBatcher
+
+
+def submit_all(batcher, items, timeout=5.0):
+    results, errors = {}, {}
+
+    def submit(item):
+        try:
+            results[item] = batcher.submit(item, timeout=timeout)
+        except Exception as e:
+            errors[item] = e
+
+    threads = [threading.Thread(target=submit, args=(item,)) for item in items]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout)
+    return results, errors
+
+
+def test_concurrent_items_share_one_batch_and_get_their_own_results():
+    batches = []
+
+    def run_batch(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    results, errors = submit_all(MicroBatcher("test_formation", run_batch, window=0.2, max_size=8), [1, 2, 3, 4])
+
+    assert errors == {}
+    assert results == {1: 10, 2: 20, 3: 30, 4: 40}
+    assert len(batches) == 1 and sorted(batches[0]) == [1, 2, 3, 4]
+
+
+def test_full_batch_runs_without_waiting_for_the_window():
+    batches = []
+
+    def run_batch(items):
+        batches.append(len(items))
+        return items
+
+    results, errors = submit_all(MicroBatcher("test_max_size", run_batch, window=5.0, max_size=2), [1, 2, 3, 4])
+
+    assert errors == {}
+    assert sorted(results) == [1, 2, 3, 4]
+    assert batches == [2, 2]
+
+
+def test_batch_error_is_raised_to_every_caller():
+    def run_batch(items):
+        raise RuntimeError("model unavailable")
+
+    results, errors = submit_all(MicroBatcher("test_error", run_batch, window=0.1, max_size=8), [1, 2, 3])
+
+    assert results == {}
+    assert sorted(errors) == [1, 2, 3]
+    assert all(isinstance(error, RuntimeError) for error in errors.values())
+
+
+def test_wrong_number_of_results_is_an_error():
+    batcher = MicroBatcher("test_mismatch", lambda items: [], window=0.0, max_size=8)
+
+    with pytest.raises(ValueError):
+        batcher.submit(1, timeout=1.0)
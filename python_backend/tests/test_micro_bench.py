@@ -0,0 +1,34 @@
+import pytest
+
+from benchmarks import generators, micro_bench
+
+
+@pytest.mark.parametrize("exponent", [1.0, 2.0])
+def test_fit_exponent_recovers_the_power_law(exponent):
+    sizes = [10, 100, 1000]
+    assert micro_bench.fit_exponent(sizes, [3.0 * size ** exponent for size in sizes]) == pytest.approx(exponent)
+
+
+def test_fit_exponent_needs_two_distinct_sizes():
+    assert micro_bench.fit_exponent([10], [1.0]) is None
+    assert micro_bench.fit_exponent([10, 10], [1.0, 2.0]) is None
+
+
+def test_compare_flags_only_exponent_growth_beyond_the_limit():
+    baseline = {"cases": {"linear": {"exponent": 1.0}, "steady": {"exponent": 1.0}, "new": {"exponent": None}}}
+    current = {"cases": {"linear": {"exponent": 1.9}, "steady": {"exponent": 1.2}, "new": {"exponent": 2.0}}}
+    assert micro_bench.compare(current, baseline, max_increase=0.3) == ["linear: exponent 1.0 -> 1.9"]
+
+
+def test_generators_are_seeded():
+    assert generators.symptom_map(16, seed=3) == generators.symptom_map(16, seed=3)
+    assert generators.fhir_bundle(20, seed=3) == generators.fhir_bundle(20, seed=3)
+    assert generators.fhir_bundle(20, seed=3) != generators.fhir_bundle(20, seed=4)
+
+
+@pytest.mark.parametrize("name", sorted(micro_bench.CASES))
+def test_every_case_runs_at_its_smallest_size(name):
+    spec = micro_bench.CASES[name]
+    result = micro_bench.run_case(name, seed=0, repeat=1, min_time=0.0, sizes=spec["sizes"][:1])
+    assert result["points"][0]["size"] == spec["sizes"][0]
+    assert result["points"][0]["best_us"] >= 0
@@ -0,0 +1,65 @@
+from common.near_duplicate import NearDuplicateIndex, normalize_text
+from sub_agents.domain_logic import SEVERITY_TERMS, DomainLogic
+
+CHEST_PAIN = ("I have had chest pain, shortness of breath, dizziness, nausea and fatigue "
+              "since yesterday evening and it is getting worse when I climb the stairs")
+HEADACHE = "I have had a throbbing headache behind my eyes since yesterday evening and it gets worse in bright light"
+
+
+def make_index(**kwargs):
+    return NearDuplicateIndex("test_near_duplicate", threshold=0.9,
+                              guard_terms=list(DomainLogic().known_symptoms()) + SEVERITY_TERMS, **kwargs)
+
+
+def test_trivial_rewording_is_an_exact_hit():
+    index = make_index()
+    index.put("I have fever and cough", "analysis")
+
+    assert normalize_text("i've got a fever & a cough!") == normalize_text("I have fever and cough")
+    assert index.get("i've got a fever & a cough!") == "analysis"
+
+
+def test_misspelling_is_a_near_hit():
+    index = make_index()
+    index.put(HEADACHE, "analysis")
+
+    assert index.get(HEADACHE.replace("yesterday", "yesterdy")) == "analysis"
+
+
+def test_added_symptom_is_a_miss():
+    index = make_index()
+    index.put(CHEST_PAIN, "with nausea")
+
+    assert index.get(CHEST_PAIN.replace(" nausea and", " and")) is None
+
+
+def test_added_symptom_outside_the_vocabulary_is_a_miss():
+    index = make_index()
+    index.put(CHEST_PAIN, "with dizziness")
+
+    assert index.get(CHEST_PAIN.replace(" dizziness,", "")) is None
+
+
+def test_negations_numbers_and_severity_must_match():
+    index = make_index()
+    index.put("I have had a mild headache and fever for 3 days now", "analysis")
+
+    assert index.get("I have had a severe headache and fever for 3 days now") is None
+    assert index.get("I have had a mild headache and fever for 2 days now") is None
+    assert index.get("I have had a mild headache and no fever for 3 days now") is None
+
+
+def test_scope_and_accept_limit_reuse():
+    index = make_index()
+    index.put("I have fever and cough", "analysis", scope="v1")
+
+    assert index.get("I have fever and cough", scope="v2") is None
+    assert index.get("I have fever and cough", scope="v1", accept=lambda value: False) is None
+
+
+def test_zero_ttl_disables_the_index():
+    index = make_index(ttl=0)
+    index.put("I have fever and cough", "analysis")
+
+    assert index.get("I have fever and cough") is None
+    assert len(index) == 0
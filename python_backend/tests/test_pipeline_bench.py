@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from benchmarks import pipeline_bench
+
+
+def test_percentile_is_nearest_rank():
+    values = [i / 1000 for i in range(1, 101)]
+    assert pipeline_bench.percentile(values, 50) == 0.05
+    assert pipeline_bench.percentile(values, 95) == 0.095
+    assert pipeline_bench.percentile(values, 99) == 0.099
+    assert pipeline_bench.percentile(values, 100) == 0.1
+    assert pipeline_bench.percentile([], 95) == 0.0
+
+
+def test_summary_counts_errors_in_throughput_but_not_latency():
+    summary = pipeline_bench.summarize([0.01, 0.02, 0.03], errors=1, wall_seconds=2.0)
+    assert summary["requests"] == 4
+    assert summary["throughput_rps"] == 2.0
+    assert summary["mean_ms"] == 20.0
+    assert summary["p50_ms"] == 20.0
+
+
+def test_request_sequence_is_reproducible_from_the_workload_seed():
+    with open(pipeline_bench.DEFAULT_WORKLOAD) as f:
+        workload = json.load(f)
+    first = pipeline_bench.build_requests(workload, 50)
+    assert first == pipeline_bench.build_requests(workload, 50)
+    assert {entry["name"] for entry in first} == {entry["name"] for entry in workload["prompt_mix"]}
+
+
+@pytest.mark.parametrize("stage", ["prompt_processor", "symptom_analyzer", "disease_prediction",
+                                   "patient_journey", "orchestrate"])
+def test_every_default_stage_has_a_request(stage):
+    entry = {"prompt": "I have fever and cough", "workflow": "medical_diagnosis"}
+    url, payload = pipeline_bench.stage_request(stage, entry, 7, base_port=9000)
+    assert url.startswith("http://127.0.0.1:90")
+    assert payload
+
+
+def test_compare_flags_slower_latency_and_lower_throughput_only():
+    baseline = {"stages": {"symptom_analyzer": {"throughput_rps": 100.0, "p50_ms": 10.0, "p95_ms": 20.0,
+                                                "p99_ms": 30.0}}}
+    current = {"stages": {"symptom_analyzer": {"throughput_rps": 70.0, "p50_ms": 5.0, "p95_ms": 26.0,
+                                               "p99_ms": 33.0}}}
+    regressions = pipeline_bench.compare(current, baseline, tolerance=0.2)
+    assert [line.split(":")[0] for line in regressions] == ["symptom_analyzer.throughput_rps",
+                                                            "symptom_analyzer.p95_ms"]
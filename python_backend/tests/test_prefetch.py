@@ -0,0 +1,132 @@
+import threading
+
+from common.deadline import Deadline, current_deadline, deadline_scope
+from common.ttl_cache import TTLCache
+from orchestration.prefetch import PREFETCH_TOTAL, SpeculativePrefetcher
+from orchestration.transports import AgentTransport
+
+
+class RecordingTransport(AgentTransport):
+    """Records prefetch calls; each one waits for `release` before answering"""
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Semaphore(0)
+        self.release = threading.Event()
+
+    def _prefetch(self, agent, payload):
+        self.calls.append((agent, payload, current_deadline().remaining()))
+        self.started.release()
+        self.release.wait(2)
+        return {"warmed": True}
+
+
+def wait_for(handle):
+    for future in handle._futures.values():
+        try:
+            future.result(2)
+        except Exception:
+            pass
+
+
+def test_only_prompts_naming_a_patient_are_prefetched():
+    prefetcher = SpeculativePrefetcher(RecordingTransport(), enabled=True)
+    assert prefetcher.targets("I have a headache and fever") == {}
+    assert prefetcher.targets("patient pat7 has a headache") == {
+        "symptom_analyzer": {"symptoms_text": "patient pat7 has a headache"},
+        "patient_journey": {"patient_id": "pat7"},
+    }
+    assert SpeculativePrefetcher(RecordingTransport(), enabled=False).start("patient pat7").agents() == set()
+
+
+def test_warm_ups_run_under_the_budget_capped_by_the_request_deadline():
+    transport = RecordingTransport()
+    transport.release.set()
+    prefetcher = SpeculativePrefetcher(transport, budget_ms=2000, enabled=True)
+    warmed = PREFETCH_TOTAL.value(agent="patient_journey", outcome="warmed")
+    with deadline_scope(Deadline(0.5)):
+        handle = prefetcher.start("patient pat7 has a headache")
+    wait_for(handle)
+
+    assert sorted(agent for agent, _, _ in transport.calls) == ["patient_journey", "symptom_analyzer"]
+    assert all(0 < remaining <= 0.5 for _, _, remaining in transport.calls)
+    assert PREFETCH_TOTAL.value(agent="patient_journey", outcome="warmed") == warmed + 1
+
+    with deadline_scope(Deadline(-1)):
+        assert prefetcher.start("patient pat7").agents() == set()
+    prefetcher.shutdown()
+
+
+def test_prompts_beyond_the_in_flight_limit_are_skipped():
+    transport = RecordingTransport()
+    prefetcher = SpeculativePrefetcher(transport, max_in_flight=2, enabled=True)
+    skipped = PREFETCH_TOTAL.value(agent="symptom_analyzer", outcome="skipped_busy")
+    first = prefetcher.start("patient pat1 has a cough")
+    second = prefetcher.start("patient pat2 has a cough")
+
+    assert first.agents() == {"symptom_analyzer", "patient_journey"}
+    assert second.agents() == set()
+    assert PREFETCH_TOTAL.value(agent="symptom_analyzer", outcome="skipped_busy") == skipped + 1
+    transport.release.set()
+    wait_for(first)
+    prefetcher.shutdown()
+
+
+def test_warm_ups_for_agents_outside_the_plan_are_cancelled():
+    transport = RecordingTransport()
+    # One worker: the journey warm-up is still queued when the plan arrives
+    prefetcher = SpeculativePrefetcher(transport, max_in_flight=1, enabled=True)
+    prefetcher._slots = threading.BoundedSemaphore(2)
+    cancelled = PREFETCH_TOTAL.value(agent="patient_journey", outcome="cancelled")
+    handle = prefetcher.start("patient pat3 has a rash")
+    assert transport.started.acquire(timeout=2)
+
+    handle.retain(["symptom_analyzer"])
+    transport.release.set()
+    wait_for(handle)
+
+    assert [agent for agent, _, _ in transport.calls] == ["symptom_analyzer"]
+    assert handle.cancelled("patient_journey") and not handle.cancelled("symptom_analyzer")
+    assert PREFETCH_TOTAL.value(agent="patient_journey", outcome="cancelled") == cancelled + 1
+    prefetcher.shutdown()
+
+
+def test_ttl_cache_expires_evicts_and_can_be_disabled(monkeypatch):
+    import common.ttl_cache as ttl_cache
+
+    now = [100.0]
+    monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: now[0])
+    cache = TTLCache("test_prefetch", ttl=10, max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    # "b" was least recently used
+    assert cache.get("b") is None and cache.get("c") == 3
+    now[0] += 11
+    assert cache.get("a") is None
+
+    cache.put("P1", 1)
+    cache.put("p1", 2)
+    assert cache.invalidate_where(lambda key: key.lower() == "p1") == 2
+
+    disabled = TTLCache("test_prefetch", ttl=0)
+    disabled.put("a", 1)
+    assert disabled.get("a") is None
+
+
+def test_prefetched_history_serves_the_analysis(monkeypatch):
+    from agents.symptom_analyzer import main as symptom_analyzer
+
+    fetched = []
+
+    def fetch_history(patient_id):
+        fetched.append(patient_id)
+        symptom_analyzer.fhir_history_cache.put(patient_id, {})
+        return {}
+
+    monkeypatch.setattr(symptom_analyzer.fhir_connector, "_fetch_history", fetch_history)
+    symptom_analyzer.fhir_history_cache.clear()
+    assert symptom_analyzer.prefetch_history({"symptoms_text": "patient 204 has a fever"}) == {
+        "patient_id": "P204", "warmed": False}
+    symptom_analyzer.analyze({"symptoms_text": "patient 204 has a fever"})
+    assert fetched == ["P204"]
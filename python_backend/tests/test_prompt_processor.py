@@ -0,0 +1,56 @@
+import asyncio
+
+import httpx
+import pytest
+
+from services.llm_service import LLMService
+
+PROMPTS = [
+    "I have a sore throat and a runny nose",
+    "my stomach hurts after eating",
+    "I feel dizzy when I stand up",
+    "there is a rash on my arm",
+    "my knee is swollen and stiff",
+    "I keep sneezing every morning",
+    "my ears are ringing",
+    "I have a burning feeling in my chest",
+]
+
+
+@pytest.fixture
+def batching_processor(monkeypatch):
+    monkeypatch.setenv("LLM_BACKEND", "simulator")
+    monkeypatch.setenv("PROMPT_ANALYSIS_BATCH_WINDOW_MS", "100")
+    monkeypatch.setenv("PROMPT_ANALYSIS_BATCH_SIZE", "8")
+    monkeypatch.setenv("PROMPT_NEAR_DUPLICATE_CACHE_SECONDS", "0")
+    from services import prompt_processor
+
+    service = LLMService()
+    batch_sizes = []
+    run_batch = service.batcher.run_batch
+
+    def recording_run_batch(items):
+        batch_sizes.append(len(items))
+        return run_batch(items)
+
+    service.batcher.run_batch = recording_run_batch
+    monkeypatch.setattr(prompt_processor, "llm_service", service)
+    return prompt_processor.app, batch_sizes
+
+
+def test_concurrent_prompts_share_a_batch(batching_processor):
+    app, batch_sizes = batching_processor
+
+    async def send_all():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/process_prompt", json={
+                    "prompt": prompt, "user_id": "u1", "session_id": "s1", "workflow": "medical_diagnosis"})
+                for prompt in PROMPTS))
+
+    responses = asyncio.run(send_all())
+
+    assert [response.status_code for response in responses] == [200] * len(PROMPTS)
+    assert all(response.json()["mcp_acl"]["workflow"] == "medical_diagnosis" for response in responses)
+    assert max(batch_sizes) > 1
@@ -0,0 +1,77 @@
+import pytest
+
+from services.llm_backends import SimulatedLLMBackend
+from services.llm_service import prompt_analysis_key
+from services.prompt_templates import (TEMPLATE_TOKENS_TOTAL, PromptTemplate, TemplateRegistry, parse_overrides)
+from services.structured_output import parse_json_object
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.delenv("PROMPT_TEMPLATE_VERSIONS", raising=False)
+    monkeypatch.delenv("PROMPT_MAX_OUTPUT_TOKENS", raising=False)
+    registry = TemplateRegistry()
+    registry.register(PromptTemplate("greeting", 1, "Hello {name}", max_output_tokens=32))
+    registry.register(PromptTemplate("greeting", 2, "Hi {name}!", max_output_tokens=64))
+    return registry
+
+
+def test_newest_version_is_used_unless_pinned(registry, monkeypatch):
+    assert registry.get("greeting").key == "greeting@v2"
+    assert registry.get("greeting").render(name="Ada") == "Hi Ada!"
+
+    monkeypatch.setenv("PROMPT_TEMPLATE_VERSIONS", "greeting=1")
+    assert registry.get("greeting").key == "greeting@v1"
+    assert registry.fingerprint() == "greeting@v1"
+
+    monkeypatch.setenv("PROMPT_TEMPLATE_VERSIONS", "greeting=7")
+    assert registry.get("greeting").key == "greeting@v2"
+    with pytest.raises(KeyError):
+        registry.get("farewell")
+
+
+def test_output_cap_can_be_overridden(registry, monkeypatch):
+    monkeypatch.setenv("PROMPT_MAX_OUTPUT_TOKENS", "greeting=16, farewell=oops")
+    assert registry.get("greeting").max_output_tokens == 16
+    assert parse_overrides("greeting=16, farewell=oops") == {"greeting": 16}
+
+
+def test_bound_calls_apply_the_cap_and_record_tokens_per_version(registry):
+    calls = []
+
+    class Recording:
+        def __call__(self, prompt, **kwargs):
+            calls.append(kwargs)
+            return "x" * 40
+
+        def stream(self, prompt, **kwargs):
+            calls.append(kwargs)
+            yield "x" * 20
+            yield "x" * 20
+
+    template = registry.get("greeting")
+    llm = template.bind(Recording())
+    before = TEMPLATE_TOKENS_TOTAL.value(template="greeting", version="2", direction="output")
+
+    llm("Hi Ada!")
+    llm("Hi Ada!", max_output_tokens=8)
+    assert "".join(llm.stream("Hi Ada!")) == "x" * 40
+
+    assert [call["max_output_tokens"] for call in calls] == [64, 8, 64]
+    assert TEMPLATE_TOKENS_TOTAL.value(template="greeting", version="2", direction="output") == before + 30
+
+
+def test_answer_cut_at_its_cap_keeps_its_completed_fields():
+    answer = '{"intent": "medical_diagnosis", "confidence": 0.9, "explicit_symptoms": ["fever", "cough"]}'
+    capped = SimulatedLLMBackend(responder=lambda prompt: answer).generate("prompt", max_output_tokens=15)
+
+    assert len(capped) == 60
+    assert parse_json_object(capped) == {"intent": "medical_diagnosis", "confidence": 0.9}
+
+
+def test_analysis_cache_key_changes_with_the_template_version(registry):
+    v1 = PromptTemplate("prompt_analysis", 1, "{text}", 256)
+    v2 = PromptTemplate("prompt_analysis", 2, "{text}", 256)
+
+    assert prompt_analysis_key("I have  a Fever", v1) == prompt_analysis_key("i have a fever", v1)
+    assert prompt_analysis_key("i have a fever", v1) != prompt_analysis_key("i have a fever", v2)
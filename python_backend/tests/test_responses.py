@@ -0,0 +1,74 @@
+import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.exceptions import ResponseValidationError
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from starlette.responses import PlainTextResponse
+
+import common.responses as responses
+from common.responses import encode_json, use_fast_json
+
+
+class Prediction(BaseModel):
+    disease: str
+    confidence: float
+
+
+class DetailedPrediction(Prediction):
+    internal_notes: str
+
+
+def client():
+    app = use_fast_json(FastAPI())
+
+    @app.get("/trusted", response_model=Prediction)
+    def trusted():
+        # Deliberately invalid: a trusted instance is not validated again
+        return Prediction.model_construct(disease="Flu", confidence="high")
+
+    @app.get("/subclass", response_model=Prediction)
+    def subclass():
+        return DetailedPrediction(disease="Flu", confidence=0.9, internal_notes="not for clients")
+
+    @app.get("/dict", response_model=Prediction)
+    def as_dict():
+        return {"disease": "Flu", "confidence": "high"}
+
+    @app.post("/plain", status_code=201)
+    async def plain():
+        return {"tags": {"fever"}, "at": datetime.date(2026, 1, 2), "model": Prediction(disease="Flu", confidence=1)}
+
+    @app.get("/text")
+    def text():
+        return PlainTextResponse("ok")
+
+    return TestClient(app)
+
+
+@pytest.mark.filterwarnings("ignore:Pydantic serializer warnings")
+def test_own_response_model_instances_skip_revalidation():
+    response = client().get("/trusted")
+    assert response.json() == {"disease": "Flu", "confidence": "high"}
+
+
+def test_other_return_values_take_fastapis_path():
+    test_client = client()
+    assert test_client.get("/subclass").json() == {"disease": "Flu", "confidence": 0.9}
+    with pytest.raises(ResponseValidationError):
+        test_client.get("/dict")
+    assert test_client.get("/text").text == "ok"
+
+
+def test_routes_without_a_response_model_are_encoded_directly():
+    response = client().post("/plain")
+    assert response.status_code == 201
+    assert response.json() == {"tags": ["fever"], "at": "2026-01-02", "model": {"disease": "Flu", "confidence": 1.0}}
+
+
+def test_stdlib_fallback_encodes_like_orjson(monkeypatch):
+    content = {"disease": "Grippe é", "scores": [0.5, 1], "when": datetime.date(2026, 1, 2), 1: None}
+    fast = encode_json(content)
+    monkeypatch.setattr(responses, "orjson", None)
+    assert encode_json(content) == fast
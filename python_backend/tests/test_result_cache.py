@@ -0,0 +1,73 @@
+import threading
+
+from orchestration.result_cache import WorkflowResultCache
+
+PLAN = [{"agent": "symptom_analyzer", "action": "analyze_symptoms",
+         "params": {"symptoms_text": "headache", "patient_id": "PAT1"}}]
+
+
+def make_cache(**kwargs):
+    kwargs.setdefault("invalidation_hold", 0)
+    return WorkflowResultCache(ttls={"medical_diagnosis": 300}, **kwargs)
+
+
+def counting_compute(calls, result="fresh"):
+    def compute():
+        calls.append(1)
+        return [{"agent": "symptom_analyzer", "result": result, "patient_id": "PAT1"}]
+    return compute
+
+
+def test_results_are_cached_until_the_patient_is_invalidated():
+    cache, calls = make_cache(), []
+
+    cache.get_or_compute("medical_diagnosis", PLAN, counting_compute(calls))
+    cache.get_or_compute("medical_diagnosis", PLAN, counting_compute(calls))
+    assert len(calls) == 1
+
+    assert cache.invalidate_patient("pat1") == 1
+    cache.get_or_compute("medical_diagnosis", PLAN, counting_compute(calls))
+    assert len(calls) == 2
+
+
+def test_invalidation_during_a_compute_is_not_overwritten():
+    cache, calls = make_cache(), []
+    started, release = threading.Event(), threading.Event()
+
+    def slow_compute():
+        started.set()
+        release.wait(5)
+        return counting_compute(calls, "stale")()
+
+    worker = threading.Thread(target=cache.get_or_compute, args=("medical_diagnosis", PLAN, slow_compute))
+    worker.start()
+    started.wait(5)
+    cache.invalidate_patient("PAT1")
+    release.set()
+    worker.join(5)
+
+    results = cache.get_or_compute("medical_diagnosis", PLAN, counting_compute(calls))
+    assert results[0]["result"] == "fresh"
+
+
+def test_results_are_not_stored_during_the_invalidation_hold():
+    cache, calls = make_cache(invalidation_hold=60), []
+    cache.invalidate_patient("PAT1")
+
+    cache.get_or_compute("medical_diagnosis", PLAN, counting_compute(calls))
+    cache.get_or_compute("medical_diagnosis", PLAN, counting_compute(calls))
+    assert len(calls) == 2
+
+    cache._held["pat1"] = 0
+    cache.get_or_compute("medical_diagnosis", PLAN, counting_compute(calls))
+    cache.get_or_compute("medical_diagnosis", PLAN, counting_compute(calls))
+    assert len(calls) == 3
+
+
+def test_clear_holds_every_patient():
+    cache, calls = make_cache(invalidation_hold=60), []
+    cache.clear()
+
+    cache.get_or_compute("medical_diagnosis", PLAN, counting_compute(calls))
+    cache.get_or_compute("medical_diagnosis", PLAN, counting_compute(calls))
+    assert len(calls) == 2
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from common.singleflight import SINGLEFLIGHT_CALLS_TOTAL, AsyncSingleFlight, SingleFlight
+
+
+def test_followers_share_the_leaders_result():
+    flight = SingleFlight("test_sync")
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "history"
+
+    leader = threading.Thread(target=lambda: results.append(flight.do("P1", fetch)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("P1", fetch))) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    while SINGLEFLIGHT_CALLS_TOTAL.value(group="test_sync", result="coalesced") < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(results, key=lambda result: result[1]) == [("history", False)] + [("history", True)] * 3
+    assert flight.in_flight() == 0
+
+
+def test_followers_get_the_leaders_error():
+    flight = AsyncSingleFlight("test_async_error")
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        raise ValueError("FHIR server down")
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("P1", fetch) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(scenario())
+
+    assert [type(error) for error in errors] == [ValueError] * 3
+    assert flight.in_flight() == 0
+
+
+def test_cancelled_leader_hands_the_call_to_a_follower():
+    flight = AsyncSingleFlight("test_async_cancel")
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "history"
+
+    async def scenario():
+        leader = asyncio.create_task(flight.do("P1", fetch))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(flight.do("P1", fetch)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*followers)
+
+    results = asyncio.run(scenario())
+
+    assert len(calls) == 2
+    assert sorted(shared for _, shared in results) == [False, True, True]
+    assert all(result == "history" for result, _ in results)
+    assert flight.in_flight() == 0
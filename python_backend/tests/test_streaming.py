@@ -0,0 +1,94 @@
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+import pytest
+from starlette.requests import ClientDisconnect
+
+from agents.disease_prediction import main as disease_prediction
+from common.streaming import STREAM_TOTAL, sse_event, stream_chunks
+from services.llm_backends import SimulatedLLMBackend
+
+
+def parse_events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        name, data = block.split("\n", 1)
+        events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def stream_prediction(payload):
+    async def scenario():
+        transport = httpx.ASGITransport(app=disease_prediction.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/llm_predict/stream", json=payload)
+            return response.headers["content-type"], response.text
+
+    return asyncio.run(scenario())
+
+
+def test_prediction_streams_tokens_partials_and_the_result(monkeypatch):
+    monkeypatch.setattr(disease_prediction, "vertex_llm", SimulatedLLMBackend(chunk_tokens=2))
+    content_type, body = stream_prediction({"symptoms": ["fever", "cough"], "severity_level": "high"})
+    events = parse_events(body)
+    names = [name for name, _ in events]
+
+    assert content_type.startswith("text/event-stream")
+    assert names.count("token") > 1 and "partial" in names
+    assert names[-1] == "result"
+    answer = "".join(data["text"] for name, data in events if name == "token")
+    assert json.loads(answer)["predicted_diseases"] == events[-1][1]["result"]["predicted_diseases"]
+    assert events[-1][1]["result"]["symptoms_used"] == ["fever", "cough"]
+    assert events[-1][1]["result"]["severity_level"] == "high"
+
+
+def test_invalid_streamed_prediction_ends_with_an_error_event(monkeypatch):
+    monkeypatch.setattr(disease_prediction, "vertex_llm", SimulatedLLMBackend(responder=lambda prompt: "no idea"))
+    _, body = stream_prediction({"symptoms": ["fever"]})
+    name, data = parse_events(body)[-1]
+
+    assert name == "error"
+    assert data["error"].startswith("Invalid prediction")
+
+
+def test_client_disconnect_closes_the_backend_stream():
+    closed = threading.Event()
+    produced = []
+
+    def chunks():
+        try:
+            for i in range(100):
+                produced.append(i)
+                time.sleep(0.01)
+                yield f"chunk {i}"
+        finally:
+            closed.set()
+
+    async def scenario():
+        disconnected = asyncio.Event()
+
+        class Request:
+            async def receive(self):
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+        stream = stream_chunks(Request(), chunks(), "test_streaming")
+        first = await stream.__anext__()
+        disconnected.set()
+        with pytest.raises(ClientDisconnect):
+            async for _ in stream:
+                pass
+        return first
+
+    before = STREAM_TOTAL.value(route="test_streaming", outcome="disconnected")
+    assert asyncio.run(scenario()) == "chunk 0"
+    assert closed.wait(2)
+    assert len(produced) < 100
+    assert STREAM_TOTAL.value(route="test_streaming", outcome="disconnected") == before + 1
+
+
+def test_sse_event_format():
+    assert sse_event("token", {"text": "hi"}) == 'event: token\ndata: {"text": "hi"}\n\n'
@@ -0,0 +1,93 @@
+import pytest
+
+from services.structured_output import (IncrementalJSONParser, StructuredOutputError, parse_json_object,
+                                        repair_json, request_structured, schema_errors, stream_until)
+
+SCHEMA = {
+    "type": "object",
+    "required": ["intent", "symptoms"],
+    "properties": {
+        "intent": {"type": "string", "enum": ["medical_diagnosis", "patient_journey"]},
+        "confidence": {"type": "number"},
+        "symptoms": {"type": "array", "items": {"type": "string"}},
+    },
+}
+
+
+def test_incremental_parser_completes_fields_as_they_stream():
+    parser = IncrementalJSONParser()
+    assert parser.feed('Sure! ```json\n{"intent": "patient_') == {}
+    assert parser.feed('journey", "symptoms": ["fever", ') == {"intent": "patient_journey"}
+    assert parser.feed('"a, {b}"], "detail": {"x": [1, 2]}') == {"intent": "patient_journey",
+                                                                 "symptoms": ["fever", "a, {b}"]}
+    assert not parser.done and parser.result() is None
+    parser.feed('}\n``` trailing prose')
+    assert parser.done
+    assert parser.result() == {"intent": "patient_journey", "symptoms": ["fever", "a, {b}"], "detail": {"x": [1, 2]}}
+
+
+@pytest.mark.parametrize("text,expected", [
+    ('```json\n{"intent": "medical_diagnosis",}\n```', {"intent": "medical_diagnosis"}),
+    ("{'intent': 'patient_journey'}", {"intent": "patient_journey"}),
+    ('{"urgent": True, "note": None}', {"urgent": True, "note": None}),
+    ('{"intent": "medical_diagnosis", "symptoms": ["fever", "cou', {"intent": "medical_diagnosis",
+                                                                     "symptoms": ["fever", "cou"]}),
+    ('{"intent": "medical_diagnosis", "confidence": 0.', {"intent": "medical_diagnosis"}),
+    ("no json here", None),
+])
+def test_repair_recovers_sloppy_and_truncated_answers(text, expected):
+    assert repair_json(text) == expected
+
+
+def test_parse_json_object_prefers_the_exact_object():
+    assert parse_json_object('{"a": "}"} and {"b": 1}') == {"a": "}"}
+    assert parse_json_object("[1, 2]") is None
+
+
+def test_schema_errors_cover_required_type_enum_and_items():
+    assert schema_errors({"intent": "medical_diagnosis", "symptoms": [], "confidence": None}, SCHEMA) == []
+    assert schema_errors({"intent": "small_talk", "confidence": True, "symptoms": ["fever", 3]}, SCHEMA) == [
+        "'intent' should be one of ['medical_diagnosis', 'patient_journey']",
+        "'confidence' should be number",
+        "'symptoms' should contain strings",
+    ]
+    assert schema_errors({}, SCHEMA) == ["missing 'intent'", "missing 'symptoms'"]
+    assert schema_errors({}, None) == []
+
+
+def test_stream_until_stops_and_closes_the_stream():
+    closed = []
+
+    def chunks():
+        try:
+            yield '{"intent": "patient_journey", '
+            yield '"symptoms": []'
+            yield ', "rest": "never generated"}'
+        finally:
+            closed.append(True)
+
+    text, cut = stream_until(chunks(), lambda fields: "intent" in fields)
+    assert (text, cut) == ('{"intent": "patient_journey"}', True)
+    assert closed == [True]
+    assert stream_until(iter(['{"a": 1}']), lambda fields: False) == ('{"a": 1}', False)
+
+
+class ScriptedLLM:
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.prompts = []
+
+    def __call__(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return self.answers.pop(0)
+
+
+def test_request_structured_retries_with_the_problem_then_fails():
+    llm = ScriptedLLM('{"intent": "small_talk", "symptoms": []}', '{"intent": "medical_diagnosis", "symptoms": []}')
+    assert request_structured(llm, "classify", SCHEMA, "test") == {"intent": "medical_diagnosis", "symptoms": []}
+    assert "'intent' should be one of" in llm.prompts[1]
+
+    llm = ScriptedLLM("sorry", "still no")
+    with pytest.raises(StructuredOutputError):
+        request_structured(llm, "classify", SCHEMA, "test", retries=1)
+    assert len(llm.prompts) == 2
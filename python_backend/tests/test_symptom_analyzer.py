@@ -0,0 +1,251 @@
+import pytest
+
+from agents.symptom_analyzer.main import SymptomAnalyzerRequest, analysis_key
+
+
+def key(symptoms_text, patient_id=None):
+    return analysis_key(SymptomAnalyzerRequest(symptoms_text=symptoms_text, patient_id=patient_id).model_dump())
+
+
+def test_requests_the_analysis_treats_alike_share_a_key():
+    assert key("Headache and FEVER", "123") == key("headache and fever", "P123")
+    assert key("headache", "") == key("headache")
+
+
+def test_requests_the_analysis_tells_apart_get_different_keys():
+    # normalize_patient_id keeps case, so these are different FHIR patients
+    assert key("headache", "p123") != key("headache", "P123")
+    assert key("headache", "P123") != key("headache", "P123 ")
+
+
+def test_invalidation_drops_every_form_of_the_patient_id():
+    from agents.symptom_analyzer import main as symptom_analyzer
+    from orchestration.transports import InProcessTransport
+
+    cache = symptom_analyzer.fhir_history_cache
+    cache.clear()
+    cache.put("P123", {"entry": []})
+    cache.put("PAT1", {"entry": []})
+
+    assert InProcessTransport().invalidate("symptom_analyzer", {"patient_id": "123"}) == {"invalidated": 1}
+    assert cache.get("PAT1") is not None
+    assert InProcessTransport().invalidate("symptom_analyzer", {"patient_id": "pat1"}) == {"invalidated": 1}
+    assert InProcessTransport().invalidate("symptom_analyzer", {}) == {"invalidated": 0}
+
+
+def test_in_process_analysis_skips_validation_and_matches_the_http_route(monkeypatch):
+    import asyncio
+    import httpx
+    from agents.symptom_analyzer import main as symptom_analyzer
+    from orchestration.transports import InProcessTransport
+
+    # The orchestrator's payload: the plan's semantic understanding calls the symptoms "concepts"
+    payload = {"symptoms_text": "severe headache and fever since yesterday", "priority": "high",
+               "semantic_context": {"intent": "diagnose", "concepts": ["fever"], "confidence": 0.9,
+                                    "severity_indicators": ["severe"]}}
+
+    async def over_http():
+        transport = httpx.ASGITransport(app=symptom_analyzer.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return (await client.post("/analyze_symptoms", json=payload)).json()
+
+    expected = asyncio.run(over_http())
+
+    def no_validation(*args, **kwargs):
+        raise AssertionError("in-process calls must not validate")
+    for model in (symptom_analyzer.SymptomAnalyzerRequest, symptom_analyzer.SymptomAnalyzerResponse):
+        monkeypatch.setattr(model, "model_validate", no_validation)
+
+    response = InProcessTransport().call("symptom_analyzer", payload)
+    assert response == expected
+    assert response["result"]["severity_level"] == "medium"
+
+
+# Recorded from the analyzer before its extraction was factored into
+# extract_patient_id / extract_symptoms / assess_severity: text, patient ID,
+# then symptoms, severity, resolved patient ID, contextual factors, temporal info, confidence
+EXTRACTION_CASES = [
+    ("I have a severe headache and a high fever since yesterday", None,
+     ["fever", "headache"], "high", None, ["severe", "high", "severe"], {}, 0.42),
+    ("Mild cough, sore throat and a runny nose, comes and goes", None,
+     ["cough", "sore throat"], "low", None, ["mild", "mild"], {}, 0.38),
+    ("unbearable chest pain and shortness of breath, sudden", None, [], "low", None, [], {}, 0.32),
+    ("feeling tired and dizzy, some nausea after eating", None,
+     ["fatigue", "nausea"], "medium", None, [], {"nausea": ["after eating"]}, 0.38),
+    ("Patient ID: 123 has a throbbing migraine and vomiting", None,
+     ["headache"], "medium", "P123", ["throbbing"], {}, 0.58),
+    ("pid=p456 stomach pain and diarrhea for three days", None, [], "low", "P456", [], {}, 0.52),
+    ("headache", "789", ["headache"], "low", "P789", [], {}, 0.54),
+    ("fever, cough, fatigue, body aches, chills and headache", None,
+     ["cough", "fatigue", "fever", "headache"], "high", None, [], {}, 0.44),
+]
+
+
+@pytest.mark.parametrize("text,patient_id,symptoms,severity,resolved_id,factors,temporal,confidence",
+                         EXTRACTION_CASES)
+def test_analysis_output_is_unchanged_by_the_extraction_refactor(monkeypatch, text, patient_id, symptoms, severity,
+                                                                 resolved_id, factors, temporal, confidence):
+    from agents.symptom_analyzer import main as symptom_analyzer
+
+    monkeypatch.setattr(symptom_analyzer.fhir_connector, "get_patient_history", lambda patient_id: {})
+    symptom_analyzer.fhir_history_cache.clear()
+    result = symptom_analyzer.analyze({"symptoms_text": text, "patient_id": patient_id})["result"]
+
+    assert sorted(result["identified_symptoms"]) == symptoms
+    assert result["severity_level"] == severity
+    assert result["patient_id"] == resolved_id
+    assert result["semantic_analysis"]["contextual_factors"] == factors
+    assert result["semantic_analysis"]["temporal_info"] == temporal
+    assert result["confidence"] == pytest.approx(confidence)
+
+
+def test_semantic_context_severity_is_unchanged_by_the_extraction_refactor():
+    from agents.symptom_analyzer import main as symptom_analyzer
+
+    context = {"intent": "diagnose", "identified_concepts": ["back pain"], "confidence": 0.7,
+               "severity_indicators": ["severe"], "temporal_context": {"onset": "today"}}
+    result = symptom_analyzer.analyze({"symptoms_text": "my back hurts", "semantic_context": context})["result"]
+
+    assert result["severity_level"] == "high"
+    assert result["semantic_analysis"]["contextual_factors"] == ["severe"]
+    assert result["semantic_analysis"]["temporal_info"] == {"onset": "today"}
+    assert result["confidence"] == pytest.approx(0.42)
+
+
+def test_fhir_enrichment_is_unchanged_by_the_extraction_refactor(monkeypatch):
+    from agents.symptom_analyzer import main as symptom_analyzer
+    from benchmarks.generators import fhir_bundle
+
+    bundle = fhir_bundle(40, seed=2)
+    monkeypatch.setattr(symptom_analyzer.fhir_connector, "get_patient_history", lambda patient_id: bundle)
+    symptom_analyzer.fhir_history_cache.clear()
+    result = symptom_analyzer.analyze({"symptoms_text": "severe headache and fever, cough", "patient_id": "1"})["result"]
+
+    assert sorted(result["identified_symptoms"]) == ["cough", "fever", "headache"]
+    assert result["severity_level"] == "high"
+    # Related conditions come from a set, so their order varies between runs
+    assert sorted(result["semantic_analysis"]["contextual_factors"]) == sorted([
+        "severe", "severe", "severe", "related condition: Migraine", "related condition: Hypertension",
+        "related condition: Diabetes", "related condition: Asthma", "history of severe symptoms",
+        "historical severe cough"])
+    assert result["semantic_analysis"]["confidence_factors"] == {
+        "historical_severity": 0.9, "historical_match": 0.9, "symptom_count": 0.3, "severity_assessment": 0.9,
+        "semantic_context_confidence": 0.5, "has_patient_history": 1.0, "fhir_data_quality": 0.8}
+    assert result["fhir_context"]["historical_severity"] == "high"
+    assert len(result["fhir_context"]["previous_symptoms"]) == 29
+    assert result["confidence"] == pytest.approx(0.7571, abs=1e-4)
+
+
+def test_each_event_loop_keeps_its_own_fhir_client_until_shutdown():
+    import asyncio
+    from agents.symptom_analyzer.fhir_connector import AsyncFHIRConnector
+
+    connector = AsyncFHIRConnector(fhir_server_url="http://fhir.test")
+
+    async def client_pair():
+        return connector._get_client(), connector._get_client()
+
+    first, again = asyncio.run(client_pair())
+    assert first is again
+    second, _ = asyncio.run(client_pair())
+    assert second is not first
+    # A new loop's client does not close the one another loop may still be using
+    assert not first.is_closed
+
+    async def use_and_close():
+        client = connector._get_client()
+        await connector.aclose()
+        return client
+
+    assert asyncio.run(use_and_close()).is_closed
+
+
+def test_shutdown_closes_the_fhir_client():
+    from fastapi.testclient import TestClient
+    from agents.symptom_analyzer import main as symptom_analyzer
+
+    async def open_client():
+        return symptom_analyzer.async_fhir_connector._get_client()
+
+    with TestClient(symptom_analyzer.app) as client:
+        fhir_client = client.portal.call(open_client)
+    assert fhir_client.is_closed
+
+
+def overlap_probe(monkeypatch, symptom_analyzer, fetch_started):
+    """Patch extraction to record whether the FHIR fetch had started before it ran"""
+    seen = []
+    extract = symptom_analyzer.extract_symptoms
+
+    def extract_symptoms(text, *args, **kwargs):
+        seen.append(fetch_started())
+        return extract(text, *args, **kwargs)
+
+    monkeypatch.setattr(symptom_analyzer, "extract_symptoms", extract_symptoms)
+    symptom_analyzer.fhir_history_cache.clear()
+    return seen
+
+
+def test_blocking_analysis_fetches_fhir_history_during_extraction(monkeypatch):
+    import threading
+    from agents.symptom_analyzer import main as symptom_analyzer
+
+    started = threading.Event()
+
+    def get_patient_history(patient_id):
+        started.set()
+        return {}
+
+    monkeypatch.setattr(symptom_analyzer.fhir_connector, "get_patient_history", get_patient_history)
+    seen = overlap_probe(monkeypatch, symptom_analyzer, lambda: started.wait(2))
+    symptom_analyzer.analyze({"symptoms_text": "fever and cough", "patient_id": "101"})
+    assert seen == [True]
+
+
+def test_async_analysis_starts_the_fhir_request_before_extraction(monkeypatch):
+    import asyncio
+    from agents.symptom_analyzer import main as symptom_analyzer
+
+    started = []
+
+    async def get_patient_history(patient_id):
+        started.append(patient_id)
+        await asyncio.sleep(0.01)
+        return {}
+
+    monkeypatch.setattr(symptom_analyzer.async_fhir_connector, "get_patient_history", get_patient_history)
+    seen = overlap_probe(monkeypatch, symptom_analyzer, lambda: bool(started))
+    response = asyncio.run(symptom_analyzer._analyze_symptoms_async(
+        {"symptoms_text": "fever and cough", "patient_id": "102"}))
+    assert seen == [True]
+    assert response["result"]["patient_id"] == "P102"
+
+
+def test_failed_local_analysis_cancels_the_pending_fhir_fetch(monkeypatch):
+    import asyncio
+    from agents.symptom_analyzer import main as symptom_analyzer
+
+    cancelled = []
+
+    async def get_patient_history(patient_id):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(patient_id)
+            raise
+        return {}
+
+    def extract_symptoms(text, *args, **kwargs):
+        raise RuntimeError("extraction failed")
+
+    async def analyze_and_settle():
+        response = await symptom_analyzer._analyze_symptoms_async(
+            {"symptoms_text": "fever", "patient_id": "103"})
+        await asyncio.sleep(0)
+        return response
+
+    monkeypatch.setattr(symptom_analyzer.async_fhir_connector, "get_patient_history", get_patient_history)
+    monkeypatch.setattr(symptom_analyzer, "extract_symptoms", extract_symptoms)
+    response = asyncio.run(analyze_and_settle())
+    assert response["result"] is None
+    assert cancelled == ["P103"]
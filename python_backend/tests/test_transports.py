@@ -0,0 +1,47 @@
+import pytest
+from fastapi import HTTPException
+
+from orchestration.transports import (AgentTransportError, InProcessTransport, deployment_mode,
+                                      get_transport)
+
+
+def test_deployment_mode_picks_the_transport(monkeypatch):
+    monkeypatch.setenv("DEPLOYMENT_MODE", "Monolith")
+    assert deployment_mode() == "monolith"
+    assert isinstance(get_transport(), InProcessTransport)
+
+    monkeypatch.setenv("DEPLOYMENT_MODE", "serverless")
+    with pytest.raises(ValueError):
+        deployment_mode()
+
+
+def test_in_process_handlers_get_the_payload_dict_itself():
+    received = []
+
+    def handler(payload):
+        received.append(payload)
+        return {"result": {"ok": True}, "error": None}
+
+    payload = {"symptoms": ["fever"]}
+    transport = InProcessTransport(handlers={"disease_prediction": handler})
+    assert transport.call("disease_prediction", payload) == {"result": {"ok": True}, "error": None}
+    assert received[0] is payload
+
+
+def test_in_process_http_errors_become_transport_errors():
+    def handler(payload):
+        raise HTTPException(status_code=400, detail="Symptoms text is required")
+
+    transport = InProcessTransport(handlers={"symptom_analyzer": handler})
+    with pytest.raises(AgentTransportError) as error:
+        transport.call("symptom_analyzer", {})
+    assert error.value.status_code == 400
+    assert error.value.detail == "Symptoms text is required"
+
+    with pytest.raises(AgentTransportError):
+        transport.call("unknown_agent", {})
+
+
+def test_monolith_journey_goes_straight_to_the_agent():
+    response = InProcessTransport().call("patient_journey", {"patient_id": ""})
+    assert response == {"result": None, "error": "patient_id is required"}
@@ -1,5 +1,9 @@
 import os
-from fastapi import FastAPI, Body
+import json
+from contextlib import aclosing
+from fastapi import FastAPI, Body, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from langchain_google_vertexai import ChatVertexAI
 from neo4j import GraphDatabase
 from typing import Optional
@@ -70,3 +74,34 @@ async def ask(prompt: str = Body(..., embed=True)):
     full_prompt = f"{journey_context}\nUser asks: {prompt}" if journey_context else prompt
     response = llm.invoke(full_prompt)
     return {"response": response.content, "context": journey_context}
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/ask/stream")
+async def ask_stream(request: Request, prompt: str = Body(..., embed=True)):
+    # Same answer as /ask, sent as server-sent events: the journey context first,
+    # then each token as Gemini produces it, then "done"
+    async def events():
+        patient_name = extract_patient_name(prompt)
+        journey_context = ""
+        if patient_name:
+            # Neo4j's driver blocks; keep it off the event loop the other streams share
+            journey_context = await run_in_threadpool(get_patient_journey, patient_name)
+        yield sse("context", {"context": journey_context})
+        full_prompt = f"{journey_context}\nUser asks: {prompt}" if journey_context else prompt
+        try:
+            async with aclosing(llm.astream(full_prompt)) as chunks:
+                async for chunk in chunks:
+                    # Stop generating once nobody is reading: closing the stream cancels the Gemini call
+                    if await request.is_disconnected():
+                        return
+                    if chunk.content:
+                        yield sse("token", {"text": chunk.content})
+        except Exception as e:
+            yield sse("error", {"error": str(e)})
+            return
+        yield sse("done", {})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})